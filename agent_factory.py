@@ -0,0 +1,180 @@
+"""
+Agent / crew factory shared by the content pipelines.
+
+Agents are described by an immutable AgentSpec (role, goal, backstory, model, temperature,
+llm_config, tools). The factory keeps the built crewAI Agent objects per spec and leases
+them out, so a re-run with the same settings reuses its agents instead of constructing
+them again. LLM wrappers and tools are shared the same way (one per model / tool name).
+
+A leased agent belongs to one run at a time: concurrent runs with identical specs get
+separate instances, and an idle instance goes back to the pool when its lease ends.
+Pipelines only lease the agents their enabled tasks reference.
+
+Benchmark of per-run construction (needs crewai installed):
+    python agent_factory.py [runs]
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Tuple
+
+from crewai import Agent, Crew
+
+# idle agents kept across runs (least recently used specs are dropped first)
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "64"))
+
+_lock = threading.Lock()
+_llms: Dict[Tuple[str, float], Any] = {}
+_tools: Dict[str, Any] = {}
+_idle: "OrderedDict[AgentSpec, List[Agent]]" = OrderedDict()
+_stats = {"built": 0, "reused": 0}
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    role: str
+    goal: str
+    backstory: str
+    model: str
+    temperature: float = 1.0
+    llm_config: Tuple[Tuple[str, Any], ...] = field(default=())
+    tools: Tuple[str, ...] = field(default=())
+
+    @classmethod
+    def create(cls, role, goal, backstory, model, temperature=1.0, llm_config=None, tools=()):
+        """llm_config as a dict, tools as names registered in TOOL_FACTORIES."""
+        return cls(role, goal, backstory, model, float(temperature),
+                   tuple(sorted((llm_config or {}).items())), tuple(tools))
+
+
+def _serper_tool():
+    from tools.serper_tool import SerperTool
+    return SerperTool()
+
+
+TOOL_FACTORIES = {"serper": _serper_tool}
+
+
+def get_llm(model: str, temperature: float):
+    """One CrewSafeLLM per (model, temperature)."""
+    key = (model, float(temperature))
+    with _lock:
+        llm = _llms.get(key)
+    if llm is None:
+        from crew_safe_llm import CrewSafeLLM
+        llm = CrewSafeLLM(model=model, temperature=temperature)
+        with _lock:
+            llm = _llms.setdefault(key, llm)
+    return llm
+
+
+def get_tool(name: str):
+    with _lock:
+        tool = _tools.get(name)
+    if tool is None:
+        tool = TOOL_FACTORIES[name]()
+        with _lock:
+            tool = _tools.setdefault(name, tool)
+    return tool
+
+
+def build_agent(spec: AgentSpec) -> Agent:
+    """A new Agent for spec (what the pipelines used to do on every run)."""
+    return Agent(
+        role=spec.role,
+        goal=spec.goal,
+        backstory=spec.backstory,
+        tools=[get_tool(name) for name in spec.tools],
+        verbose=True,
+        llm=get_llm(spec.model, spec.temperature),
+        llm_config=dict(spec.llm_config),
+    )
+
+
+def checkout(spec: AgentSpec) -> Agent:
+    """An idle agent for spec, or a newly built one."""
+    with _lock:
+        idle = _idle.get(spec)
+        if idle:
+            _idle.move_to_end(spec)
+            _stats["reused"] += 1
+            return idle.pop()
+        _stats["built"] += 1
+    return build_agent(spec)
+
+
+def release(spec: AgentSpec, agent: Agent) -> None:
+    with _lock:
+        _idle.setdefault(spec, []).append(agent)
+        _idle.move_to_end(spec)
+        while len(_idle) > AGENT_CACHE_SIZE:
+            _idle.popitem(last=False)
+
+
+class AgentLease:
+    """Agents checked out for one pipeline run; get() returns the same agent for the same spec."""
+
+    def __init__(self):
+        self.agents: "OrderedDict[AgentSpec, Agent]" = OrderedDict()
+
+    def get(self, spec: AgentSpec) -> Agent:
+        if spec not in self.agents:
+            self.agents[spec] = checkout(spec)
+        return self.agents[spec]
+
+    def release(self) -> None:
+        for spec, agent in self.agents.items():
+            release(spec, agent)
+        self.agents.clear()
+
+
+@contextmanager
+def lease() -> Iterator[AgentLease]:
+    agents = AgentLease()
+    try:
+        yield agents
+    finally:
+        agents.release()
+
+
+def single_task_crew(task) -> Crew:
+    """Minimal crew that runs one task (the pipelines run tasks one by one for progress logging)."""
+    return Crew(agents=[task.agent], tasks=[task], verbose=True, process="sequential", tracing=True)
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {**_stats, "idle_specs": len(_idle), "idle_agents": sum(len(v) for v in _idle.values())}
+
+
+def clear() -> None:
+    with _lock:
+        _idle.clear()
+        _llms.clear()
+        _tools.clear()
+
+
+def benchmark(runs: int = 20) -> Dict[str, float]:
+    """ms per run to set up five agents: built every time vs leased from the factory."""
+    specs = [AgentSpec.create(f"Bench-{i}", f"goal {i}", f"backstory {i}", "gpt-4o-mini", 1.0, {"temperature": 1.1})
+             for i in range(5)]
+    start = time.perf_counter()
+    for _ in range(runs):
+        [build_agent(spec) for spec in specs]
+    cold = (time.perf_counter() - start) * 1000 / runs
+    start = time.perf_counter()
+    for _ in range(runs):
+        with lease() as agents:
+            [agents.get(spec) for spec in specs]
+    warm = (time.perf_counter() - start) * 1000 / runs
+    return {"runs": runs, "build_ms": round(cold, 3), "leased_ms": round(warm, 3)}
+
+
+if __name__ == "__main__":
+    import sys
+    print(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
+    print(stats())
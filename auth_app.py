@@ -2,6 +2,9 @@ import importlib
 import streamlit as st
 import sqlite3
 import hashlib
+import hmac
+import html
+import threading
 import time
 import pandas as pd
 import json # Added for session persistence
@@ -16,6 +19,10 @@ import common
 import sqlite
 from streamlit_cookies_manager import EncryptedCookieManager
 import humanize_convert
+import content_search
+import blob_store
+import db_pool
+import run_metrics
 ENCRYPTION_PASSWORD = "your_strong_secret_key_here"
 # Key under which the user data will be stored in the cookie
 USER_COOKIE_KEY = "user_session_data"
@@ -49,14 +56,59 @@ for k, v in {
 query_params = st.query_params
 
 # --- Utility Functions for Hashing ---
+# scrypt cost (tunable per deployment); stored alongside every hash so old hashes keep verifying
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", 2 ** 14))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", 8))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", 1))
+# How long (seconds) a verified username/password pair is trusted without re-running the KDF
+# (the users row is still read on every login, so a changed password or deleted user ends it at once)
+VERIFIED_SESSION_TTL = int(os.getenv("VERIFIED_SESSION_TTL", 60))
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=32)
+
 def hash_password(password):
-    """Hashes a password using SHA256."""
-    # Using SHA256 for simplicity as it's a standard library.
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hashes a password with salted scrypt ("scrypt$n$r$p$salt$hash")."""
+    salt = os.urandom(16)
+    n, r, p = PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P
+    return f"scrypt${n}${r}${p}${salt.hex()}${_scrypt(password, salt, n, r, p).hex()}"
 
 def check_password(password, hashed_password):
-    """Checks a cleartext password against a stored hash."""
-    return hash_password(password) == hashed_password
+    """Checks a cleartext password against a stored hash (scrypt or legacy unsalted SHA256)."""
+    if not hashed_password:
+        return False
+    if hashed_password.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, digest = hashed_password.split("$")
+            candidate = _scrypt(password, bytes.fromhex(salt), int(n), int(r), int(p))
+        except ValueError:
+            return False
+        return hmac.compare_digest(candidate.hex(), digest)
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, hashed_password)
+
+def needs_rehash(hashed_password):
+    """True for legacy SHA256 hashes and for scrypt hashes made with other cost settings."""
+    if not hashed_password or not hashed_password.startswith("scrypt$"):
+        return True
+    return hashed_password.split("$")[1:4] != [str(PASSWORD_SCRYPT_N), str(PASSWORD_SCRYPT_R), str(PASSWORD_SCRYPT_P)]
+
+@st.cache_resource
+def _verified_sessions():
+    """Process-wide cache of recent successful logins, shared by all sessions."""
+    # entries: hmac(username, password) -> (expires_at, password_hash it was checked against, username);
+    # passwords themselves are never stored
+    return {"secret": os.urandom(32), "lock": threading.Lock(), "entries": {}}
+
+def _verified_session_key(cache, username, password):
+    return hmac.new(cache["secret"], f"{username}\0{password}".encode(), hashlib.sha256).hexdigest()
+
+def forget_verified_logins(username=None):
+    """Drops cached logins of a user (all users when None); call after a password change or user deletion."""
+    cache = _verified_sessions()
+    with cache["lock"]:
+        for key in [k for k, (_, _, name) in cache["entries"].items() if username is None or name == username]:
+            del cache["entries"][key]
 
 # --- Database Functions ---
 
@@ -156,6 +208,9 @@ def init_db():
     #     ADD COLUMN user_id INTEGER DEFAULT 0
     # """)
     conn.commit()
+    # FTS5 index over content_history / contents (kept in sync by triggers)
+    content_search.ensure_search_index(conn)
+    conn.commit()
     conn.close()
 
 def get_user_id_by_username(username):
@@ -185,6 +240,28 @@ def add_user(username, password, email, full_name, role=DEFAULT_USER_ROLE):
         st.error(f"Database error during registration: {e}")
         return False
 
+def change_password(username, new_password):
+    """Sets a new password; cached logins with the old one stop working."""
+    conn = sqlite3.connect(DATABASE_FILE)
+    c = conn.cursor()
+    c.execute("UPDATE users SET password_hash = ? WHERE username = ?", (hash_password(new_password), username))
+    conn.commit()
+    changed = c.rowcount > 0
+    conn.close()
+    forget_verified_logins(username)
+    return changed
+
+def delete_user(username):
+    """Deletes a user account and its cached logins."""
+    conn = sqlite3.connect(DATABASE_FILE)
+    c = conn.cursor()
+    c.execute("DELETE FROM users WHERE username = ?", (username,))
+    conn.commit()
+    deleted = c.rowcount > 0
+    conn.close()
+    forget_verified_logins(username)
+    return deleted
+
 def verify_credentials(username, password):
     """Verifies user credentials and returns user info (including id) if successful."""
     conn = sqlite3.connect(DATABASE_FILE)
@@ -192,13 +269,39 @@ def verify_credentials(username, password):
     # Fetch ID as well, which is needed for post creation
     c.execute("SELECT id, password_hash, email, full_name, role FROM users WHERE username = ?", (username,))
     result = c.fetchone()
+    if not result:
+        conn.close()
+        forget_verified_logins(username)
+        return None
+    user_id, password_hash, email, full_name, role = result
+    user_info = {"id": user_id, "username": username, "email": email, "full_name": full_name, "role": role}
+
+    cache = _verified_sessions()
+    key = _verified_session_key(cache, username, password)
+    with cache["lock"]:
+        hit = cache["entries"].get(key)
+    # a cached login only counts while the users row still holds the hash it was checked against
+    if hit and hit[0] > time.time() and hmac.compare_digest(hit[1], password_hash):
+        conn.close()
+        return user_info
+
+    if not check_password(password, password_hash):
+        conn.close()
+        return None
+    if needs_rehash(password_hash):
+        # transparently upgrade legacy SHA256 / old-cost hashes on successful login
+        password_hash = hash_password(password)
+        c.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+        conn.commit()
     conn.close()
 
-    if result:
-        user_id, password_hash, email, full_name, role = result
-        if check_password(password, password_hash):
-            return {"id": user_id, "username": username, "email": email, "full_name": full_name, "role": role}
-    return None
+    with cache["lock"]:
+        now = time.time()
+        # drop expired entries while we hold the lock
+        for stale in [k for k, (expires_at, _, _) in cache["entries"].items() if expires_at <= now]:
+            del cache["entries"][stale]
+        cache["entries"][key] = (now + VERIFIED_SESSION_TTL, password_hash, username)
+    return user_info
 
 def get_all_users():
     """Retrieves all users (excluding password hash) for admin page."""
@@ -385,8 +488,8 @@ def initialize_session_state():
         # Default page is login if not logged in, otherwise dashboard
         st.session_state['page'] = 'login' if not st.session_state['logged_in'] else 'dashboard'
     #st.json( st.session_state)
-    # 3. Check for demo admin user
-    if not verify_credentials(ADMIN_USER, "adminpass"):
+    # 3. Check for demo admin user (existence only, so no password hashing on every rerun)
+    if get_user_id_by_username(ADMIN_USER) is None:
         if add_user(ADMIN_USER, "adminpass", "admin@example.com", "System Admin", "admin"):
             st.info(f"Demo admin user '{ADMIN_USER}' created. Password: 'adminpass'.")
 
@@ -705,6 +808,10 @@ def show_admin_page():
     else:
         st.warning("No users found in the database.")
 
+    st.header("Pipeline Metrics", divider='red')
+    st.info("Wall time per pipeline stage and call type (p50 / p95), with tokens, retries and estimated cost.")
+    run_metrics.show_metrics_panel()
+
 def update_tone_active(tone_id, is_active):
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
@@ -720,7 +827,7 @@ def show_tone_page():
     username = user['username']
 
     #left, right = st.columns([8, 2])
-    left,middle, right = st.columns([6,2, 2])
+    left,middle, batch, right = st.columns([5,2,2, 2])
     with left:
         st.title("✍️ My Tones")
     #left.header(f"View Your Tones ({username})")  # optional text
@@ -729,6 +836,10 @@ def show_tone_page():
             #common.navigate_to("addtone")
             st.session_state['spage'] = 'tonelist'
             st.rerun()
+    with batch:
+        if st.button("Batch Import", type="primary"):
+            st.session_state['spage'] = 'batchtone'
+            st.rerun()
     with right:
         if st.button("Create Tone", type="primary"):
             #common.navigate_to("addtone")
@@ -790,7 +901,7 @@ def show_tone_page():
                         <p style="font-size: 0.9em; color: #666; font-style: italic;">
                             Posted by {tone[10]} on {tone[8].split('.')[0]}
                         </p>
-                        <p>{show_micro_humanizer_content(tone[7])}</p>
+                        <p>{show_micro_humanizer_content(blob_store.unpack_text(tone[7]))}</p>
                     </div>
                 """, unsafe_allow_html=True)
     else:
@@ -896,12 +1007,10 @@ def show_tone_list_page():
 def delete_content(content_id, user_id):
     """Deletes a content entry from the content_history table for a specific user."""
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        c = conn.cursor()
-        # Ensure the content belongs to the user to prevent unauthorized deletion
-        c.execute("DELETE FROM content_history WHERE id = ? AND user_id = ?", (content_id, user_id))
-        conn.commit()
-        conn.close()
+        # pooled connection: the search-index triggers need unpack_text() registered
+        with db_pool.get_pool(DATABASE_FILE).transaction() as conn:
+            # Ensure the content belongs to the user to prevent unauthorized deletion
+            conn.execute("DELETE FROM content_history WHERE id = ? AND user_id = ?", (content_id, user_id))
         return True
     except Exception as e:
         st.error(f"Error deleting content: {e}")
@@ -935,6 +1044,12 @@ def list_gen_content():
 
     st.markdown("---")
 
+    # --- Search Section ---
+    search_query = st.text_input("🔍 Search your articles", key="content_search_query", placeholder="e.g. outsourcing willpower")
+    if search_query.strip():
+        show_search_results(user_id, search_query)
+        return
+
     # --- Post Viewing Section ---
     st.subheader("📝 Content List")
 
@@ -984,6 +1099,28 @@ def list_gen_content():
     else:
         st.info("Content is not created yet!")
 
+def show_search_results(user_id, search_query):
+    """Renders ranked full-text search results for the user's generated articles."""
+    started = time.perf_counter()
+    results = content_search.search_content(DATABASE_FILE, user_id, search_query, limit=25, sources=["history"])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    st.subheader(f"🔍 {len(results)} result(s) for \"{search_query}\"")
+    st.caption(f"Search took {elapsed_ms:.1f} ms")
+    if not results:
+        st.info("No articles match your search.")
+        return
+    for item in results:
+        # topic is user text; snippet is escaped by content_search (only its <mark> tags are HTML)
+        st.markdown(f"""
+            <div style="border: 1px solid #ffcc80; padding: 15px; margin-bottom: 15px; border-radius: 8px; background-color: #fff3e0;">
+                <h4 style="margin-top: 0; color: #e65100;">
+                    <a href="/?refresh=true&page=content&id={int(item['id'])}&mode=edit" target="_self">{html.escape(item['topic'] or '')}</a>
+                </h4>
+                <p style="font-size: 0.9em; color: #444;">{item['snippet']}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
 def handle_delete_content(content_id, user_id):
     """Callback function to handle content deletion."""
     if delete_content(content_id, user_id):
@@ -1146,6 +1283,8 @@ def main():
                 micro_humanizer_generator.default_view()
             elif 'spage' in st.session_state and st.session_state['spage'] == 'tonelist':
                 show_tone_list_page()
+            elif 'spage' in st.session_state and st.session_state['spage'] == 'batchtone':
+                micro_humanizer_generator.batch_view()
             else:
                 show_tone_page()     # NEW Page Routing
         elif page == 'db':
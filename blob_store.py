@@ -0,0 +1,150 @@
+"""
+Compressed storage for the large TEXT columns
+(content_history.final_output / detection_result, micro_roles.generated_json / source_value).
+
+- pack_text() stores values above COMPRESS_MIN_BYTES as a BLOB: 4-byte codec tag + compressed UTF-8.
+  zstd is used when the `zstandard` package is installed, zlib otherwise.
+- unpack_text() accepts both packed BLOBs and legacy plain TEXT, so old rows keep working.
+- pack_detection() drops data.input_text from ZeroGPT payloads when it equals the stored
+  article; unpack_detection() puts it back on read.
+"""
+
+import json
+import os
+import sqlite3
+import zlib
+from typing import Any, Optional
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+ZSTD_TAG = b"ZST1"
+ZLIB_TAG = b"ZLB1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+
+# marker left in detection payloads whose input_text was the article itself
+INPUT_TEXT_REF = "final_output"
+
+
+def _compress(raw: bytes) -> bytes:
+    if zstandard is not None:
+        return ZSTD_TAG + zstandard.ZstdCompressor(level=COMPRESS_LEVEL).compress(raw)
+    return ZLIB_TAG + zlib.compress(raw, COMPRESS_LEVEL)
+
+
+def is_packed(value: Any) -> bool:
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    return isinstance(value, bytes) and value[:4] in (ZSTD_TAG, ZLIB_TAG)
+
+
+def pack_text(text: Optional[str]):
+    """Returns a BLOB for large text (only if compression actually saves space), otherwise the text itself."""
+    if text is None or not isinstance(text, str):
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    packed = _compress(raw)
+    return sqlite3.Binary(packed) if len(packed) < len(raw) else text
+
+
+def unpack_text(value: Any) -> Optional[str]:
+    """Decodes a value read from a packed column; plain TEXT is returned unchanged."""
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    if not isinstance(value, bytes):
+        return value
+    tag, body = value[:4], value[4:]
+    if tag == ZSTD_TAG:
+        if zstandard is None:
+            raise RuntimeError("Value is zstd-compressed but the 'zstandard' package is not installed.")
+        return zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+    if tag == ZLIB_TAG:
+        return zlib.decompress(body).decode("utf-8")
+    return value.decode("utf-8", "replace")
+
+
+def pack_detection(detection: Any, final_output: Optional[str] = None):
+    """
+    Packs a ZeroGPT detection payload (dict or JSON string).
+    data.input_text is replaced by a reference when it is the same text as final_output.
+    """
+    if detection is None:
+        return None
+    if isinstance(detection, str):
+        try:
+            payload = json.loads(detection)
+        except (TypeError, ValueError):
+            return pack_text(detection)
+    else:
+        payload = detection
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if final_output is not None and isinstance(data, dict) and data.get("input_text") == final_output:
+        payload = dict(payload)
+        payload["data"] = {k: v for k, v in data.items() if k != "input_text"}
+        payload["data"]["input_text_ref"] = INPUT_TEXT_REF
+    return pack_text(json.dumps(payload))
+
+
+def unpack_detection(value: Any, final_output: Any = None) -> Optional[str]:
+    """Returns the detection payload as a JSON string, restoring data.input_text if it was deduplicated."""
+    text = unpack_text(value)
+    if not text or "input_text_ref" not in text:
+        return text
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return text
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(data, dict) and data.pop("input_text_ref", None) == INPUT_TEXT_REF:
+        data["input_text"] = unpack_text(final_output) or ""
+    return json.dumps(payload)
+
+
+def register_sql_functions(conn: sqlite3.Connection) -> None:
+    """Makes unpack_text() available to SQL (used by the search index triggers and view)."""
+    conn.create_function("unpack_text", 1, unpack_text, deterministic=True)
+
+
+def compact_database(db_path: str) -> dict:
+    """
+    One-off migration: packs existing plain-TEXT rows in place, then VACUUMs.
+    Safe to re-run; already packed values are skipped.
+    """
+    import content_search
+    conn = sqlite3.connect(db_path)
+    # make sure the search triggers are the unpack_text() aware ones before rewriting rows
+    content_search.ensure_search_index(conn)
+    counts = {"content_history": 0, "micro_roles": 0}
+    rows = conn.execute("SELECT id, final_output, detection_result FROM content_history").fetchall()
+    for row_id, final_output, detection in rows:
+        if is_packed(final_output) and (detection is None or is_packed(detection)):
+            continue
+        text = unpack_text(final_output)
+        conn.execute(
+            "UPDATE content_history SET final_output = ?, detection_result = ? WHERE id = ?",
+            (pack_text(text), pack_detection(unpack_text(detection), text), row_id),
+        )
+        counts["content_history"] += 1
+    rows = conn.execute("SELECT id, generated_json, source_value FROM micro_roles").fetchall()
+    for row_id, generated_json, source_value in rows:
+        if is_packed(generated_json) and (source_value is None or is_packed(source_value)):
+            continue
+        conn.execute(
+            "UPDATE micro_roles SET generated_json = ?, source_value = ? WHERE id = ?",
+            (pack_text(unpack_text(generated_json)), pack_text(unpack_text(source_value)), row_id),
+        )
+        counts["micro_roles"] += 1
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+    print(compact_database(sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATABASE_FILE", "user_auth.db")))
@@ -5,24 +5,33 @@ import json
 import time
 from datetime import datetime
 from dotenv import load_dotenv
+import blob_store
+import db_pool
 
 load_dotenv()
 
 DATABASE_FILE = os.getenv("DATABASE_FILE")
 
 
-def update_output_to_db(user_id, **fields):
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+def pack_content_fields(fields):
+    """Compresses the large content_history columns before they are written."""
+    packed = dict(fields)
+    if "detection_result" in packed:
+        packed["detection_result"] = blob_store.pack_detection(packed["detection_result"], packed.get("final_output"))
+    if "final_output" in packed:
+        packed["final_output"] = blob_store.pack_text(packed["final_output"])
+    return packed
+
 
+def update_output_to_db(user_id, **fields):
+    fields = pack_content_fields(fields)
     set_clause = ", ".join(f"{key} = ?" for key in fields.keys())
     values = list(fields.values())
 
     query = f"UPDATE content_history SET {set_clause} WHERE id = ?"
-    cursor.execute(query, values + [user_id])
-
-    conn.commit()
-    conn.close()
+    # pooled connection: the search-index triggers need unpack_text() registered
+    with db_pool.get_pool(DATABASE_FILE).transaction() as conn:
+        conn.execute(query, values + [user_id])
 
 # def update_output_to_db(id, topic, researcher_goal, researcher_backstory,
 #                       writer_goal, writer_backstory,
@@ -73,20 +82,29 @@ def save_to_db(source_type, source_value, result_json):
     user = st.session_state['user_info']
     user_id = user['id']
 
-    role_json = json.dumps(result_json.get("roles"))
-    patterns_json = json.dumps(result_json.get("patterns"))
-    generated_json = json.dumps(result_json)  # Save full JSON as string
-
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO micro_roles
-        (source_type, source_value, role, tone, style, patterns, generated_json, created_at, user_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    cursor.execute(MICRO_ROLE_INSERT, micro_role_row(source_type, source_value, result_json, user_id))
+    conn.commit()
+    conn.close()
+
+
+MICRO_ROLE_INSERT = """
+    INSERT INTO micro_roles
+    (source_type, source_value, role, tone, style, patterns, generated_json, created_at, user_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def micro_role_row(source_type, source_value, result_json, user_id):
+    """Parameters for MICRO_ROLE_INSERT (large values compressed, see blob_store.py)."""
+    role_json = json.dumps(result_json.get("roles"))
+    patterns_json = json.dumps(result_json.get("patterns"))
+    generated_json = blob_store.pack_text(json.dumps(result_json))  # Save full JSON (compressed when large)
+    return (
         source_type,
-        source_value,
+        blob_store.pack_text(source_value),
         role_json,
         result_json.get("tone"),
         result_json.get("style"),
@@ -94,9 +112,20 @@ def save_to_db(source_type, source_value, result_json):
         generated_json,
         datetime.now().isoformat(),
         user_id
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+
+def save_many_to_db(user_id, entries):
+    """
+    Inserts many micro_roles rows in one transaction.
+    entries: iterable of (source_type, source_value, result_json). Returns the new row ids.
+    """
+    ids = []
+    with db_pool.get_pool(DATABASE_FILE).transaction() as conn:
+        for source_type, source_value, result_json in entries:
+            cur = conn.execute(MICRO_ROLE_INSERT, micro_role_row(source_type, source_value, result_json, user_id))
+            ids.append(cur.lastrowid)
+    return ids
 
 
 def navigate_to(page_name: str):
@@ -128,7 +157,7 @@ def get_selected_tones_by_user(user_id):
     posts = c.fetchall()
     res = []
     for post in posts:
-        role_json = json.loads(post[0])
+        role_json = json.loads(blob_store.unpack_text(post[0]))
         sposts = role_json.get("micro_agent_list") if isinstance(role_json, dict) else None
         res.append(sposts if sposts else None)
     #posts = [json.loads(row[0]) for row in posts]  # Parse JSON strings into Python objects
@@ -145,6 +174,38 @@ def get_selected_tones_by_user(user_id):
 
 
 
+def get_role_patterns(user_id, role_id=None):
+    """
+    Stored style patterns of one micro_roles row: the given role, else the user's newest active one.
+    Returns (role_id, patterns dict) or (None, None).
+    """
+    pool = db_pool.get_pool(DATABASE_FILE)
+    if role_id:
+        row = pool.fetchone("SELECT id, patterns FROM micro_roles WHERE id = ? AND user_id = ?", (role_id, user_id))
+    else:
+        row = pool.fetchone("""
+            SELECT id, patterns FROM micro_roles
+            WHERE user_id = ? AND is_active = 1
+            ORDER BY created_at DESC LIMIT 1
+        """, (user_id,))
+    if not row or not row[1]:
+        return None, None
+    try:
+        patterns = json.loads(row[1])
+    except (TypeError, ValueError):
+        return None, None
+    return (row[0], patterns) if isinstance(patterns, dict) else (None, None)
+
+
+def get_active_roles(user_id):
+    """(id, source_type, tone) of the user's active micro_roles, newest first."""
+    return db_pool.get_pool(DATABASE_FILE).fetchall("""
+        SELECT id, source_type, tone FROM micro_roles
+        WHERE user_id = ? AND is_active = 1
+        ORDER BY created_at DESC
+    """, (user_id,))
+
+
 def get_all_personalities(user_id=None):
     """Retrieves all tones created by a specific user."""
     # user = st.session_state['user_info']
@@ -172,7 +233,7 @@ def get_all_personalities(user_id=None):
     posts = c.fetchall()
     res = []
     for post in posts:
-        role_json = json.loads(post[0])
+        role_json = json.loads(blob_store.unpack_text(post[0]))
         sposts = role_json.get("micro_agent_list") if isinstance(role_json, dict) else None
         res.append(sposts if sposts else None)
     #posts = [json.loads(row[0]) for row in posts]  # Parse JSON strings into Python objects
@@ -0,0 +1,178 @@
+"""
+Full-text search over generated articles (SQLite FTS5).
+
+One external-content FTS5 table, content_search, indexes
+  - content_history.topic / final_output   (rowid = id * 2)
+  - contents.topic / generated_content     (rowid = id * 2 + 1)
+through the content_search_src view, and is kept in sync by triggers, so every
+writer updates the index without extra code. The index stores only the inverted
+index (no second copy of the articles); bodies are read through unpack_text(),
+so compressed columns (see blob_store.py) are searchable too.
+Connections that write to the source tables need blob_store.register_sql_functions
+(db_pool connections get it automatically).
+"""
+
+import html
+import re
+import sqlite3
+from typing import Any, Dict, List
+
+import blob_store
+import db_pool
+
+SEARCH_TABLE = "content_search"
+SEARCH_VIEW = "content_search_src"
+
+# source name -> (table, body column, rowid offset)
+SEARCH_SOURCES = {
+    "history": ("content_history", "final_output", 0),
+    "template": ("contents", "generated_content", 1),
+}
+
+# topic matches weigh more than body matches
+TOPIC_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+_MARK_OPEN = "\x02"
+_MARK_CLOSE = "\x03"
+
+
+def _body_expr(prefix: str, column: str) -> str:
+    return f"unpack_text({prefix}.{column})"
+
+
+def _view_sql(sources: List[str]) -> str:
+    selects = []
+    for source in sources:
+        table, body, offset = SEARCH_SOURCES[source]
+        selects.append(
+            f"SELECT id * 2 + {offset} AS rid, topic, {_body_expr(table, body)} AS body, '{source}' AS source FROM {table}"
+        )
+    return f"CREATE VIEW {SEARCH_VIEW} AS " + " UNION ALL ".join(selects)
+
+
+def _table_sql() -> str:
+    return (
+        f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+        f"topic, body, source UNINDEXED, content='{SEARCH_VIEW}', content_rowid='rid', "
+        f"tokenize='porter unicode61 remove_diacritics 2')"
+    )
+
+
+def _trigger_sql(source: str) -> Dict[str, str]:
+    table, body, offset = SEARCH_SOURCES[source]
+    new_row = (
+        f"INSERT INTO {SEARCH_TABLE}(rowid, topic, body, source) "
+        f"VALUES (new.id * 2 + {offset}, new.topic, {_body_expr('new', body)}, '{source}');"
+    )
+    old_row = (
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, topic, body, source) "
+        f"VALUES ('delete', old.id * 2 + {offset}, old.topic, {_body_expr('old', body)}, '{source}');"
+    )
+    return {
+        f"{table}_search_ai": f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {new_row} END",
+        f"{table}_search_ad": f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {old_row} END",
+        f"{table}_search_au": (
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF topic, {body} ON {table} "
+            f"BEGIN {old_row} {new_row} END"
+        ),
+    }
+
+
+def _ensure_object(conn: sqlite3.Connection, existing: Dict[str, str], obj_type: str, name: str, sql: str) -> bool:
+    """(Re)creates a schema object when it is missing or its definition changed. Returns True if created."""
+    if existing.get(name) == sql:
+        return False
+    if name in existing:
+        conn.execute(f"DROP {obj_type} IF EXISTS {name}")
+    conn.execute(sql)
+    return True
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> None:
+    """
+    Creates the FTS table, source view and sync triggers for whichever source tables exist in this database.
+    The index is rebuilt from the sources only when its definition is new or changed.
+    Cheap to call on every app start / rerun.
+    Never commits: it runs in the caller's transaction, and the caller commits it.
+    """
+    blob_store.register_sql_functions(conn)
+    existing = {name: sql for name, sql in conn.execute("SELECT name, sql FROM sqlite_master")}
+    sources = [s for s, (table, _, _) in SEARCH_SOURCES.items() if table in existing]
+    if not sources:
+        return
+    changed = False
+    # triggers go first: old ones may reference an index that is about to be replaced
+    wanted_triggers = {}
+    for source in sources:
+        wanted_triggers.update(_trigger_sql(source))
+    for name in list(existing):
+        if name.endswith(("_search_ai", "_search_ad", "_search_au")) and existing[name] != wanted_triggers.get(name):
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            existing.pop(name)
+    changed |= _ensure_object(conn, existing, "VIEW", SEARCH_VIEW, _view_sql(sources))
+    changed |= _ensure_object(conn, existing, "TABLE", SEARCH_TABLE, _table_sql())
+    for name, sql in wanted_triggers.items():
+        _ensure_object(conn, existing, "TRIGGER", name, sql)
+    if changed:
+        conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
+
+def build_match_query(text: str) -> str:
+    """Turns free text into a safe FTS5 query: every word must match (prefix match on each)."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_content(db_path: str, user_id, query: str, limit: int = 20, sources=None) -> List[Dict[str, Any]]:
+    """
+    Ranked (BM25) search over a user's articles.
+    Returns [{source, id, topic, snippet, score}] best match first; snippet is HTML with <mark> highlights.
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    pool = db_pool.get_pool(db_path)
+    tables = {row[0] for row in pool.fetchall("SELECT name FROM sqlite_master WHERE type='table'")}
+    owned = []
+    params: list = [match]
+    # restrict to the user's rows through the source tables' rowids (no article bodies are read for this)
+    for source, (table, _, offset) in SEARCH_SOURCES.items():
+        if table in tables and (not sources or source in sources):
+            owned.append(f"SELECT id * 2 + {offset} FROM {table} WHERE user_id = ?")
+            params.append(user_id)
+    if not owned:
+        return []
+    params.append(int(limit))
+    rows = pool.fetchall(f"""
+        SELECT rowid, source, topic,
+               snippet({SEARCH_TABLE}, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', 24),
+               score
+        FROM (
+            SELECT rowid, bm25({SEARCH_TABLE}, {TOPIC_WEIGHT}, {BODY_WEIGHT}) AS score
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH ? AND rowid IN ({" UNION ALL ".join(owned)})
+            ORDER BY score
+            LIMIT ?
+        ) AS best
+        JOIN {SEARCH_TABLE} ON {SEARCH_TABLE}.rowid = best.rowid AND {SEARCH_TABLE} MATCH ?
+        ORDER BY score
+    """, params + [match])
+    results = []
+    for rowid, source, topic, snippet, score in rows:
+        snippet = html.escape(snippet or "").replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+        results.append({
+            "source": source,
+            "id": rowid // 2,
+            "topic": topic,
+            "snippet": snippet,
+            "score": round(-score, 4),
+        })
+    return results
+
+
+def rebuild_search_index(db_path: str) -> None:
+    """Drops and re-creates the index from the source tables (e.g. after bulk imports)."""
+    with db_pool.get_pool(db_path).connection() as conn:
+        ensure_search_index(conn)
+        conn.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,229 @@
+"""
+Corpus-level style statistics with NumPy.
+
+A StyleCorpus holds a user's reference documents (their micro_roles sources) in
+columnar form:
+  - lengths / offsets: every sentence length of every document in one int32 array,
+    CSR-style (document i is lengths[offsets[i]:offsets[i+1]])
+  - quantiles: per-document sentence-length quantile matrix (docs x QUANTILES)
+  - term_matrix: L2-normalised tf-idf keyword vectors (docs x HASH_DIM), words are
+    feature-hashed so a new draft maps into the same space without a vocabulary
+Tokenizing happens once when the corpus is built; comparing a draft is a handful of
+vectorized operations over all documents at once (milliseconds for hundreds of posts).
+
+Benchmark:
+    python corpus_stats.py [n_docs]
+"""
+
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import streamlit as st
+
+import blob_store
+import common
+import db_pool
+import text_features
+
+HASH_DIM = 4096
+# quantile grid used for distribution distances (5%, 10%, ..., 95%)
+QUANTILES = np.linspace(0.05, 0.95, 19)
+REPORT_PERCENTILES = (10, 25, 50, 75, 90)
+STOPWORDS = frozenset(
+    "a an the and or but if then of to in on at by for with from as is are was were be been being it its "
+    "this that these those i you he she we they me my your our their his her them us not no so do does did "
+    "have has had will would can could should just than too very also into about over more most".split()
+)
+
+
+def tokenize(text: str) -> Tuple[np.ndarray, List[str]]:
+    """(sentence lengths in words, lower-cased content words) using the text_features rules."""
+    lengths = []
+    words = []
+    for sentence in text_features.iter_regex_sentences(text or ""):
+        lengths.append(len(sentence.split()))
+        words.extend(w for w in (t.lower() for t in text_features._WORD_RE.findall(sentence)) if w not in STOPWORDS)
+    return np.asarray(lengths, dtype=np.int32), words
+
+
+def _hash_counts(words: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed term ids with their counts for one document."""
+    ids = np.fromiter((zlib.crc32(w.encode("utf-8")) % HASH_DIM for w in words), dtype=np.int64)
+    if not ids.size:
+        return ids, ids.astype(np.float32)
+    uniq, counts = np.unique(ids, return_counts=True)
+    return uniq, counts.astype(np.float32)
+
+
+def _segment_quantiles(lengths: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Per-segment linear-interpolated quantiles of a CSR array, without a Python loop over documents."""
+    n_docs = len(offsets) - 1
+    sizes = np.diff(offsets)
+    out = np.zeros((n_docs, len(QUANTILES)), dtype=np.float64)
+    if not lengths.size:
+        return out
+    seg = np.repeat(np.arange(n_docs), sizes)
+    ordered = lengths[np.lexsort((lengths, seg))].astype(np.float64)
+    nonempty = sizes > 0
+    pos = (sizes[nonempty, None] - 1) * QUANTILES[None, :]
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, sizes[nonempty, None] - 1)
+    base = offsets[:-1][nonempty, None]
+    frac = pos - lo
+    out[nonempty] = ordered[base + lo] * (1 - frac) + ordered[base + hi] * frac
+    return out
+
+
+class StyleCorpus:
+    """Reference documents in NumPy form; see the module docstring for the layout."""
+
+    def __init__(self, doc_ids: List[Any], labels: List[str], lengths: np.ndarray, offsets: np.ndarray,
+                 term_rows: List[Tuple[np.ndarray, np.ndarray]]):
+        self.doc_ids = doc_ids
+        self.labels = labels
+        self.lengths = lengths
+        self.offsets = offsets
+        sizes = np.diff(offsets)
+        # per-document sums from prefix sums (empty documents simply get 0)
+        csum = np.concatenate(([0.0], np.cumsum(lengths, dtype=np.float64)))
+        csq = np.concatenate(([0.0], np.cumsum(lengths.astype(np.float64) ** 2)))
+        sums = csum[offsets[1:]] - csum[offsets[:-1]]
+        squares = csq[offsets[1:]] - csq[offsets[:-1]]
+        safe = np.maximum(sizes, 1)
+        self.sentence_counts = sizes
+        self.means = sums / safe
+        self.stddevs = np.sqrt(np.maximum(squares / safe - self.means ** 2, 0.0))
+        self.quantiles = _segment_quantiles(lengths, offsets)
+
+        # tf-idf over hashed terms; idf is kept to weight drafts the same way
+        tf = np.zeros((len(doc_ids), HASH_DIM), dtype=np.float32)
+        for row, (ids, counts) in enumerate(term_rows):
+            tf[row, ids] = np.log1p(counts)
+        df = np.count_nonzero(tf, axis=0)
+        self.idf = (np.log((1 + len(doc_ids)) / (1 + df)) + 1).astype(np.float32)
+        self.term_matrix = self._normalise(tf * self.idf)
+
+    @staticmethod
+    def _normalise(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+    @classmethod
+    def from_texts(cls, docs: Iterable[Tuple[Any, str, str]]) -> "StyleCorpus":
+        """docs: (doc_id, label, text) triples."""
+        doc_ids, labels, chunks, term_rows = [], [], [], []
+        for doc_id, label, text in docs:
+            lengths, words = tokenize(text)
+            doc_ids.append(doc_id)
+            labels.append(label)
+            chunks.append(lengths)
+            term_rows.append(_hash_counts(words))
+        sizes = np.fromiter((len(c) for c in chunks), dtype=np.int64, count=len(chunks))
+        offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        lengths = np.concatenate(chunks).astype(np.int32) if chunks else np.zeros(0, dtype=np.int32)
+        return cls(doc_ids, labels, lengths, offsets, term_rows)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def distribution(self) -> Dict[str, Any]:
+        """Pooled sentence-length distribution of the whole corpus."""
+        if not self.lengths.size:
+            return {"documents": len(self), "sentences": 0}
+        pct = np.percentile(self.lengths, REPORT_PERCENTILES)
+        return {
+            "documents": len(self),
+            "sentences": int(self.lengths.size),
+            "mean": round(float(self.lengths.mean()), 2),
+            "stddev": round(float(self.lengths.std()), 2),
+            "percentiles": {f"p{p}": round(float(v), 1) for p, v in zip(REPORT_PERCENTILES, pct)},
+        }
+
+    def compare(self, text: str, top_n: int = 5) -> Dict[str, Any]:
+        """
+        Scores a draft against every document at once:
+        - length_distance: mean |quantile difference| of sentence lengths (a 1-D Wasserstein estimate)
+        - keyword_similarity: tf-idf cosine
+        - where the draft's mean / stddev sentence length fall among the documents (percentile rank)
+        """
+        lengths, words = tokenize(text)
+        draft_offsets = np.array([0, lengths.size], dtype=np.int64)
+        draft_q = _segment_quantiles(lengths, draft_offsets)[0]
+        ids, counts = _hash_counts(words)
+        draft_vec = np.zeros(HASH_DIM, dtype=np.float32)
+        draft_vec[ids] = np.log1p(counts)
+        draft_vec = self._normalise(draft_vec * self.idf)
+
+        length_distance = np.abs(self.quantiles - draft_q).mean(axis=1)
+        keyword_similarity = self.term_matrix @ draft_vec
+        mean = float(lengths.mean()) if lengths.size else 0.0
+        std = float(lengths.std()) if lengths.size else 0.0
+        # documents without sentences (e.g. image sources) take no part in the ranking
+        valid = self.sentence_counts > 0
+        has_valid = bool(valid.any())
+        # combined score: similar vocabulary and similar rhythm
+        scale = max(float(np.median(self.stddevs[valid])) if has_valid else 1.0, 1.0)
+        score = np.where(valid, keyword_similarity - length_distance / (scale * 4), -np.inf)
+        order = [i for i in np.argsort(-score)[:top_n] if valid[i]]
+        return {
+            "draft": {"sentences": int(lengths.size), "mean": round(mean, 2), "stddev": round(std, 2)},
+            "mean_percentile": round(float((self.means[valid] < mean).mean() * 100), 1) if has_valid else None,
+            "stddev_percentile": round(float((self.stddevs[valid] < std).mean() * 100), 1) if has_valid else None,
+            "length_distance": round(float(length_distance[valid].mean()), 3) if has_valid else None,
+            "keyword_similarity": round(float(keyword_similarity[valid].mean()), 3) if has_valid else None,
+            "nearest": [
+                {
+                    "id": self.doc_ids[i],
+                    "source": self.labels[i],
+                    "keyword_similarity": round(float(keyword_similarity[i]), 3),
+                    "length_distance": round(float(length_distance[i]), 3),
+                }
+                for i in order
+            ],
+        }
+
+
+# --- Corpus of a user's tone sources ---------------------------------------------
+
+def _corpus_signature(user_id) -> tuple:
+    row = db_pool.get_pool(common.DATABASE_FILE).fetchone(
+        "SELECT COUNT(*), MAX(id) FROM micro_roles WHERE user_id = ?", (user_id,))
+    return tuple(row or (0, None))
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _build_user_corpus(db_path: str, user_id, signature: tuple) -> StyleCorpus:
+    rows = db_pool.get_pool(db_path).fetchall(
+        "SELECT id, source_type, source_value FROM micro_roles WHERE user_id = ? ORDER BY id", (user_id,))
+    return StyleCorpus.from_texts(
+        (row_id, source_type or f"role {row_id}", blob_store.unpack_text(source_value) or "")
+        for row_id, source_type, source_value in rows
+    )
+
+
+def get_user_corpus(user_id) -> Optional[StyleCorpus]:
+    """The user's micro_roles sources as a StyleCorpus; rebuilt only when their rows change."""
+    signature = _corpus_signature(user_id)
+    if not signature[0]:
+        return None
+    return _build_user_corpus(common.DATABASE_FILE, user_id, signature)
+
+
+def benchmark(n_docs: int = 300, repeat: int = 20) -> Dict[str, float]:
+    docs = [(i, f"doc {i}", text_features.make_sample_text(4000, seed=i)) for i in range(n_docs)]
+    start = time.perf_counter()
+    corpus = StyleCorpus.from_texts(docs)
+    build_ms = (time.perf_counter() - start) * 1000
+    draft = text_features.make_sample_text(6000, seed=n_docs + 1)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        corpus.compare(draft)
+    return {"docs": n_docs, "build_ms": round(build_ms, 1),
+            "compare_ms": round((time.perf_counter() - start) * 1000 / repeat, 3)}
+
+
+if __name__ == "__main__":
+    import sys
+    print(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
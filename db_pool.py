@@ -0,0 +1,246 @@
+"""
+Small SQLite connection layer shared by the Streamlit pages.
+
+- ConnectionPool hands out pooled connections; a thread keeps the same connection
+  for nested calls, and no connection is ever used by two threads at once.
+- transaction() wraps work in an explicit BEGIN IMMEDIATE / COMMIT / ROLLBACK.
+- write() queues single statements on a WriteBatcher that commits many writes
+  (from many sessions) in one transaction instead of one commit per click.
+  If the writer thread dies, its pending writes fail (WriterStopped) and the next write
+  starts a new writer; a caller never waits longer than WRITE_TIMEOUT.
+"""
+
+import os
+import sqlite3
+import threading
+import queue
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import blob_store
+
+# seconds write(wait=True) waits for its batch (busy_timeout is 30s, so a healthy batch is done well before)
+WRITE_TIMEOUT = float(os.getenv("DB_WRITE_TIMEOUT", "60"))
+
+# hooks run on every new connection (e.g. to register SQL functions);
+# unpack_text() is always there because the search-index triggers and view call it
+_connection_hooks: List[Callable[[sqlite3.Connection], None]] = [blob_store.register_sql_functions]
+
+
+def add_connection_hook(hook: Callable[[sqlite3.Connection], None]) -> None:
+    """Registers a callable that is applied to every connection the pools open."""
+    if hook not in _connection_hooks:
+        _connection_hooks.append(hook)
+
+
+def open_connection(db_path: str) -> sqlite3.Connection:
+    """Opens a connection configured for concurrent readers and a single writer."""
+    # isolation_level=None -> autocommit; transactions are always explicit
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    except sqlite3.DatabaseError:
+        # e.g. read-only or in-memory databases; defaults are fine there
+        pass
+    for hook in _connection_hooks:
+        hook(conn)
+    return conn
+
+
+class WriterStopped(RuntimeError):
+    """The WriteBatcher thread stopped before the write was committed."""
+
+
+class WriteBatcher:
+    """
+    Background writer that drains queued statements and commits them together.
+    Each statement runs inside its own SAVEPOINT so one failing write does not
+    roll back the others in the same batch.
+    """
+
+    def __init__(self, db_path: str, max_batch: int = 100, max_delay: float = 0.02):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        # set (under _state_lock) once the thread has stopped taking writes
+        self._stopped: Optional[BaseException] = None
+        self._state_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{db_path}", daemon=True)
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._stopped is None and self._thread.is_alive()
+
+    def submit(self, sql: str, params: Sequence[Any] = ()) -> Future:
+        future: Future = Future()
+        with self._state_lock:
+            if self._stopped is not None:
+                future.set_exception(WriterStopped(f"SQLite writer for {self.db_path} stopped: {self._stopped!r}"))
+                return future
+            self._queue.put((sql, tuple(params), future))
+        return future
+
+    def _stop(self, error: BaseException, batch: list) -> None:
+        """Fails the writes of the interrupted batch and everything still queued."""
+        with self._state_lock:
+            self._stopped = error
+            pending = list(batch)
+            while True:
+                try:
+                    pending.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(WriterStopped(f"SQLite writer for {self.db_path} stopped: {error!r}"))
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batch = []
+        try:
+            conn = open_connection(self.db_path)
+            while True:
+                batch = self._collect()
+                self._write_batch(conn, batch)
+                batch = []
+        except BaseException as e:
+            self._stop(e, batch)
+            raise
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list) -> None:
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for sql, params, future in batch:
+                conn.execute("SAVEPOINT batch_item")
+                try:
+                    cur = conn.execute(sql, params)
+                    results.append((future, {"lastrowid": cur.lastrowid, "rowcount": cur.rowcount}, None))
+                    conn.execute("RELEASE batch_item")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO batch_item")
+                    conn.execute("RELEASE batch_item")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # the whole batch failed to commit; report it to every caller
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            results = [(future, None, e) for _, _, future in batch]
+        for future, value, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+
+class ConnectionPool:
+    """Bounded pool of connections to one database file."""
+
+    def __init__(self, db_path: str, max_size: int = 8):
+        self.db_path = db_path
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._local = threading.local()
+        self._batcher: Optional[WriteBatcher] = None
+        self._batcher_lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection; nested calls in the same thread reuse it."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = open_connection(self.db_path)
+            self._local.conn = conn
+            try:
+                yield conn
+            finally:
+                self._local.conn = None
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Runs the block in one explicit write transaction."""
+        with self.connection() as conn:
+            if conn.in_transaction:
+                # already inside a transaction of this thread; let the outer one commit
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> list:
+        with self.connection() as conn:
+            return conn.execute(sql, tuple(params)).fetchall()
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()):
+        with self.connection() as conn:
+            return conn.execute(sql, tuple(params)).fetchone()
+
+    def write(self, sql: str, params: Sequence[Any] = (), wait: bool = True,
+              timeout: Optional[float] = WRITE_TIMEOUT):
+        """
+        Queues a single write on the batcher.
+        With wait=True returns {"lastrowid", "rowcount"} once the batch committed
+        (re-raising the statement's error, e.g. sqlite3.IntegrityError, or WriterStopped;
+        concurrent.futures.TimeoutError after `timeout` seconds - the write stays queued and may
+        still commit); otherwise returns the Future.
+        """
+        batcher = self._batcher
+        if batcher is None or not batcher.alive:
+            with self._batcher_lock:
+                if self._batcher is None or not self._batcher.alive:
+                    # first write, or the previous writer thread died
+                    self._batcher = WriteBatcher(self.db_path)
+                batcher = self._batcher
+        future = batcher.submit(sql, params)
+        return future.result(timeout) if wait else future
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Returns the process-wide pool for a database file."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
@@ -1,6 +1,6 @@
 import streamlit as st
 #from crew_pipeline import run_pipeline
-from crew_pipeline_human import run_pipeline
+import pipeline_engine
 from zerogpt_api import check_ai_content
 import sqlite3
 import os
@@ -9,6 +9,10 @@ from highlight_ai_segments import display_highlighted_text
 import json
 from dotenv import load_dotenv
 import common
+import blob_store
+import db_pool
+import time
+import corpus_stats
 load_dotenv()
 
 DATABASE_FILE = os.getenv("DATABASE_FILE")
@@ -20,6 +24,12 @@ def load_record(record_id):
     c.execute("SELECT * FROM content_history WHERE id=?", (record_id,))
     row = c.fetchone()
     conn.close()
+    if row is None:
+        return row
+    # final_output / detection_result may be stored compressed (see blob_store.py)
+    row = list(row)
+    row[8] = blob_store.unpack_text(row[8])
+    row[9] = blob_store.unpack_detection(row[9], row[8])
     return row
 
 #from tools.serper_tool import SerperTool
@@ -34,32 +44,53 @@ def save_output_to_db(topic, researcher_goal, researcher_backstory,
                       final_output, detection_result):
     user = st.session_state['user_info']
     user_id = user['id']
-    conn = sqlite3.connect(DATABASE_FILE)
-    c = conn.cursor()
-
-    c.execute("""
-        INSERT INTO content_history (
-            topic, researcher_goal, researcher_backstory,
+    fields = common.pack_content_fields({"final_output": final_output, "detection_result": detection_result})
+
+    # pooled connection: the search-index triggers need unpack_text() registered
+    with db_pool.get_pool(DATABASE_FILE).transaction() as conn:
+        c = conn.execute("""
+            INSERT INTO content_history (
+                topic, researcher_goal, researcher_backstory,
+                writer_goal, writer_backstory,
+                editor_goal, editor_backstory,
+                final_output, detection_result,
+                user_id
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            topic,
+            researcher_goal, researcher_backstory,
             writer_goal, writer_backstory,
             editor_goal, editor_backstory,
-            final_output, detection_result,
+            fields["final_output"], fields["detection_result"],
             user_id
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        topic,
-        researcher_goal, researcher_backstory,
-        writer_goal, writer_backstory,
-        editor_goal, editor_backstory,
-        final_output, detection_result,
-        user_id
-    ))
-
-    conn.commit()
-
-    new_id = c.lastrowid
-    conn.close()
+        ))
+        new_id = c.lastrowid
     return new_id
+def show_style_comparison(user_id, text):
+    """Compares the draft with the user's tone sources (see corpus_stats.py)."""
+    if not text:
+        return
+    corpus = corpus_stats.get_user_corpus(user_id)
+    if corpus is None:
+        return
+    with st.expander("📊 Style vs. my tone sources", expanded=False):
+        start = time.perf_counter()
+        report = corpus.compare(str(text))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        dist = corpus.distribution()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Avg sentence length", report["draft"]["mean"],
+                    help=f"Higher than {report['mean_percentile']}% of your sources")
+        col2.metric("Sentence length stddev", report["draft"]["stddev"],
+                    help=f"Higher than {report['stddev_percentile']}% of your sources")
+        col3.metric("Keyword similarity", report["keyword_similarity"])
+        st.caption(f"Compared against {dist['documents']} sources ({dist['sentences']:,} sentences, "
+                   f"median length {dist.get('percentiles', {}).get('p50')}) in {elapsed_ms:.1f} ms")
+        if report["nearest"]:
+            st.dataframe(report["nearest"], use_container_width=True)
+
+
 def convert_to_single_line(posts):
     res = []
 
@@ -106,6 +137,30 @@ def generate_content_page():
         editor_goal = st.text_area("Goal", value=(row and row[6] if row and row[6] is not None else "Polish and refine the blog content for tone, clarity, and grammar."), placeholder="Polish and refine the blog content for tone, clarity, and grammar.")
         editor_backstory = st.text_area("Backstory", value=(row and row[7] if row and row[7] is not None else "You ensure it reads naturally and maintains tone."), placeholder="You ensure it reads naturally and maintains tone.")
 
+    # 🎯 Fingerprint the draft is scored against; humanizer passes stop once it matches
+    style_roles = {None: "Auto (newest active tone)"}
+    for role_id, source_type, tone in common.get_active_roles(user_id):
+        style_roles[role_id] = f"{source_type or f'Role {role_id}'}" + (f" — {tone}" if tone else "")
+    style_role_id = st.selectbox("Style target", list(style_roles), format_func=style_roles.get, key="style_role_id")
+    # ⚙️ Latency / cost tier (see pipeline_profiles.json)
+    pipeline_profile = pipeline_engine.profile_selectbox(default="fast")
+    speculative = pipeline_engine.speculative_checkbox()
+
+    def keep_result(results):
+        # ----- Save for editing -----
+        st.session_state.generated_content = results
+        st.session_state.editable_text = results
+        # ----- AI Detection (Send final text ONLY) -----
+        detection_result = check_ai_content(results)
+        st.session_state.detection_result = detection_result
+        return save_output_to_db(
+            topic,
+            researcher_goal, researcher_backstory,
+            writer_goal, writer_backstory,
+            editor_goal, editor_backstory,
+            results, json.dumps(detection_result)
+        )
+
     if "generated_content" not in st.session_state:
         st.session_state.generated_content = None
     if "detection_result" not in st.session_state:
@@ -150,7 +205,7 @@ def generate_content_page():
         if topic.strip():
             with st.spinner("🤖 Generating content..."):
                 try:
-                    res, task_description = run_pipeline(
+                    res, task_description = pipeline_engine.run_pipeline(
                         topic=topic,
                         researcher_goal=researcher_goal,
                         researcher_backstory=researcher_backstory,
@@ -158,6 +213,9 @@ def generate_content_page():
                         writer_backstory=writer_backstory,
                         editor_goal=editor_goal,
                         editor_backstory=editor_backstory,
+                        style_role_id=style_role_id,
+                        profile=pipeline_profile,
+                        speculative=speculative,
                     )
                     #st.json(res)
                     #results = res['result']
@@ -176,24 +234,8 @@ def generate_content_page():
 
 
 
-                    # ----- Save for editing -----
-                    st.session_state.generated_content = results
-                    st.session_state.editable_text = results
                     #st.json(results)
-                    # ----- AI Detection (Send final text ONLY) -----
-                    #st.markdown("### 🧩 {results}".format(results="AI Detection Results")   )
-                    detection_result = check_ai_content(results)
-
-                    #st.json(detection_result)
-                    #st.markdown("### 🧩 {detection_result}".format(detection_result="AI Detection Results"))
-                    st.session_state.detection_result = detection_result
-                    record_id = save_output_to_db(
-                        topic,
-                        researcher_goal, researcher_backstory,
-                        writer_goal, writer_backstory,
-                        editor_goal, editor_backstory,
-                        results, json.dumps(detection_result)
-                    )
+                    record_id = keep_result(results)
 
                     # REDIRECT
                     #redirect_to_edit(record_id)
@@ -257,6 +299,15 @@ def generate_content_page():
         else:
             st.warning("Please enter a topic first.")
 
+    # ⏹️ a run stopped by a rerun (its Cancel button, another widget) keeps the draft it had so far
+    interrupted = pipeline_engine.take_interrupted_run()
+    if interrupted is not None and interrupted.draft:
+        st.warning(f"⏹️ **Pipeline cancelled** ({interrupted.cancel_reason or 'page re-run'}); the draft so far is kept.")
+        try:
+            record_id = keep_result(interrupted.draft)
+        except Exception as e:
+            st.error(f"Error: {e}")
+
     # if st.session_state.generated_content:
     #     st.subheader("📝 Generated Content")
     #     st.markdown(st.session_state.generated_content)
@@ -278,4 +329,5 @@ def generate_content_page():
         #st.subheader("🧩 AI Detection Results")
         if st.session_state.detection_result:
             display_highlighted_text(st.session_state.detection_result)
+    show_style_comparison(user_id, st.session_state.get("editable_text") or (row[8] if row else None))
     return
@@ -4,6 +4,7 @@ import streamlit as st
 from zerogpt_api import check_ai_content
 import common
 import json
+import targeted_rewrite
 
 def display_highlighted_text(detection_result):
     params = st.query_params
@@ -134,6 +135,35 @@ def display_highlighted_text(detection_result):
             st.session_state.show_editor = True
             st.rerun()
 
+        # 🎯 Re-humanize only the highlighted sentences (a fraction of a full pipeline pass)
+        if ai_segments and input_text and st.button("🎯 Rewrite Flagged Sentences"):
+            with st.spinner(f"Rewriting {len(ai_segments)} flagged sentence(s)..."):
+                user = st.session_state.get("user_info")
+                personas = common.get_selected_tones_by_user(user['id']) if user else None
+                try:
+                    rewrite = targeted_rewrite.rewrite_flagged(input_text, detection_result, personas=personas)
+                except Exception as e:
+                    st.error(f"Targeted rewrite failed: {e}")
+                    st.stop()
+                if not rewrite["rewritten"]:
+                    st.warning("⚠️ No flagged sentence could be rewritten; the content is unchanged.")
+                    st.stop()
+                new_text = rewrite["text"]
+                new_detection = check_ai_content(new_text)
+                st.session_state.detection_result = new_detection
+                st.session_state.editable_text = new_text
+                st.session_state.generated_content = new_text
+                record_id = st.session_state.record_id
+                if record_id:
+                    common.update_output_to_db(
+                    record_id,
+                    final_output=new_text,
+                    detection_result=json.dumps(new_detection)
+                    )
+                st.success(f"✅ Rewrote {rewrite['rewritten']}/{rewrite['spans']} passage(s) "
+                           f"({rewrite['sent_chars']} of {len(input_text)} characters sent).")
+                st.rerun()
+
     else:
         # EDIT MODE
         st.markdown("---")
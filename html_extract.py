@@ -0,0 +1,355 @@
+"""
+Main-text extraction from HTML pages (the fallback after newspaper3k in fetch_article_text).
+
+The page is streamed through an event parser - lxml's target parser when lxml is
+installed, the stdlib html.parser otherwise - into ContentDensityHandler, which keeps
+text plus per-block statistics instead of a DOM. When the page is done, blocks are
+scored readability-style (text length and commas of paragraphs flow into their
+containers, link-heavy blocks are penalised) and the text of the best container is
+returned. Boilerplate (nav / aside / footer / form, or class / id names like "sidebar",
+"comments", "ads") only lowers a block's score; it is left out of the text when it sits
+inside the chosen container, never when it wraps it.
+Engines are pluggable; "bs4" is the previous BeautifulSoup html.parser path.
+
+Benchmark against the previous path on saved pages (defaults to fixtures/html):
+    python html_extract.py [fixtures_dir]
+"""
+
+import os
+import re
+import time
+from html.parser import HTMLParser
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+try:
+    from lxml import etree
+except Exception:
+    etree = None
+
+# elements whose content is never text of the page
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "head", "select", "button"}
+# elements that delimit blocks of text
+BLOCK_TAGS = {
+    "article", "main", "section", "div", "p", "pre", "td", "th", "li", "ul", "ol", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6", "table", "tbody", "tr", "body", "nav", "aside", "footer",
+    "header", "form", "figure", "figcaption", "dl", "dd", "dt",
+}
+# blocks whose own text counts as a paragraph
+PARAGRAPH_TAGS = {"p", "pre", "td", "blockquote", "li", "dd"}
+# blocks left out of the output (unless they contain the main text)
+BOILERPLATE_TAGS = {"nav", "aside", "footer", "form"}
+TAG_WEIGHTS = {"article": 25, "main": 15, "section": 3, "div": 5, "pre": 3, "td": 3, "blockquote": 3, "body": -5}
+# whole words of class / id names ("-" and "_" separate words: "site-header", "ad_slot")
+POSITIVE_RE = re.compile(
+    r"(?<![a-z0-9])(article|body|content|entry|main|page|post|text|blog|story)(?![a-z0-9])", re.I)
+NEGATIVE_RE = re.compile(
+    r"(?<![a-z0-9])(comments?|footer|foot|nav|navbar|navigation|sidebar|menu|share|sharing|social|related|"
+    r"promo|banner|ads?|advert|advertisement|cookies?|header|masthead|widgets?)(?![a-z0-9])", re.I)
+MIN_PARAGRAPH_CHARS = 25
+# a best container with less text than this falls back to the whole page
+MIN_CONTENT_CHARS = 200
+STREAM_CHUNK_CHARS = 64 * 1024
+
+DEFAULT_ENGINE = os.getenv("HTML_EXTRACT_ENGINE") or ("lxml" if etree is not None else "html.parser")
+
+
+class _Block:
+    __slots__ = ("tag", "parent", "start", "end", "text_len", "link_len", "commas", "score", "weight", "removed",
+                 "boilerplate")
+
+    def __init__(self, tag: str, parent: int, start: int, weight: float):
+        self.tag = tag
+        self.parent = parent
+        self.start = start       # index of the first text piece inside the block
+        self.end = start         # index after the last one (set on close)
+        self.text_len = 0        # characters of text inside, children included
+        self.link_len = 0        # of which inside <a>
+        self.commas = 0
+        self.score = 0.0
+        self.weight = weight
+        self.removed = False      # link list: its text is dropped
+        self.boilerplate = False  # nav / footer / negative name: dropped unless it holds the main text
+
+
+class ContentDensityHandler:
+    """
+    Parser target: start(tag, attrs) / end(tag) / data(text) / close().
+    Works for lxml's target interface and (through _StdlibParser) for html.parser.
+    """
+
+    def __init__(self):
+        self.pieces: List[Optional[str]] = []
+        self.blocks: List[_Block] = [_Block("#root", -1, 0, 0)]
+        self.stack: List[int] = [0]
+        self.tags: List[str] = []   # open skip / link / block tags, to match end tags
+        self.skip_depth = 0
+        self.link_depth = 0
+
+    # --- parser events ---
+    def start(self, tag, attrs):
+        tag = str(tag).lower()
+        if tag in SKIP_TAGS or self.skip_depth:
+            if tag in SKIP_TAGS:
+                self.skip_depth += 1
+                self.tags.append(tag)
+            return
+        if tag == "a":
+            self.link_depth += 1
+            self.tags.append(tag)
+        elif tag in BLOCK_TAGS:
+            if tag == "p" and self.blocks[self.stack[-1]].tag == "p":
+                # <p> implicitly closes an open <p> (html.parser does not do this for us)
+                self.end("p")
+            attrs = dict(attrs or {})
+            names = f"{attrs.get('class') or ''} {attrs.get('id') or ''}"
+            weight = TAG_WEIGHTS.get(tag, 0)
+            if POSITIVE_RE.search(names):
+                weight += 25
+            if NEGATIVE_RE.search(names):
+                weight -= 25
+            self.blocks.append(_Block(tag, self.stack[-1], len(self.pieces), weight))
+            self.stack.append(len(self.blocks) - 1)
+            self.tags.append(tag)
+
+    def end(self, tag):
+        tag = str(tag).lower()
+        if tag not in self.tags:
+            return
+        # close everything opened after the matching start tag (tolerates unclosed children)
+        while self.tags:
+            open_tag = self.tags.pop()
+            if open_tag in SKIP_TAGS:
+                self.skip_depth -= 1
+            elif open_tag == "a":
+                self.link_depth -= 1
+            else:
+                self._close_block()
+            if open_tag == tag:
+                break
+
+    def data(self, text):
+        if self.skip_depth or not text or text.isspace():
+            return
+        self.pieces.append(text)
+        block = self.blocks[self.stack[-1]]
+        block.text_len += len(text)
+        block.commas += text.count(",")
+        if self.link_depth:
+            block.link_len += len(text)
+
+    def close(self) -> str:
+        while len(self.stack) > 1:
+            self._close_block()
+        root = self.blocks[0]
+        root.end = len(self.pieces)
+        return self.best_text()
+
+    # --- scoring ---
+    def _close_block(self):
+        idx = self.stack.pop()
+        block = self.blocks[idx]
+        block.end = len(self.pieces)
+        link_density = block.link_len / block.text_len if block.text_len else 0.0
+        # a negative name only marks the block: a "with-sidebar" wrapper may hold the article
+        block.boilerplate = block.tag in BOILERPLATE_TAGS or (block.weight < 0 and block.tag != "body")
+        if link_density > 0.5 and block.text_len < 500:
+            block.removed = True
+            for i in range(block.start, block.end):
+                self.pieces[i] = None
+        parent = self.blocks[block.parent]
+        # sizes flow up so every container knows its total / link text
+        parent.text_len += block.text_len
+        parent.link_len += block.link_len
+        parent.commas += block.commas
+        if block.removed or block.boilerplate or block.tag not in PARAGRAPH_TAGS or block.text_len < MIN_PARAGRAPH_CHARS:
+            return
+        score = 1 + block.commas + min(block.text_len // 100, 3)
+        parent.score += score
+        if parent.parent >= 0:
+            self.blocks[parent.parent].score += score / 2
+
+    def best_text(self) -> str:
+        best, best_score = None, 0.0
+        for idx, block in enumerate(self.blocks[1:], 1):
+            if block.removed or block.score <= 0:
+                continue
+            link_density = block.link_len / block.text_len if block.text_len else 0.0
+            score = (block.score + block.weight) * (1 - link_density)
+            if score > best_score:
+                best, best_score = idx, score
+        text = self._text(best) if best is not None else ""
+        if len(text) < MIN_CONTENT_CHARS:
+            text = self._text(0)
+        if len(text) < MIN_CONTENT_CHARS:
+            # everything looks like boilerplate: better than nothing
+            text = self._text(0, keep_boilerplate=True)
+        return text
+
+    def _inside(self, idx: int, ancestor: int) -> bool:
+        while idx > ancestor:
+            idx = self.blocks[idx].parent
+        return idx == ancestor
+
+    def _text(self, idx: int, keep_boilerplate: bool = False) -> str:
+        """Text of a block without its boilerplate descendants (the block itself is always kept)."""
+        block = self.blocks[idx]
+        keep = [True] * (block.end - block.start)
+        if not keep_boilerplate:
+            for child_idx in range(idx + 1, len(self.blocks)):
+                child = self.blocks[child_idx]
+                if child.start >= block.end:
+                    break
+                if child.boilerplate and self._inside(child_idx, idx):
+                    for i in range(child.start, child.end):
+                        keep[i - block.start] = False
+        pieces = (p for i, p in enumerate(self.pieces[block.start:block.end]) if p and keep[i])
+        return re.sub(r"\s+", " ", " ".join(pieces)).strip()
+
+
+class _StdlibParser(HTMLParser):
+    """Feeds html.parser events into a ContentDensityHandler."""
+
+    def __init__(self, target: ContentDensityHandler):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        # <br/>, <img/>: nothing to open
+        pass
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def close(self):
+        super().close()
+        return self.target.close()
+
+
+class StreamingExtractor:
+    """Incremental extractor: feed() HTML chunks as they arrive, close() returns the main text."""
+
+    def __init__(self, engine: str = DEFAULT_ENGINE):
+        self.handler = ContentDensityHandler()
+        if engine == "lxml":
+            if etree is None:
+                raise RuntimeError("The 'lxml' engine needs the lxml package.")
+            self.parser = etree.HTMLParser(target=self.handler, recover=True, no_network=True)
+        elif engine == "html.parser":
+            self.parser = _StdlibParser(self.handler)
+        else:
+            raise ValueError(f"Engine {engine!r} does not stream; use extract_text().")
+
+    def feed(self, chunk: str) -> None:
+        self.parser.feed(chunk)
+
+    def close(self) -> str:
+        return self.parser.close()
+
+
+def _extract_streaming(html: Union[str, Iterable[str]], engine: str) -> str:
+    extractor = StreamingExtractor(engine)
+    chunks = (html[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(html), STREAM_CHUNK_CHARS)) \
+        if isinstance(html, str) else html
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor.close() or ""
+
+
+def _extract_bs4(html: Union[str, Iterable[str]]) -> str:
+    """Previous fallback: BeautifulSoup(html.parser), <article> or the whole page."""
+    from bs4 import BeautifulSoup
+    if not isinstance(html, str):
+        html = "".join(html)
+    soup = BeautifulSoup(html, "html.parser")
+    # remove scripts/styles
+    for s in soup(["script", "style", "noscript"]):
+        s.extract()
+    # pick article tag if present
+    article = soup.find("article")
+    body_text = article.get_text(separator=" ") if article else soup.get_text(separator=" ")
+    return re.sub(r"\s+", " ", body_text).strip()
+
+
+ENGINES: Dict[str, Callable[[Union[str, Iterable[str]]], str]] = {
+    "lxml": lambda html: _extract_streaming(html, "lxml"),
+    "html.parser": lambda html: _extract_streaming(html, "html.parser"),
+    "bs4": _extract_bs4,
+}
+
+
+def available_engines() -> List[str]:
+    names = ["html.parser"]
+    if etree is not None:
+        names.insert(0, "lxml")
+    try:
+        import bs4  # noqa: F401
+        names.append("bs4")
+    except Exception:
+        pass
+    return names
+
+
+def extract_text(html: Union[str, Iterable[str]], engine: Optional[str] = None) -> str:
+    """Main text of a page; `html` may be a string or an iterable of chunks."""
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown extraction engine {engine!r}; choose from {sorted(ENGINES)}")
+    return ENGINES[engine](html)
+
+
+# --- Benchmark ----------------------------------------------------------------
+
+def _synthetic_page(paragraphs: int = 200) -> str:
+    nav = "".join(f'<li><a href="/p{i}">Menu item {i}</a></li>' for i in range(40))
+    body = "".join(
+        f"<p>Paragraph {i}: outsourcing is, in reality, a decision about focus, budget and time, "
+        f"and most small teams learn that the hard way.</p>" for i in range(paragraphs)
+    )
+    return (f"<html><head><title>t</title><script>var x = 1;</script><style>p{{}}</style></head><body>"
+            f"<header><nav><ul>{nav}</ul></nav></header><div class='content'><article>{body}</article></div>"
+            f"<aside class='sidebar'>{nav}</aside><footer>© footer</footer></body></html>")
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
+
+def load_fixtures(directory: Optional[str]) -> Dict[str, str]:
+    """*.html files of a directory (fixtures/html by default); a synthetic page if there are none."""
+    pages = {}
+    directory = directory or FIXTURES_DIR
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as f:
+                    pages[name] = f.read()
+    return pages or {"synthetic.html": _synthetic_page()}
+
+
+def benchmark(directory: Optional[str] = None, repeat: int = 5) -> Dict[str, Dict[str, float]]:
+    """Average ms per page, extracted characters and pages that came out empty, per available engine."""
+    pages = load_fixtures(directory)
+    results = {}
+    for engine in available_engines():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            texts = {name: extract_text(html, engine) for name, html in pages.items()}
+        elapsed = (time.perf_counter() - start) * 1000 / repeat
+        results[engine] = {"pages": len(pages), "ms_per_page": round(elapsed / len(pages), 3),
+                           "chars": sum(len(t) for t in texts.values()),
+                           "empty": sorted(name for name, t in texts.items() if not t)}
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    directory = sys.argv[1] if len(sys.argv) > 1 else None
+    for name, row in benchmark(directory).items():
+        print(f"{name:12s} {row}")
+    for name, html in load_fixtures(directory).items():
+        print(f"  {name:28s} {extract_text(html)[:90]!r}")
@@ -0,0 +1,219 @@
+"""
+Shared HTTP layer for page downloads (fetch_article_text, batch tone import).
+
+- One requests.Session with a pooled, retrying adapter for the whole process.
+- On-disk cache in HTTP_CACHE_DIR: a page younger than HTTP_CACHE_FRESH_SECONDS is served
+  without a request; older entries are revalidated with If-None-Match / If-Modified-Since
+  and a 304 reuses the stored body.
+- The cache keeps the response bytes and their charset: the Content-Type charset, else the
+  page's <meta charset>, else the one detected from the bytes (requests would decode a
+  header without charset as ISO-8859-1 and garble UTF-8 pages).
+- fetch_many() / fetch_many_async() download many URLs in parallel (asyncio + worker threads,
+  bounded by a semaphore).
+"""
+
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib3.util.retry import Retry
+except Exception:
+    Retry = None
+
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", ".http_cache")
+CACHE_FRESH_SECONDS = int(os.getenv("HTTP_CACHE_FRESH_SECONDS", "600"))
+FETCH_CONCURRENCY = int(os.getenv("HTTP_FETCH_CONCURRENCY", "8"))
+USER_AGENT = "Mozilla/5.0"
+# <meta charset="..."> / <meta http-equiv="Content-Type" content="text/html; charset=...">
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_.:-]+)', re.I)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide session (keep-alive connections are reused across calls and threads)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update({"User-Agent": USER_AGENT})
+                retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504)) if Retry else 0
+                adapter = HTTPAdapter(pool_connections=FETCH_CONCURRENCY, pool_maxsize=FETCH_CONCURRENCY,
+                                      max_retries=retries)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+# --- Disk cache ----------------------------------------------------------------
+
+def _cache_paths(url: str):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".json"), os.path.join(CACHE_DIR, key + ".html")
+
+
+def _read_cache(url: str):
+    """(meta, body bytes) of a cached page; entries without a stored encoding are misses."""
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not meta.get("encoding"):
+            # written before the cache kept bytes: the text may be mis-decoded
+            return None, None
+        with open(body_path, "rb") as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None, None
+
+
+def _write_file(path: str, data: bytes) -> None:
+    # write-then-rename so a concurrent reader never sees half a file
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_cache(url: str, meta: Dict, body: Optional[bytes] = None) -> None:
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        meta_path, body_path = _cache_paths(url)
+        if body is not None:
+            _write_file(body_path, body)
+        _write_file(meta_path, json.dumps(meta).encode("utf-8"))
+    except OSError:
+        # the cache is an optimisation only
+        pass
+
+
+def clear_cache(older_than: Optional[float] = None) -> int:
+    """Removes cached pages (all, or those not validated for `older_than` seconds). Returns the number removed."""
+    removed = 0
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+    now = time.time()
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        meta_path = os.path.join(CACHE_DIR, name)
+        if older_than is not None:
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    if now - json.load(f).get("checked_at", 0) < older_than:
+                        continue
+            except (OSError, ValueError):
+                pass
+        for path in (meta_path, meta_path[:-5] + ".html"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        removed += 1
+    return removed
+
+
+# --- Decoding ------------------------------------------------------------------
+
+def _known_encoding(name: Optional[str]) -> Optional[str]:
+    try:
+        return codecs.lookup(name).name if name else None
+    except LookupError:
+        return None
+
+
+def response_encoding(r: requests.Response) -> str:
+    """Charset of a page: Content-Type header, else <meta charset>, else detected from the bytes."""
+    if "charset" in r.headers.get("Content-Type", "").lower():
+        encoding = _known_encoding(r.encoding)
+        if encoding:
+            return encoding
+    match = _META_CHARSET_RE.search(r.content[:4096])
+    encoding = _known_encoding(match.group(1).decode("ascii")) if match else None
+    return encoding or _known_encoding(r.apparent_encoding) or "utf-8"
+
+
+def decode(body: bytes, encoding: Optional[str]) -> str:
+    return body.decode(_known_encoding(encoding) or "utf-8", errors="replace")
+
+
+# --- Fetching ------------------------------------------------------------------
+
+def fetch_html(url: str, timeout: int = 10, fresh_seconds: int = CACHE_FRESH_SECONDS) -> str:
+    """
+    Returns the page HTML, using the disk cache and conditional GETs.
+    Raises requests.RequestException on network / HTTP errors.
+    """
+    meta, cached = _read_cache(url)
+    now = time.time()
+    if meta and cached is not None and now - meta.get("checked_at", 0) < fresh_seconds:
+        return decode(cached, meta["encoding"])
+
+    headers = {}
+    if meta and cached is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = get_session().get(url, timeout=timeout, headers=headers)
+    if r.status_code == 304 and cached is not None:
+        meta["checked_at"] = now
+        _write_cache(url, meta)
+        return decode(cached, meta["encoding"])
+    r.raise_for_status()
+    encoding = response_encoding(r)
+    if "no-store" not in r.headers.get("Cache-Control", "").lower():
+        _write_cache(url, {
+            "url": url,
+            "final_url": r.url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "encoding": encoding,
+            "checked_at": now,
+        }, r.content)
+    return decode(r.content, encoding)
+
+
+async def fetch_many_async(urls: Iterable[str], concurrency: int = FETCH_CONCURRENCY,
+                           timeout: int = 10) -> Dict[str, Union[str, Exception]]:
+    """Fetches URLs in parallel; returns {url: html or the exception raised for it}."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(url):
+        async with semaphore:
+            try:
+                return url, await asyncio.to_thread(fetch_html, url, timeout)
+            except Exception as e:
+                return url, e
+
+    unique = list(dict.fromkeys(urls))
+    return dict(await asyncio.gather(*(one(u) for u in unique)))
+
+
+def fetch_many(urls: Iterable[str], concurrency: int = FETCH_CONCURRENCY,
+               timeout: int = 10) -> Dict[str, Union[str, Exception]]:
+    """Blocking wrapper around fetch_many_async (for scripts and the Streamlit thread)."""
+    return asyncio.run(fetch_many_async(urls, concurrency, timeout))
+
+
+if __name__ == "__main__":
+    # python http_fetch.py <url> [<url> ...]   (run twice to see the cache at work)
+    import sys
+    start = time.perf_counter()
+    for url, result in fetch_many(sys.argv[1:]).items():
+        print(url, "->", f"{len(result):,} chars" if isinstance(result, str) else f"error: {result}")
+    print(f"{(time.perf_counter() - start) * 1000:.0f} ms")
@@ -6,7 +6,7 @@ import pandas as pd
 import json # Added for session persistence
 import os
 import common
-import human_convert_pipeline
+import pipeline_engine
 import zerogpt_api
 import highlight_ai_segments
 #import generatecontent
@@ -125,6 +125,10 @@ def generate_content_page():
         editor_goal = st.text_area("Goal", value=(row and row[6] if row and row[6] is not None else "Polish and refine the blog content for tone, clarity, and grammar."), placeholder="Polish and refine the blog content for tone, clarity, and grammar.")
         editor_backstory = st.text_area("Backstory", value=(row and row[7] if row and row[7] is not None else "You ensure it reads naturally and maintains tone."), placeholder="You ensure it reads naturally and maintains tone.")
 
+    # ⚙️ Latency / cost tier (see pipeline_profiles.json)
+    pipeline_profile = pipeline_engine.profile_selectbox(default="balanced", key="convert_pipeline_profile")
+    speculative = pipeline_engine.speculative_checkbox(key="convert_pipeline_speculative")
+
     if "generated_content" not in st.session_state:
         st.session_state.generated_content = None
     if "detection_result" not in st.session_state:
@@ -169,7 +173,7 @@ def generate_content_page():
         if topic.strip():
             with st.spinner("🤖 Generating content..."):
                 try:
-                    res, task_description = human_convert_pipeline.run_pipeline(
+                    res, task_description = pipeline_engine.run_pipeline(
                         topic=topic,
                         researcher_goal=researcher_goal,
                         researcher_backstory=researcher_backstory,
@@ -177,6 +181,8 @@ def generate_content_page():
                         writer_backstory=writer_backstory,
                         editor_goal=editor_goal,
                         editor_backstory=editor_backstory,
+                        profile=pipeline_profile,
+                        speculative=speculative,
                     )
                     #st.json(res)
                     #results = res['result']
@@ -1,7 +1,7 @@
 """
 Micro Humanizer Role Generator (Complete Script)
 - Streamlit UI: input URL OR paste text OR upload local file
-- Content extraction (newspaper3k + BeautifulSoup fallback)
+- Content extraction (newspaper3k + readability-style fallback, see html_extract.py)
 - NLP analysis (spaCy + TextBlob + textstat)
 - LLM-based JSON role generator (OpenAI ChatCompletion)
 - Fallback template JSON generator if OPENAI_API_KEY is not set
@@ -20,34 +20,14 @@ from openai import OpenAI
 
 import streamlit as st
 from dotenv import load_dotenv
-# Content extraction
-from newspaper import Article
-from bs4 import BeautifulSoup
+# Content extraction (newspaper3k is imported on first use)
 import requests
+import http_fetch
+import html_extract
 
-# NLP
-try:
-    import spacy
-    try:
-        # load lazily; if model not present this may throw
-        nlp = spacy.load("en_core_web_sm")
-    except Exception:
-        nlp = None
-except Exception:
-    spacy = None
-    nlp = None
-
-# TextBlob (pure-python) — optional but recommended to be installed
-try:
-    from textblob import TextBlob
-except Exception:
-    TextBlob = None
-
-# textstat is pure-python — better to ensure it's installed; fallback safe functions:
-try:
-    import textstat
-except Exception:
-    textstat = None
+# NLP backends are loaded lazily and shared across sessions (see nlp_models.py)
+import nlp_models
+import text_features
 
 
 #from textblob import TextBlob
@@ -56,6 +36,8 @@ except Exception:
 # LLM
 import openai
 import common
+import role_batch
+import role_memo
 load_dotenv()
 # Setup ----
 st.set_page_config(page_title="Micro Humanizer Role Generator", layout="wide")
@@ -70,11 +52,21 @@ openai_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY")
 def clean_whitespace(text: str) -> str:
     return re.sub(r'\s+', ' ', text).strip()
 
-def fetch_article_text(url: str, timeout: int = 10) -> str:
-    """Try newspaper3k first; fallback to requests + BeautifulSoup."""
+def fetch_article_text(url: str, timeout: int = 10, html: Optional[str] = None) -> str:
+    """
+    Download once (shared session + HTTP cache, see http_fetch.py); newspaper3k first, html_extract fallback on the same HTML.
+    `html` is a page already downloaded (http_fetch.fetch_many), decoded with its own charset.
+    """
+    if html is None:
+        try:
+            html = http_fetch.fetch_html(url, timeout=timeout)
+        except Exception as e:
+            raise RuntimeError(f"Failed to fetch URL: {e}")
+
     try:
+        from newspaper import Article
         art = Article(url)
-        art.download()
+        art.download(input_html=html)
         art.parse()
         txt = art.text
         if txt and len(txt) > 50:
@@ -82,18 +74,9 @@ def fetch_article_text(url: str, timeout: int = 10) -> str:
     except Exception:
         pass
 
-    # Fallback
+    # Fallback: content-density extraction over the same HTML (lxml when installed, see html_extract.py)
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent":"Mozilla/5.0"})
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html.parser")
-        # remove scripts/styles
-        for s in soup(["script","style","noscript"]):
-            s.extract()
-        # pick article tag if present
-        article = soup.find("article")
-        body_text = article.get_text(separator=" ") if article else soup.get_text(separator=" ")
-        return clean_whitespace(body_text)
+        return clean_whitespace(html_extract.extract_text(html))
     except Exception as e:
         raise RuntimeError(f"Failed to fetch URL: {e}")
 
@@ -171,105 +154,9 @@ def analyze_text_features(text: str) -> Dict[str, Any]:
     """
     Robust text analysis that works whether spaCy (nlp) is available or not.
     Always returns a dict with the same keys and safe default values.
+    Single pass over the sentences, see text_features.py.
     """
-    # limit text length for performance
-    sample = text[:20000] if isinstance(text, str) else ""
-
-    # prepare containers with safe defaults
-    sentences = []
-    words = []
-
-    # If spaCy is available, use it for better tokenization/sentences
-    if nlp:
-        try:
-            doc = nlp(sample)
-            sentences = [s.text.strip() for s in doc.sents if s.text.strip()]
-            words = [token.text for token in doc if getattr(token, "is_alpha", False)]
-        except Exception:
-            # fallback to naive approach below if spacy fails at runtime
-            sentences = []
-            words = []
-
-    # Fallback (or if spaCy not available / produced nothing)
-    if not sentences:
-        # naive sentence split
-        import re
-        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', sample) if s.strip()]
-
-    if not words:
-        # naive tokenization: alphabetic words only
-        import re
-        words = re.findall(r'\b[a-zA-Z]+\b', sample)
-
-    # Safe numeric computations
-    sent_texts = sentences or []
-    word_list = words or []
-
-    num_sentences = len(sent_texts)
-    num_words = len(word_list)
-
-    # average sentence length (words per sentence)
-    avg_sentence_len = 0.0
-    if num_sentences > 0:
-        avg_sentence_len = sum(len(s.split()) for s in sent_texts) / num_sentences
-
-    # standard deviation of sentence lengths
-    sentence_var = 0.0
-    if num_sentences > 0:
-        sentence_var = (sum((len(s.split()) - avg_sentence_len) ** 2 for s in sent_texts) / num_sentences) ** 0.5
-
-    # lexical diversity
-    lexical_diversity = round(len(set(word_list)) / max(1, num_words), 3) if num_words > 0 else 0.0
-
-    # sentiment via TextBlob if available
-    if TextBlob:
-        try:
-            tb = TextBlob(sample)
-            polarity = tb.sentiment.polarity
-            subjectivity = tb.sentiment.subjectivity
-        except Exception:
-            polarity = 0.0
-            subjectivity = 0.0
-    else:
-        polarity = 0.0
-        subjectivity = 0.0
-
-    # readability via textstat if available
-    if textstat and len(sample.split()) > 100:
-        try:
-            flesch = textstat.flesch_reading_ease(sample)
-        except Exception:
-            flesch = None
-    else:
-        flesch = None
-
-    # transitions heuristic
-    common_transitions = []
-    transitions = ["however","therefore","meanwhile","in reality","that said","on the other hand","but then"]
-    lowered = sample.lower()
-    for t in transitions:
-        if lowered.count(t) > 0:
-            common_transitions.append(t)
-
-    # top keywords by simple frequency
-    token_freq = {}
-    for w in word_list:
-        lw = w.lower()
-        token_freq[lw] = token_freq.get(lw, 0) + 1
-    top_keywords = [k for k,v in sorted(token_freq.items(), key=lambda x: x[1], reverse=True)[:20]]
-
-    return {
-        "word_count": num_words,
-        "sentence_count": num_sentences,
-        "avg_sentence_length": round(avg_sentence_len, 2),
-        "sentence_length_stddev": round(sentence_var, 2),
-        "lexical_diversity": lexical_diversity,
-        "polarity": round(polarity, 3),
-        "subjectivity": round(subjectivity, 3),
-        "flesch_reading_ease": round(flesch, 2) if flesch is not None else None,
-        "common_transitions": common_transitions,
-        "top_keywords": top_keywords,
-    }
+    return text_features.extract_features(text)
 
 # Micro humanizer template fallback (non-LLM) ----
 def build_role_template(text_stats: Dict[str, Any], topic: Optional[str]=None) -> Dict[str, Any]:
@@ -334,10 +221,113 @@ def process_content(text, url=""):
 # =====================================================
 
 # LLM-based JSON generation ----
+# Structured output schema for the role JSON (strict mode: every key required, no extras)
+ROLE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "role": {"type": "string"},
+        "goal": {"type": "string"},
+        "backstory": {"type": "string"},
+        "tasks": {"type": "array", "items": {"type": "string"}},
+        "tone": {"type": "string"},
+        "style": {"type": "string"},
+        "patterns": {
+            "type": "object",
+            "properties": {
+                "avg_sentence_length": {"type": "number"},
+                "sentence_length_stddev": {"type": "number"},
+                "lexical_diversity": {"type": "number"},
+                "common_transitions": {"type": "array", "items": {"type": "string"}},
+                "top_keywords": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["avg_sentence_length", "sentence_length_stddev", "lexical_diversity",
+                         "common_transitions", "top_keywords"],
+            "additionalProperties": False,
+        },
+        "micro_agent_list": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["role", "goal", "backstory", "tasks", "tone", "style", "patterns", "micro_agent_list"],
+    "additionalProperties": False,
+}
+
+ROLE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "micro_humanizer_role", "strict": True, "schema": ROLE_SCHEMA},
+}
+
+
+def _schema_errors(value: Any, schema: Dict[str, Any], path: str) -> list:
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return [f"{path} must be an object"]
+        errors = [f"{path}.{key} is missing" for key in schema.get("required", []) if key not in value]
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                errors += _schema_errors(value[key], sub, f"{path}.{key}")
+        return errors
+    if kind == "array":
+        if not isinstance(value, list):
+            return [f"{path} must be an array"]
+        errors = []
+        for idx, item in enumerate(value):
+            errors += _schema_errors(item, schema.get("items", {}), f"{path}[{idx}]")
+        return errors
+    if kind == "string" and not (isinstance(value, str) and value.strip()):
+        return [f"{path} must be a non-empty string"]
+    if kind == "number" and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        return [f"{path} must be a number"]
+    return []
+
+
+def validate_role_json(data: Any) -> list:
+    """Returns a list of problems with a generated role (empty when it is usable)."""
+    errors = _schema_errors(data, ROLE_SCHEMA, "$")
+    if not errors:
+        if not 4 <= len(data["tasks"]) <= 8:
+            errors.append("$.tasks must have 4-8 items")
+        if not data["micro_agent_list"]:
+            errors.append("$.micro_agent_list must not be empty")
+    return errors
+
+
+def _parse_role_json(content: str) -> Any:
+    """JSON mode returns bare JSON; the brace scan only matters for models without it."""
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        first = (content or "").find("{")
+        last = (content or "").rfind("}")
+        if first != -1 and last > first:
+            return json.loads(content[first:last+1])
+        raise
+
+
+# models that rejected json_schema; they get plain JSON mode straight away
+_NO_JSON_SCHEMA_MODELS = set()
+
+
+def _role_completion(client, messages, response_format):
+    """One chat call in structured-output mode; models without json_schema support get plain JSON mode."""
+    model = os.getenv("OPENAI_MODEL","gpt-4o-mini")
+    kwargs = dict(model=model, messages=messages, temperature=0.9, max_tokens=700)
+    if model not in _NO_JSON_SCHEMA_MODELS:
+        try:
+            resp = client.chat.completions.create(response_format=response_format, **kwargs)
+            return resp.choices[0].message.content
+        except openai.BadRequestError as e:
+            if "response_format" not in str(e) and "json_schema" not in str(e):
+                raise
+            _NO_JSON_SCHEMA_MODELS.add(model)
+    resp = client.chat.completions.create(response_format={"type": "json_object"}, **kwargs)
+    return resp.choices[0].message.content
+
+
 def generate_role_with_llm(text: str, stats: Dict[str,Any], topic: Optional[str]=None) -> Dict[str,Any]:
     """
-    Use OpenAI ChatCompletion to produce a JSON with fields:
-    role, goal, backstory, tasks, tone, style, patterns, micro_agent_list
+    Use OpenAI ChatCompletion (structured output, ROLE_SCHEMA) to produce a JSON with fields:
+    role, goal, backstory, tasks, tone, style, patterns, micro_agent_list.
+    An invalid answer gets one targeted repair call; the template is the last resort.
     """
     openai_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY")
     #st.markdown(f"---{openai_key}")
@@ -349,7 +339,7 @@ def generate_role_with_llm(text: str, stats: Dict[str,Any], topic: Optional[str]
 
     system = (
         "You are an expert 'micro humanizer' role generator. "
-        "Given blog text and extracted statistics, produce a JSON object (no extra text) "
+        "Given blog text and extracted statistics, produce a JSON object "
         "with fields: role, goal, backstory, tasks (array), tone, style, patterns (dict), micro_agent_list (array)."
         "Keep values concise and practical for programmatic ingestion."
     )
@@ -360,7 +350,7 @@ def generate_role_with_llm(text: str, stats: Dict[str,Any], topic: Optional[str]
     Extracted stats:
     {json.dumps(stats, indent=2)}
 
-    Produce a JSON object only (no surrounding prose) with:
+    Produce a JSON object with:
     - role (short string)
     - goal (one-sentence goal)
     - backstory (short, 1-2 lines)
@@ -369,34 +359,34 @@ def generate_role_with_llm(text: str, stats: Dict[str,Any], topic: Optional[str]
     - style (few words)
     - patterns (dict with avg_sentence_length, sentence_length_stddev, lexical_diversity, common_transitions, top_keywords)
     - micro_agent_list (array of suggested micro-agent role names)
-
-    The JSON must be parseable.
     """
+    messages = [
+        {"role":"system", "content": system},
+        {"role":"user", "content": prompt}
+    ]
     try:
 
         client = OpenAI()
-
-        # try to find JSON inside response
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL","gpt-4o-mini"),
-            messages=[
-                {"role":"system", "content": system},
-                {"role":"user", "content": prompt}
-            ],
-            temperature=0.9,
-            max_tokens=700,
-        )
-        content = resp.choices[0].message.content
-        # try to find JSON inside response
-        # naive extraction: find first "{" and last "}"
-        first = content.find("{")
-        last = content.rfind("}")
-        if first != -1 and last != -1 and last > first:
-            json_text = content[first:last+1]
-            parsed = json.loads(json_text)
+        content = _role_completion(client, messages, ROLE_RESPONSE_FORMAT)
+        try:
+            parsed = _parse_role_json(content)
+            errors = validate_role_json(parsed)
+        except ValueError as e:
+            parsed, errors = None, [f"not valid JSON: {e}"]
+        if not errors:
             return parsed
-        # otherwise attempt to parse whole content
-        return json.loads(content)
+
+        # one targeted repair: show the model its own answer and what is wrong with it
+        messages += [
+            {"role": "assistant", "content": content or ""},
+            {"role": "user", "content": "That JSON is not usable:\n- " + "\n- ".join(errors[:20]) +
+                "\nReturn the corrected JSON object only, keeping every valid value unchanged."},
+        ]
+        repaired = _parse_role_json(_role_completion(client, messages, ROLE_RESPONSE_FORMAT))
+        errors = validate_role_json(repaired)
+        if not errors:
+            return repaired
+        raise ValueError("invalid role JSON after repair: " + "; ".join(errors[:5]))
     except Exception as e:
         # return fallback with error note
         fb = build_role_template(stats, topic)
@@ -435,6 +425,7 @@ def default_view():
         #st.text_input("Optional: OpenAI model to use (env override)", value=os.getenv("OPENAI_MODEL","gpt-4o-mini"), key="model_override")
         with coll1:
             generate_btn = st.button("Generate Micro Humanizer Role")
+            regenerate = st.checkbox("Regenerate (ignore saved result)", key="regenerate_role")
         with coll2:
             if st.button("Back"):
                 #common.navigate_to("clear")
@@ -444,13 +435,16 @@ def default_view():
 
     with col2:
         st.markdown("### Settings & Info")
-        st.markdown("- Uses `newspaper3k` + `BeautifulSoup` to extract text from URLs.")
+        st.markdown("- Uses `newspaper3k` + a readability-style extractor to get text from URLs.")
         st.markdown("- Uses spaCy + TextBlob + textstat to compute features.")
         st.markdown("- Uses OpenAI ChatCompletion (if OPENAI_API_KEY is set) or fallback template.")
         # st.markdown("### Example local path (from upload):")
         # st.code(SAMPLE_LOCAL_PATH)
 
     # Generation flow ----
+    if generate_btn:
+        # a new click asks again: the memo (and Regenerate) decide, not the last role of this session
+        st.session_state.pop('role_json', None)
     role_json = st.session_state.get('role_json')
     if generate_btn or role_json:
         st.markdown("### Running analysis...")
@@ -489,19 +483,19 @@ def default_view():
         # st.markdown("#### Extracted Preview (first 1000 chars)")
         # st.code((raw_text[:1000] + "...") if len(raw_text) > 1000 else raw_text)
 
-        # Analyze
-        with st.spinner("Analyzing text features..."):
-            stats = analyze_text_features(raw_text)
-        #st.success("Analysis complete")
-        #st.json(stats)
-
-        # Ask LLM to generate micro-humanizer role JSON
-        with st.spinner("Generating Micro Humanizer Role via LLM / fallback..."):
+        # Analyze + ask LLM to generate micro-humanizer role JSON
+        # (an unchanged source comes back from the memo store, see role_memo.py)
+        with st.spinner("Analyzing text features and generating Micro Humanizer Role via LLM / fallback..."):
             topic_hint = st.session_state.get("topic_hint") or None
             os.environ["OPENAI_MODEL"] = st.session_state.get("model_override") or os.getenv("OPENAI_MODEL","gpt-4o-mini")
             if not role_json:
-                role_json = generate_role_with_llm(raw_text, stats, topic_hint)
+                stats, role_json, from_memo = role_memo.get_or_create(
+                    url or "paste", raw_text, topic_hint, analyze_text_features, generate_role_with_llm,
+                    regenerate=regenerate, model=os.environ["OPENAI_MODEL"],
+                )
                 st.session_state['role_json'] = role_json
+                if from_memo:
+                    st.info("Loaded the saved role for this unchanged source. Tick 'Regenerate' to run the analysis again.")
         # st.markdown("### Generated Micro Humanizer Role (JSON)")
         # st.json(role_json)
 
@@ -543,6 +537,61 @@ def default_view():
                 st.rerun()
 
 
+def batch_view():
+    """Builds roles for many URLs / files at once (see role_batch.py)."""
+    st.title("Batch Tone Import")
+    st.session_state['page'] = "micro_humanizer_generator"
+    user = st.session_state['user_info']
+
+    urls_text = st.text_area("Blog URLs (one per line)", height=200, key="batch_urls")
+    uploaded_files = st.file_uploader("Or upload .txt/.md files", type=["txt", "md", "markdown"],
+                                      accept_multiple_files=True, key="batch_files")
+    st.text_input("Topic hint (optional)", key="batch_topic_hint")
+    regenerate = st.checkbox("Regenerate (ignore saved results)", key="batch_regenerate")
+
+    coll1, coll2 = st.columns(2)
+    with coll1:
+        run_btn = st.button("Generate & Save All", type="primary")
+    with coll2:
+        if st.button("Back"):
+            st.session_state['page'] = "tone"
+            st.session_state['spage'] = ""
+            st.rerun()
+
+    if not run_btn:
+        return
+    urls = [u.strip() for u in (urls_text or "").splitlines() if u.strip()]
+    sources = list(dict.fromkeys(urls)) + list(uploaded_files or [])
+    if not sources:
+        st.error("Please enter at least one URL or upload a file.")
+        return
+
+    stage_labels = {"fetch": "Fetching", "analyze": "Analyzing", "generate": "Generating roles", "save": "Saving"}
+    bar = st.progress(0.0)
+    status = st.empty()
+
+    def show_progress(stage, done, total, source):
+        step = role_batch.STAGES.index(stage)
+        bar.progress(min(1.0, (step + done / max(1, total)) / len(role_batch.STAGES)))
+        status.markdown(f"**{stage_labels[stage]}** {done}/{total} {source}")
+
+    results = role_batch.run_batch(sources, user['id'], st.session_state.get("batch_topic_hint") or None,
+                                   progress=show_progress, regenerate=regenerate)
+    bar.progress(1.0)
+    saved = [r for r in results if r["role_id"]]
+    status.markdown(f"✅ Stored {len(saved)} of {len(results)} sources.")
+    st.dataframe([
+        {
+            "source": r["source"],
+            "tone": r["role"].get("tone") if isinstance(r["role"], dict) else None,
+            "style": r["role"].get("style") if isinstance(r["role"], dict) else None,
+            "words": (r["stats"] or {}).get("word_count"),
+            "status": ("saved" + (" (from memo)" if r["from_memo"] else "")) if r["role_id"] else (r["error"] or "not saved"),
+        }
+        for r in results
+    ], use_container_width=True)
+
+
 def tone_list_default_view():
     st.title("Micro Humanizer Role Generator ")
     col1, col2 = st.columns([2,1])
@@ -574,6 +623,7 @@ def tone_list_default_view():
         #st.text_input("Optional: OpenAI model to use (env override)", value=os.getenv("OPENAI_MODEL","gpt-4o-mini"), key="model_override")
         with coll1:
             generate_btn = st.button("Generate Micro Humanizer Role")
+            regenerate = st.checkbox("Regenerate (ignore saved result)", key="regenerate_role")
         with coll2:
             if st.button("Back"):
                 #common.navigate_to("clear")
@@ -583,13 +633,16 @@ def tone_list_default_view():
 
     with col2:
         st.markdown("### Settings & Info")
-        st.markdown("- Uses `newspaper3k` + `BeautifulSoup` to extract text from URLs.")
+        st.markdown("- Uses `newspaper3k` + a readability-style extractor to get text from URLs.")
         st.markdown("- Uses spaCy + TextBlob + textstat to compute features.")
         st.markdown("- Uses OpenAI ChatCompletion (if OPENAI_API_KEY is set) or fallback template.")
         # st.markdown("### Example local path (from upload):")
         # st.code(SAMPLE_LOCAL_PATH)
 
     # Generation flow ----
+    if generate_btn:
+        # a new click asks again: the memo (and Regenerate) decide, not the last role of this session
+        st.session_state.pop('role_json', None)
     role_json = st.session_state.get('role_json')
     if generate_btn or role_json:
         st.markdown("### Running analysis...")
@@ -628,19 +681,19 @@ def tone_list_default_view():
         # st.markdown("#### Extracted Preview (first 1000 chars)")
         # st.code((raw_text[:1000] + "...") if len(raw_text) > 1000 else raw_text)
 
-        # Analyze
-        with st.spinner("Analyzing text features..."):
-            stats = analyze_text_features(raw_text)
-        #st.success("Analysis complete")
-        #st.json(stats)
-
-        # Ask LLM to generate micro-humanizer role JSON
-        with st.spinner("Generating Micro Humanizer Role via LLM / fallback..."):
+        # Analyze + ask LLM to generate micro-humanizer role JSON
+        # (an unchanged source comes back from the memo store, see role_memo.py)
+        with st.spinner("Analyzing text features and generating Micro Humanizer Role via LLM / fallback..."):
             topic_hint = st.session_state.get("topic_hint") or None
             os.environ["OPENAI_MODEL"] = st.session_state.get("model_override") or os.getenv("OPENAI_MODEL","gpt-4o-mini")
             if not role_json:
-                role_json = generate_role_with_llm(raw_text, stats, topic_hint)
+                stats, role_json, from_memo = role_memo.get_or_create(
+                    url or "paste", raw_text, topic_hint, analyze_text_features, generate_role_with_llm,
+                    regenerate=regenerate, model=os.environ["OPENAI_MODEL"],
+                )
                 st.session_state['role_json'] = role_json
+                if from_memo:
+                    st.info("Loaded the saved role for this unchanged source. Tick 'Regenerate' to run the analysis again.")
         # st.markdown("### Generated Micro Humanizer Role (JSON)")
         # st.json(role_json)
 
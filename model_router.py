@@ -0,0 +1,139 @@
+"""
+Per-stage model routing for the content pipeline.
+
+Every stage falls into a class (STAGE_CLASSES). Each class routes to a model alias
+(DEFAULT_ROUTES), and the alias resolves against the profile and MODEL_TABLE:
+  - synthesis (research, write)                        -> primary
+  - rewrite   (edit, rhythm, overthink)                -> primary
+  - small_span (micro passes, memory noise, disorder)  -> fastest
+  - format    (publisher)                              -> fastest
+  - model_mix (entropy)                                -> entropy
+The precedence is the stage's own "model" in the profile, then the profile's
+"routing": {class: alias-or-model}, then the defaults. MODEL_ROUTING=0 sends every class
+except model_mix to the primary model (the previous behaviour).
+
+MODEL_TABLE holds list prices (USD per 1M tokens) and rough output speed (tokens/s).
+The engine records the model used by every stage. savings_report() estimates the cost
+of a run against sending all of it to the primary model.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterable, Optional
+
+MODEL_TABLE: Dict[str, Dict[str, float]] = {
+    "gpt-4.1":      {"input": 2.00, "output": 8.00, "tokens_per_s": 60},
+    "gpt-4.1-mini": {"input": 0.40, "output": 1.60, "tokens_per_s": 90},
+    "gpt-4.1-nano": {"input": 0.10, "output": 0.40, "tokens_per_s": 150},
+    "gpt-4o":       {"input": 2.50, "output": 10.00, "tokens_per_s": 80},
+    "gpt-4o-mini":  {"input": 0.15, "output": 0.60, "tokens_per_s": 100},
+}
+# MODEL_TABLE_JSON='{"my-model": {"input": 1, "output": 2, "tokens_per_s": 70}}' adds / replaces rows
+MODEL_TABLE.update(json.loads(os.getenv("MODEL_TABLE_JSON") or "{}"))
+
+PRIMARY_MODEL = os.getenv("PRIMARY_MODEL", "gpt-4.1-mini")
+ENTROPY_MODEL = os.getenv("ENTROPY_MODEL", "gpt-4o-mini")
+# models "fastest" / "cheapest" may pick from (comma separated; default: the whole table)
+ROUTER_MODELS = [m.strip() for m in os.getenv("ROUTER_MODELS", "").split(",") if m.strip()] or list(MODEL_TABLE)
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") != "0"
+
+STAGE_CLASSES = {
+    "research": "synthesis",
+    "write": "synthesis",
+    "edit": "rewrite",
+    "micro": "small_span",
+    "global:memory_noise": "small_span",
+    "global:rhythm": "rewrite",
+    "global:overthink": "rewrite",
+    "global:entropy": "model_mix",
+    "global:final_disorder": "small_span",
+    "global:publisher": "format",
+}
+DEFAULT_ROUTES = {
+    "synthesis": "primary",
+    "rewrite": "primary",
+    "small_span": "fastest",
+    "format": "fastest",
+    "model_mix": "entropy",
+}
+
+# rough characters per token for the estimates below
+CHARS_PER_TOKEN = 4
+
+
+def stage_class(stage: Dict[str, Any]) -> str:
+    kind = stage.get("kind")
+    key = f"global:{stage.get('agent')}" if kind == "global" else kind
+    return STAGE_CLASSES.get(key, "rewrite")
+
+
+def _pick(metric) -> str:
+    known = [m for m in ROUTER_MODELS if m in MODEL_TABLE]
+    return max(known, key=metric) if known else PRIMARY_MODEL
+
+
+def resolve(alias: Optional[str], profile: Optional[Dict[str, Any]] = None) -> str:
+    """Model name for an alias (primary / entropy / fastest / cheapest) or a literal model name."""
+    models = (profile or {}).get("models") or {}
+    if alias in (None, "primary"):
+        return models.get("primary") or PRIMARY_MODEL
+    if alias == "entropy":
+        return models.get("entropy") or ENTROPY_MODEL
+    if alias == "fastest":
+        return models.get("fastest") or _pick(lambda m: MODEL_TABLE[m]["tokens_per_s"])
+    if alias == "cheapest":
+        return models.get("cheapest") or _pick(lambda m: -(MODEL_TABLE[m]["input"] + MODEL_TABLE[m]["output"]))
+    return alias
+
+
+def route(stage: Dict[str, Any], profile: Optional[Dict[str, Any]] = None, default: Optional[str] = None) -> str:
+    """Model for one profile stage; `default` is the stage type's own model alias (e.g. entropy)."""
+    if stage.get("model"):
+        return resolve(stage["model"], profile)
+    cls = stage_class(stage)
+    overrides = (profile or {}).get("routing") or {}
+    if cls in overrides:
+        return resolve(overrides[cls], profile)
+    if default:
+        return resolve(default, profile)
+    if not MODEL_ROUTING and cls != "model_mix":
+        return resolve("primary", profile)
+    return resolve(DEFAULT_ROUTES.get(cls, "primary"), profile)
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD for a call's token counts; None for models missing from MODEL_TABLE."""
+    row = MODEL_TABLE.get(model)
+    if row is None:
+        return None
+    return (prompt_tokens * row["input"] + completion_tokens * row["output"]) / 1_000_000
+
+
+def estimate_cost(model: str, input_chars: int, output_chars: int) -> Optional[float]:
+    """USD estimate from character counts; None for models missing from MODEL_TABLE."""
+    return token_cost(model, input_chars / CHARS_PER_TOKEN, output_chars / CHARS_PER_TOKEN)
+
+
+def savings_report(entries: Iterable[Dict[str, Any]], baseline: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Estimated cost of routed stages vs the same stages on `baseline` (the primary model).
+    entries: dicts with model, input_chars, output_chars (FINISHED pipeline log entries).
+    """
+    baseline = baseline or PRIMARY_MODEL
+    routed = base = 0.0
+    stages = {}
+    for entry in entries:
+        model = entry.get("model")
+        cost = estimate_cost(model, entry.get("input_chars", 0), entry.get("output_chars", 0))
+        base_cost = estimate_cost(baseline, entry.get("input_chars", 0), entry.get("output_chars", 0))
+        if cost is None or base_cost is None:
+            continue
+        routed += cost
+        base += base_cost
+        stages[model] = stages.get(model, 0) + 1
+    return {
+        "routed_usd": round(routed, 6),
+        "baseline_usd": round(base, 6),
+        "saved_pct": round((1 - routed / base) * 100, 1) if base else 0.0,
+        "stages_per_model": stages,
+    }
@@ -0,0 +1,49 @@
+"""
+Lazy, process-wide registry for the NLP backends (spaCy, TextBlob, textstat).
+
+Nothing heavy is imported until a backend is first requested; the loaded objects
+are shared by every Streamlit session through st.cache_resource, so a process that
+only serves the login page never pays for spaCy.
+"""
+
+import os
+
+import streamlit as st
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# pipeline components analyze_text_features never uses; excluding them cuts load time and RSS
+# (the parser stays: it provides doc.sents)
+SPACY_EXCLUDE = tuple(c.strip() for c in os.getenv("SPACY_EXCLUDE", "ner,lemmatizer").split(",") if c.strip())
+
+
+@st.cache_resource(show_spinner=False)
+def get_nlp(model: str = SPACY_MODEL, exclude: tuple = SPACY_EXCLUDE):
+    """spaCy pipeline, or None if spaCy / the model is not installed."""
+    try:
+        import spacy
+    except Exception:
+        return None
+    try:
+        return spacy.load(model, exclude=list(exclude))
+    except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_textblob():
+    """TextBlob class, or None if textblob is not installed."""
+    try:
+        from textblob import TextBlob
+        return TextBlob
+    except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def get_textstat():
+    """textstat module, or None if it is not installed."""
+    try:
+        import textstat
+        return textstat
+    except Exception:
+        return None
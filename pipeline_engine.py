@@ -0,0 +1,1038 @@
+"""
+Content pipeline engine driven by declarative profiles.
+
+pipeline_profiles.json (or pipeline_profiles.yaml when PyYAML is installed and that file
+exists; PIPELINE_PROFILES_FILE points elsewhere) lists named profiles:
+
+    "fast": {
+      "description": "...",
+      "parallelism": 1,                 # competing candidates per humanizer pass
+      "models": {"primary": "gpt-4.1-mini", "entropy": "gpt-4o-mini"},   # optional
+      "routing": {"small_span": "primary"},   # optional, see model_router.py
+      "deadline_s": 300,                # optional, see PIPELINE_DEADLINE_SECONDS
+      "stages": [
+        {"kind": "research"},
+        {"kind": "write"},
+        {"kind": "micro", "section": "intro", "count": 1},
+        {"kind": "global", "agent": "rhythm", "model": "entropy", "temperature": 1.4}
+      ]
+    }
+
+Stage kinds: research, write, edit, micro (section + count), global (agent from
+GLOBAL_AGENTS). Models are chosen per stage by model_router.route; a stage may pin its
+model ("primary", "entropy", "fastest", "cheapest" or a model name) and override
+temperature, llm_config, description and expected_output ({topic}, {draft_content} and
+{focus_sentences} are filled in at kickoff; micro descriptions are first formatted with
+{section} / {i}, so they write {{draft_content}}).
+Everything after research / write is a humanizer pass and subject to the adaptive stop.
+The Generate Content page defaults to the "fast" profile and Humanize Convert to
+"balanced"; both call run_pipeline directly.
+Each run_pipeline call keeps its user, personas, progress log and metrics on its own
+PipelineRun (pipeline_run.py), so concurrent runs do not interfere.
+"""
+
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import streamlit as st
+from dotenv import load_dotenv
+
+import agent_factory
+import common
+import model_router
+import run_metrics
+import stage_context
+import style_score
+import targeted_rewrite
+import zerogpt_api
+from agent_factory import AgentSpec
+from crewai import Task
+import pipeline_run
+from pipeline_run import PipelineRun, RunCancelled
+
+try:
+    import yaml
+except Exception:
+    yaml = None
+
+# ---------------- Utilities ----------------
+logging.basicConfig(level=logging.INFO)
+load_dotenv()
+
+PROFILES_FILE = os.getenv('PIPELINE_PROFILES_FILE') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_profiles.json')
+DEFAULT_PROFILE = os.getenv('PIPELINE_PROFILE')
+
+MAX_REAL_TASKS = 40
+# ZeroGPT check between humanizer passes (needs ZEROGPT_API_KEY); 0 turns it off
+ADAPTIVE_DETECTION = os.getenv('ADAPTIVE_DETECTION', '1') != '0'
+# after this many seconds the remaining humanizer passes are skipped (0 = no deadline);
+# a profile may set its own "deadline_s"
+PIPELINE_DEADLINE_SECONDS = int(os.getenv('PIPELINE_DEADLINE_SECONDS', '600'))
+# {topic}, {draft_content}, ... in task templates (other braces, e.g. JSON examples, stay as they are)
+_PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+DEFAULT_PERSONALITIES = [
+    'sarcastic friend','nostalgic storyteller','curious teacher','chaotic thinker','casual confidant',
+    'skeptical critic','optimistic mentor','grumpy old-timer','chatty neighbor','daydreamer'
+]
+
+# stages whose tasks build the draft; everything after them humanizes it
+DRAFT_KINDS = ('research', 'write')
+
+STAGE_DEFAULTS = {
+    'research': {
+        'description': "Research '{topic}' with interpretive notes. Output ONLY the interpretive notes.",
+        'expected_output': 'research-notes',
+        'llm_config': {'temperature':1.05,'presence_penalty':0.5,'frequency_penalty':0.45},
+    },
+    'write': {
+        'description': "Write messy raw draft for '{topic}' using the following research notes: {draft_content}.",
+        'expected_output': 'raw-draft',
+        'llm_config': {'temperature':1.15,'presence_penalty':0.9,'frequency_penalty':0.75},
+    },
+    'edit': {
+        'description': 'Light edit (keep voice) of the following draft: {draft_content}.',
+        'expected_output': 'light-edited',
+        'llm_config': {'temperature':0.6},
+    },
+    'micro': {
+        'description': 'Rewrite micro-{section} {i} of the draft: {{draft_content}}',
+        'expected_output': '{section}-{i}',
+        'llm_config': {'temperature':1.3,'presence_penalty':1.05},
+    },
+}
+
+# Global-pass agents
+GLOBAL_AGENTS = {
+    # Memory noise agent (global small inconsistencies)
+    'memory_noise': {
+        'role': 'MemoryNoise',
+        'goal': 'Introduce 2-4 tiny human memory inconsistencies (dates, small numbers) without breaking key facts.',
+        'backstory': 'You misremember little details occasionally.',
+        'llm_config': {'temperature':1.25},
+        'description': 'Introduce tiny memory inconsistencies across the draft: {draft_content}.',
+        'expected_output': 'memory-noise',
+    },
+    # Rhythm breaker (cadence changes)
+    'rhythm': {
+        'role': 'RhythmBreaker',
+        'goal': 'Change sentence rhythm: short line, then long run-on, then medium. Break regular cadence across paragraphs.',
+        'backstory': 'You speak with uneven cadence.',
+        'llm_config': {'temperature':1.35},
+        'description': 'Apply rhythm changes across draft to break sentence length regularity. Draft: {draft_content}.',
+        'expected_output': 'rhythm-changed',
+    },
+    # Human Overthinker (global messy pass)
+    'overthink': {
+        'role': 'HumanOverthinker',
+        'goal': 'Rewrite ENTIRE draft with readable human flaws: second thoughts, mild contradictions, micro-digressions.',
+        'backstory': 'You think out loud and write in a messy way.',
+        'llm_config': {'temperature':1.45,'presence_penalty':1.25},
+        'description': 'Overthink full-document messy pass on draft: {draft_content}.',
+        'expected_output': 'overthought-draft',
+    },
+    # Entropy breaker (different LLM pass) — model mix
+    'entropy': {
+        'role': 'EntropyBreaker',
+        'goal': 'Rewrite draft using alternate phrasing, unexpected idioms, and different world choices to break model signature.',
+        'backstory': 'You are impulsive and different from the main writer.',
+        'model': 'entropy',
+        'temperature': 1.7,
+        'llm_config': {'temperature':1.7,'presence_penalty':1.4},
+        'description': 'Entropy model-mix rewrite to break model fingerprints. Draft: {draft_content}.',
+        'expected_output': 'entropy-draft',
+    },
+    # Final disorder (polish randomness but keep readable)
+    'final_disorder': {
+        'role': 'FinalDisorder',
+        'goal': 'Make final small readable unpredictable edits: interjections, small contradictions, interruptions.',
+        'backstory': 'You are the last humanizer.',
+        'llm_config': {'temperature':1.5},
+        'description': 'Final readable disorder pass on draft: {draft_content}.',
+        'expected_output': 'final-disorder',
+    },
+    # Publisher (format only)
+    'publisher': {
+        'role': 'Publisher',
+        'goal': 'Format the final article to markdown/HTML without altering voice or content meaning.',
+        'backstory': 'You are purely a formatter.',
+        'llm_config': {'temperature':0.5},
+        'description': 'Format article for publish (markdown). Draft: {draft_content}.',
+        'expected_output': 'publish-ready',
+    },
+}
+
+
+def safe_output_to_json(result):
+    try:
+        if hasattr(result, 'raw'):
+            return {'result': result.raw}
+        if hasattr(result, 'model_dump'):
+            return result.model_dump()
+        return {'result': str(result)}
+    except Exception as e:
+        return {'error': str(e)}
+
+
+# ---------------- Profiles ----------------
+
+_profiles_cache = {}
+
+
+def _profiles_path(path=None):
+    path = path or PROFILES_FILE
+    yaml_path = os.path.splitext(path)[0] + '.yaml'
+    if yaml is not None and path.endswith('.json') and os.path.exists(yaml_path):
+        return yaml_path
+    return path
+
+
+def validate_profile(name, profile):
+    """Raises ValueError for a profile the engine cannot build."""
+    stages = profile.get('stages') if isinstance(profile, dict) else None
+    if not stages:
+        raise ValueError(f"Profile {name!r} has no stages.")
+    for n, stage in enumerate(stages):
+        kind = stage.get('kind')
+        if kind not in STAGE_DEFAULTS and kind != 'global':
+            raise ValueError(f"Profile {name!r}, stage {n}: unknown kind {kind!r}.")
+        if kind == 'global' and stage.get('agent') not in GLOBAL_AGENTS:
+            raise ValueError(f"Profile {name!r}, stage {n}: unknown global agent {stage.get('agent')!r}; "
+                             f"choose from {sorted(GLOBAL_AGENTS)}.")
+        if kind == 'micro' and not stage.get('section'):
+            raise ValueError(f"Profile {name!r}, stage {n}: micro stages need a section.")
+    kinds = [stage['kind'] for stage in stages]
+    if kinds[:2] != ['research', 'write'] or any(k in DRAFT_KINDS for k in kinds[2:]):
+        raise ValueError(f"Profile {name!r} must start with research and write stages (and have only those two).")
+
+
+def load_profiles(path=None):
+    """{"default_profile", "profiles"} from the profiles file; re-read when the file changes."""
+    path = _profiles_path(path)
+    mtime = os.path.getmtime(path)
+    cached = _profiles_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) if path.endswith(('.yaml', '.yml')) else json.load(f)
+    for name, profile in (config.get('profiles') or {}).items():
+        validate_profile(name, profile)
+    _profiles_cache[path] = (mtime, config)
+    return config
+
+
+def profile_names():
+    return list(load_profiles().get('profiles', {}))
+
+
+def get_profile(name=None):
+    """(name, profile dict); name None picks PIPELINE_PROFILE or the file's default_profile."""
+    config = load_profiles()
+    profiles = config.get('profiles', {})
+    name = name or DEFAULT_PROFILE or config.get('default_profile') or next(iter(profiles), None)
+    if name not in profiles:
+        raise ValueError(f"Unknown pipeline profile {name!r}; choose from {sorted(profiles)}.")
+    return name, profiles[name]
+
+
+def get_personalities(user_id=None):
+    """Personas for micro agents: the user's active tones, else the defaults."""
+    if user_id is None:
+        return DEFAULT_PERSONALITIES
+    selected_tones = common.get_selected_tones_by_user(user_id)
+    return selected_tones if selected_tones else DEFAULT_PERSONALITIES
+
+
+# ---------------- Running ----------------
+# progress is kept per run on a PipelineRun (pipeline_run.py), never in module globals
+
+
+def _task_model(task):
+    llm = getattr(task.agent, 'llm', None)
+    return getattr(llm, 'model', None) or getattr(llm, 'model_name', None)
+
+
+def _usage(task, result):
+    """Model and size of one LLM stage call, for model_router.savings_report."""
+    return {'model': _task_model(task), 'input_chars': len(task.description or ''), 'output_chars': len(str(result))}
+
+
+def _filled_prompt(task, inputs):
+    """Task description and expected output with the kickoff inputs filled in (what the model is sent)."""
+    # crewai fills the placeholders in place on kickoff and keeps the templates as _original_*
+    template = "\n".join(
+        getattr(task, f'_original_{name}', None) or getattr(task, name, None) or ''
+        for name in ('description', 'expected_output'))
+    return _PLACEHOLDER_RE.sub(lambda m: str(inputs[m.group(1)]) if m.group(1) in inputs else m.group(0), template)
+
+
+def _llm_usage(task):
+    """(prompt, completion) tokens the task agent's crewai LLM has used so far, or None."""
+    try:
+        summary = task.agent.llm.get_token_usage_summary()
+    except Exception:
+        return None
+    return (getattr(summary, 'prompt_tokens', 0) or 0, getattr(summary, 'completion_tokens', 0) or 0)
+
+
+def _stage_name(stage):
+    """Metrics label of a profile stage: research, write, edit, micro:<section>, global:<agent>."""
+    if not stage:
+        return None
+    if stage.get('kind') == 'global':
+        return f"global:{stage.get('agent')}"
+    if stage.get('kind') == 'micro':
+        return f"micro:{stage.get('section')}"
+    return stage.get('kind')
+
+
+def run_task(task, inputs, stage=None):
+    """
+    Kicks off one task in a single-task crew and records its stage metrics.
+    Tokens are the growth of the agent LLM's usage counter during the kickoff: agents (and
+    their LLMs) are reused across runs and crewai never resets the counter, so
+    result.token_usage would include every earlier run. A stage running the same agent
+    concurrently (another run) may be counted in both; without a counter the texts are estimated.
+    """
+    model = _task_model(task)
+    prompt = _filled_prompt(task, inputs)
+    with run_metrics.timed('stage', task.agent.role, stage=_stage_name(stage), model=model) as metric:
+        before = _llm_usage(task)
+        result = agent_factory.single_task_crew(task).kickoff(inputs=inputs)
+        after = _llm_usage(task)
+        used = (after[0] - before[0], after[1] - before[1]) if before and after else (0, 0)
+        metric['prompt_tokens'] = max(used[0], 0) or stage_context.count_tokens(prompt, model)
+        metric['completion_tokens'] = max(used[1], 0) or stage_context.count_tokens(str(result), model)
+        metric['cost_usd'] = model_router.token_cost(model, metric['prompt_tokens'], metric['completion_tokens'])
+    return result
+
+
+def _pick_candidate(outputs, style_patterns, human_target):
+    """Best (task, result) of competing humanizer outputs: closest style, else most human, else the first."""
+    if len(outputs) == 1:
+        return outputs[0]
+    try:
+        if style_patterns:
+            scored = [(style_score.score_draft(str(result), style_patterns)['distance'], n) for n, (_, result) in enumerate(outputs)]
+            scored = [(d, n) for d, n in scored if d is not None]
+            if scored:
+                return outputs[min(scored)[1]]
+        if human_target:
+            # the winner's result stays cached for the adaptive check that follows
+            scores = [zerogpt_api.human_score(zerogpt_api.check_ai_content(str(result))) for _, result in outputs]
+            ranked = [(s, -n) for n, s in enumerate(scores) if s is not None]
+            if ranked:
+                return outputs[-max(ranked)[1]]
+    except Exception as e:
+        logging.warning("Candidate scoring failed, keeping the first candidate: %s", e)
+    return outputs[0]
+
+
+def run_safe_pipeline_with_progress(crew, tasks, topic: str, style_patterns=None, humanizer_start: int = 2,
+                                    human_target: float = 0, candidates: Optional[Dict[int, List[Any]]] = None,
+                                    task_stages: Optional[List[Dict[str, Any]]] = None,
+                                    run: Optional[PipelineRun] = None):
+    """
+    FIXED: Runs the CrewAI pipeline with task-by-task progress, ensuring the output
+    of the previous task is fed as input to the next one to maintain the draft continuity.
+    Humanizer tasks (index >= humanizer_start) are adaptive: before each one the draft is
+    - scored against style_patterns (a micro_roles fingerprint, see style_score.py)
+    - checked with ZeroGPT when human_target > 0 (cached, see zerogpt_api.py)
+    Once it is within style tolerance or isHuman >= human_target, the remaining humanizer tasks
+    are marked SKIPPED. Otherwise the sentences still flagged are passed on as {focus_sentences},
+    and a micro pass whose section (intro / body / conclusion) holds none of them is SKIPPED.
+    candidates maps a task index to alternative tasks run concurrently with it; the best
+    output (see _pick_candidate) becomes the draft.
+    task_stages (the profile stage of each task) limit what a task gets as {draft_content},
+    see stage_context.py.
+    run holds this run's progress log and metrics (a new PipelineRun when not given).
+    Cancelling the run (Cancel button, leaving the page, a new run in the session) stops it
+    before the next task; past run.deadline the humanizer tasks are skipped and draft
+    tasks run without their competing candidates.
+    """
+
+    run = run or PipelineRun()
+    total = len(tasks)
+    candidates = candidates or {}
+    task_stages = task_stages or [None] * total
+
+    result_container = {'result': None, 'task': tasks[-1] if tasks else None}
+    # 🌟 FIX 1: Variable to hold the intermediate result (the evolving article draft)
+    intermediate_draft = ""
+    # sentences the last detection still flagged; humanizer agents get them as {focus_sentences}
+    focus_sentences = "the whole draft"
+    flagged_sentences = []
+
+    # 1. DEFINE PERMANENT UI ELEMENTS
+    st.markdown("## 📋 Pipeline Execution Log")
+    detailed_log_container = st.container()
+
+    with detailed_log_container:
+        st.markdown("### Task Details")
+        task_list_placeholder = st.empty()
+
+    def stop_reason(draft, i):
+        """Why the remaining humanizer passes can be skipped, or None."""
+        nonlocal focus_sentences, flagged_sentences
+        flagged_sentences = []
+        if style_patterns:
+            try:
+                score = style_score.score_draft(draft, style_patterns)
+                run.log({'status': 'SCORED', 'before_index': i, 'distance': score['distance'],
+                         'within_tolerance': score['within_tolerance']})
+                if score['within_tolerance']:
+                    return f"style on target (distance {score['distance']})"
+            except Exception as e:
+                logging.warning("Style scoring failed, running the remaining passes: %s", e)
+        if human_target:
+            detection = zerogpt_api.check_ai_content(draft)
+            is_human = zerogpt_api.human_score(detection)
+            flagged = zerogpt_api.flagged_sentences(detection)
+            run.log({'status': 'DETECTED', 'before_index': i, 'is_human': is_human, 'flagged': len(flagged)})
+            if is_human is not None and is_human >= human_target:
+                return f"reads as human (isHuman {is_human:g})"
+            if flagged:
+                focus_sentences = "\n".join(f"- {s.strip()}" for s in flagged)
+                flagged_sentences = flagged
+        return None
+
+    def clean_section(draft, stage):
+        """Section of a micro stage that holds none of the flagged sentences, or None."""
+        if not flagged_sentences or not stage or stage.get('kind') != 'micro':
+            return None
+        spans = targeted_rewrite.locate_spans(draft, flagged_sentences)
+        if not spans:
+            # the flagged sentences could not be placed: no reason to skip anything
+            return None
+        start, end = stage_context.section_bounds(draft, stage.get('section'))
+        if any(s < end and e > start for s, e in spans):
+            return None
+        return stage.get('section')
+
+    def kickoff(task, task_inputs, stage=None):
+        # NOTE: Create a minimal crew to run only this single task (required for logging between tasks)
+        return task, run_task(task, task_inputs, stage)
+
+    def run_crew_sequential():
+        nonlocal result_container
+        # 🌟 FIX 2: Allow modification of the draft variable
+        nonlocal intermediate_draft
+
+        def skip_rest(i, reason):
+            for j in range(i, total):
+                run.log({'status': 'SKIPPED', 'index': j, 'agent': tasks[j].agent.role, 'reason': reason})
+            if intermediate_draft:
+                result_container['article'] = intermediate_draft
+
+        for i, task in enumerate(tasks):
+            agent_name = task.agent.role
+            task_desc = task.description
+
+            # ⏹️ Cancelled (button, page left, newer run): nothing else starts
+            if run.cancelled:
+                skip_rest(i, f"run cancelled ({run.cancel_reason})")
+                result_container['result'] = f"⚠ Pipeline cancelled: {run.cancel_reason}"
+                return
+            # ⏱️ Deadline: keep the draft as it is, or at least finish it without candidates
+            late = run.past_deadline()
+            if late and i >= humanizer_start and intermediate_draft:
+                skip_rest(i, "deadline reached")
+                result_container['result'] = intermediate_draft
+                break
+
+            # 🎯 Adaptive stop: no more humanizer passes once the draft is on target
+            if i >= humanizer_start and intermediate_draft:
+                reason = stop_reason(intermediate_draft, i)
+                if reason:
+                    for j in range(i, total):
+                        run.log({'status': 'SKIPPED', 'index': j, 'agent': tasks[j].agent.role,
+                                 'reason': reason})
+                    result_container['result'] = task_result
+                    # the draft that passed is the article (and its detection result is cached)
+                    result_container['article'] = intermediate_draft
+                    break
+                # only spend micro passes on sections that still have flagged sentences
+                section = clean_section(intermediate_draft, task_stages[i])
+                if section:
+                    run.log({'status': 'SKIPPED', 'index': i, 'agent': agent_name,
+                             'reason': f"nothing flagged in the {section}"})
+                    result_container['article'] = intermediate_draft
+                    if i == total - 1:
+                        result_container['result'] = task_result
+                    continue
+
+            run.log({'status': 'STARTING', 'index': i, 'agent': agent_name, 'desc': task_desc,
+                     'model': _task_model(task)})
+
+            # 🌟 FIX 3: every stage gets the topic, its part of the draft and the flagged sentences;
+            # each task description only uses the placeholders it needs
+            context = stage_context.prepare(task_stages[i], intermediate_draft, _task_model(task))
+            task_inputs = {'topic': topic, 'draft_content': context['text'], 'focus_sentences': focus_sentences}
+
+            try:
+                # 🌟 FIX 4: Pass the prepared inputs to the isolated task kickoff
+                competing = [task] + ([] if late else list(candidates.get(i, ())))
+                if len(competing) == 1:
+                    outputs = [kickoff(task, task_inputs, task_stages[i])]
+                    winner, task_result = outputs[0]
+                else:
+                    with ThreadPoolExecutor(max_workers=len(competing)) as pool:
+                        outputs = list(pool.map(run_metrics.wrap(lambda t: kickoff(t, dict(task_inputs), task_stages[i])),
+                                                competing))
+                    # candidates are compared on the full draft they would produce
+                    winner, _ = _pick_candidate([(t, stage_context.rejoin(context, r)) for t, r in outputs],
+                                                style_patterns, human_target)
+                    task_result = next(r for t, r in outputs if t is winner)
+                    run.log({'status': 'PICKED', 'step': i, 'agent': winner.agent.role, 'of': len(outputs)})
+                result_container['task'] = winner
+
+                run.log({'status': 'FINISHED', 'index': i, 'agent': agent_name, 'result': task_result,
+                         'model': _task_model(winner), 'usage': [_usage(t, r) for t, r in outputs],
+                         'tokens': context['tokens'], 'full_tokens': context['full_tokens']})
+
+                # 🌟 FIX 5: Update the intermediate draft for the next agent (a section output is spliced back)
+                intermediate_draft = stage_context.rejoin(context, task_result)
+                run.draft = intermediate_draft
+                if context['prefix'] or context['suffix']:
+                    # the task description only holds the part it rewrote
+                    result_container['article'] = intermediate_draft
+                else:
+                    result_container.pop('article', None)
+
+                if i == total - 1:
+                    result_container['result'] = task_result
+
+            except RunCancelled:
+                skip_rest(i, f"run cancelled ({run.cancel_reason})")
+                result_container['result'] = f"⚠ Pipeline cancelled: {run.cancel_reason}"
+                return
+            except Exception as e:
+                run.log({'status': 'FAILED', 'index': i, 'agent': agent_name, 'error': str(e)})
+                result_container['result'] = f"⚠ Pipeline failed at {agent_name}: {e}"
+                return
+
+        run.log({'status': 'COMPLETE'})
+
+
+    # the worker records metrics on this run (see run_metrics.wrap)
+    thread = threading.Thread(target=run_metrics.wrap(run_crew_sequential))
+
+    # 2. Block the UI with st.spinner
+    with st.spinner("Initializing Crew and Agents..."):
+
+        # Placeholders for Visualization (defined *inside* spinner for easy clearing)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        st.button("⏹️ Cancel run", key=f"cancel_{run.run_id}", on_click=_cancel_clicked, args=(run,))
+
+        thread.start()
+
+        # --- Progress Monitoring Loop (Reads run.progress) ---
+
+        # the loop ends when the worker does (also after a FAILED task); if the script is
+        # stopped instead (rerun, page left), the worker is told to stop after its current task
+        try:
+            while thread.is_alive():
+
+                current_finished_count = run.count('FINISHED', 'SKIPPED')
+                current_task_index = current_finished_count
+
+                start_log = next((log for log in run.entries('STARTING') if log.get('index') == current_task_index), None)
+
+                percent = (current_finished_count / total) * 100
+
+                progress_bar.progress(percent / 100)
+
+                # Update the status text
+                if start_log:
+                    status_text.markdown(f"""
+                        ### 🛠️ Executing Task {current_task_index + 1}/{total}
+                        **Agent:** **{start_log['agent']}** ({start_log.get('model') or 'default model'})
+                        **Task:** *{start_log['desc']}*
+                    """)
+                elif percent >= 100:
+                    status_text.success("✅ Pipeline Complete: Compiling Final Result.")
+                else:
+                     status_text.info(f"Preparing to start Task 1...")
+
+                # 3. Update the detailed task list using the placeholder
+
+                markdown_list = ""
+                for i, task in enumerate(tasks):
+                    log_status = next((log['status'] for log in reversed(list(run.progress)) if log.get('index') == i), 'PENDING')
+                    label = task.agent.role + (f" (+{len(candidates[i])} candidate(s))" if candidates.get(i) else "")
+
+                    if log_status == 'FINISHED':
+                        markdown_list += f"* **✅ Done:** ~~{label}: {task.description}~~\n"
+                    elif log_status == 'STARTING':
+                        markdown_list += f"* **▶️ Executed:** **{label}: {task.description}**\n"
+                    elif log_status == 'FAILED':
+                        markdown_list += f"* **❌ Failed:** {label}: {task.description}\n"
+                    elif log_status == 'SKIPPED':
+                        markdown_list += f"* **⏭️ Skipped:** ~~{label}: {task.description}~~\n"
+                    else:
+                        markdown_list += f"* **⚪ Pending:** {label}: {task.description}\n"
+
+                # Use the placeholder's markdown method to replace its contents
+                task_list_placeholder.markdown(markdown_list)
+
+                time.sleep(0.5)
+        finally:
+            if thread.is_alive():
+                run.cancel("page left or re-run")
+        thread.join()
+
+    # --- Finalization ---
+    progress_bar.progress(1.0)
+    failed = run.entries('FAILED')
+    if failed:
+        status_text.error(f"❌ **Pipeline failed** at {failed[0]['agent']}: {failed[0]['error']}")
+    elif run.cancelled:
+        status_text.warning(f"⏹️ **Pipeline cancelled** ({run.cancel_reason}); the draft so far is kept.")
+    else:
+        st.balloons()
+        status_text.success("🎉 **Pipeline Complete:** The final humanized article is ready.")
+    skipped = run.entries('SKIPPED')
+    if skipped and not run.cancelled:
+        st.info(f"🎯 Draft {skipped[0]['reason']}; skipped {len(skipped)} humanizer pass(es).")
+    usage = [u for log in run.entries('FINISHED') for u in log.get('usage', ())]
+    report = run.metrics['routing'] = model_router.savings_report(usage)
+    if report['baseline_usd']:
+        st.caption(f"🧭 Model routing: {report['stages_per_model']} — est. ${report['routed_usd']:.4f} "
+                   f"vs ${report['baseline_usd']:.4f} on {model_router.PRIMARY_MODEL} ({report['saved_pct']}% saved)")
+    tokens = run.metrics['stage_tokens'] = stage_context.savings(run.entries('FINISHED'))
+    if tokens['full_tokens']:
+        st.caption(f"🧮 Stage inputs: {tokens['tokens']:,} draft tokens passed instead of {tokens['full_tokens']:,} "
+                   f"({tokens['saved']:,} saved, {tokens['saved_pct']}%)")
+
+    final_result = safe_output_to_json(result_container['result'])
+    if result_container.get('article'):
+        return final_result, result_container['article']
+    # description of the last task that actually ran (its {draft_content} is filled in by kickoff)
+    return final_result, result_container['task'].description
+
+
+# ---------------- Speculative drafts ----------------
+
+# competing writer + humanizer branches in "must pass" mode
+SPECULATIVE_DRAFTS = int(os.getenv('SPECULATIVE_DRAFTS', '3'))
+# a branch scoring this far below the leader (isHuman points) is cancelled
+SPECULATIVE_CANCEL_MARGIN = float(os.getenv('SPECULATIVE_CANCEL_MARGIN', '30'))
+RESEARCH_CACHE_SECONDS = int(os.getenv('RESEARCH_CACHE_SECONDS', '3600'))
+RESEARCH_CACHE_SIZE = 64
+
+_research_cache = OrderedDict()
+_research_lock = threading.Lock()
+
+
+def cached_research(task, topic):
+    """Research notes for (topic, researcher settings, model); runs the task only on a miss."""
+    key = (topic, task.agent.role, task.agent.goal, task.agent.backstory, _task_model(task))
+    with _research_lock:
+        hit = _research_cache.get(key)
+        if hit and time.time() - hit[0] < RESEARCH_CACHE_SECONDS:
+            _research_cache.move_to_end(key)
+            return hit[1], True
+    result = run_task(task, {'topic': topic, 'draft_content': '', 'focus_sentences': ''}, {'kind': 'research'})
+    with _research_lock:
+        _research_cache[key] = (time.time(), result)
+        while len(_research_cache) > RESEARCH_CACHE_SIZE:
+            _research_cache.popitem(last=False)
+    return result, False
+
+
+def run_speculative_with_progress(research_task, branches, topic: str, style_patterns=None, human_target: float = 0,
+                                  personas=None, task_stages=None, run: Optional[PipelineRun] = None):
+    """
+    "Must pass" mode: research once (cached), then every branch (writer + humanizer tasks,
+    each with its own persona) advances one stage per round, concurrently.
+    After every round the drafts are scored together (ZeroGPT isHuman, else style closeness):
+    - a draft reaching the target wins at once and the other branches stop
+    - branches SPECULATIVE_CANCEL_MARGIN points behind the leader are cancelled
+    The best-scoring draft is returned as the article.
+    task_stages: the profile stage of each branch task (the same for every branch), see stage_context.py.
+    A cancelled run starts no further round and keeps the best draft so far; past run.deadline
+    the race ends with the drafts it has (before the first draft, only one branch goes on).
+    """
+    run = run or PipelineRun()
+    personas = personas or [''] * len(branches)
+    if human_target:
+        target = human_target
+    elif style_patterns:
+        target = (1 - style_score.STYLE_TOLERANCE) * 100
+    else:
+        target = None
+    state = {'research': None, 'winner': None, 'error': None}
+    drafts, results, scores = {}, {}, {}
+    focus = {b: "the whole draft" for b in range(len(branches))}
+    alive = set(range(len(branches)))
+
+    st.markdown("## 📋 Pipeline Execution Log")
+    st.caption(f"🏁 Racing {len(branches)} drafts: {', '.join(p for p in personas if p)}")
+    branch_placeholder = st.empty()
+
+    def score_round(ids):
+        """Higher is better; None when nothing can score the draft."""
+        if human_target:
+            detections = zerogpt_api.check_many([drafts[b] for b in ids])
+            for b, detection in zip(ids, detections):
+                flagged = zerogpt_api.flagged_sentences(detection)
+                if flagged:
+                    focus[b] = "\n".join(f"- {s.strip()}" for s in flagged)
+            return {b: zerogpt_api.human_score(d) for b, d in zip(ids, detections)}
+        if style_patterns:
+            out = {}
+            for b in ids:
+                distance = style_score.score_draft(drafts[b], style_patterns)['distance']
+                out[b] = None if distance is None else round((1 - distance) * 100, 1)
+            return out
+        return {b: None for b in ids}
+
+    def advance(b, k):
+        task = branches[b][k]
+        context = stage_context.prepare(task_stages[k] if task_stages else None,
+                                        drafts.get(b) or str(state['research']), _task_model(task))
+        inputs = {'topic': topic, 'draft_content': context['text'], 'focus_sentences': focus[b]}
+        try:
+            return b, context, run_task(task, inputs, task_stages[k] if task_stages else None), None
+        except Exception as e:
+            return b, context, None, e
+
+    def best():
+        # best draft so far: scored first, then by score, then still racing
+        return max(drafts, key=lambda b: (scores.get(b) is not None, scores.get(b) or 0, b in alive))
+
+    def controller():
+        try:
+            run.log({'status': 'STARTING', 'branch': None, 'agent': research_task.agent.role})
+            state['research'], from_cache = cached_research(research_task, topic)
+            run.log({'status': 'FINISHED', 'branch': None, 'agent': research_task.agent.role, 'cached': from_cache})
+            rounds = max(len(tasks) for tasks in branches)
+            with ThreadPoolExecutor(max_workers=len(branches)) as pool:
+                for k in range(rounds):
+                    live = [b for b in sorted(alive) if k < len(branches[b])]
+                    if not live:
+                        break
+                    if run.cancelled or (run.past_deadline() and drafts):
+                        reason = f"run cancelled ({run.cancel_reason})" if run.cancelled else "deadline reached"
+                        for b in live:
+                            run.log({'status': 'CANCELLED', 'branch': b, 'reason': reason})
+                        break
+                    if run.past_deadline() and len(live) > 1:
+                        # no draft yet: finish one branch instead of racing all of them
+                        for b in live[1:]:
+                            alive.discard(b)
+                            run.log({'status': 'CANCELLED', 'branch': b, 'reason': "deadline reached"})
+                        live = live[:1]
+                    for b in live:
+                        run.log({'status': 'STARTING', 'branch': b, 'stage': k, 'agent': branches[b][k].agent.role})
+                    for b, context, result, error in pool.map(run_metrics.wrap(lambda b: advance(b, k)), live):
+                        if error is not None:
+                            alive.discard(b)
+                            if isinstance(error, RunCancelled):
+                                run.log({'status': 'CANCELLED', 'branch': b, 'reason': f"run cancelled ({error})"})
+                            else:
+                                run.log({'status': 'FAILED', 'branch': b, 'stage': k, 'error': str(error)})
+                            continue
+                        drafts[b], results[b] = stage_context.rejoin(context, result), result
+                        run.draft = drafts[best()]
+                        run.log({'status': 'FINISHED', 'branch': b, 'stage': k,
+                                 'usage': [_usage(branches[b][k], result)],
+                                 'tokens': context['tokens'], 'full_tokens': context['full_tokens']})
+                    live = [b for b in live if b in alive]
+                    if not live:
+                        break
+                    scores.update(score_round(live))
+                    run.draft = drafts[best()]
+                    run.log({'status': 'SCORED', 'round': k, 'scores': {b: scores[b] for b in live}})
+                    ranked = [b for b in live if scores.get(b) is not None]
+                    if not ranked:
+                        continue
+                    leader = max(ranked, key=lambda b: scores[b])
+                    if target is not None and scores[leader] >= target:
+                        state['winner'] = leader
+                        for b in alive - {leader}:
+                            run.log({'status': 'CANCELLED', 'branch': b, 'reason': f"branch {leader + 1} passed"})
+                        break
+                    for b in ranked:
+                        if scores[b] < scores[leader] - SPECULATIVE_CANCEL_MARGIN:
+                            alive.discard(b)
+                            run.log({'status': 'CANCELLED', 'branch': b,
+                                     'reason': f"{scores[b]:g} vs leader {scores[leader]:g}"})
+            if state['winner'] is None and drafts:
+                state['winner'] = best()
+        except Exception as e:
+            state['error'] = str(e)
+        finally:
+            run.log({'status': 'COMPLETE'})
+
+    def render():
+        lines = []
+        for b, tasks in enumerate(branches):
+            logs = [log for log in list(run.progress) if log.get('branch') == b]
+            done = sum(1 for log in logs if log['status'] == 'FINISHED')
+            status = '🏆 Winner' if state['winner'] == b else \
+                '✂️ Cancelled' if any(log['status'] == 'CANCELLED' for log in logs) else \
+                '❌ Failed' if any(log['status'] == 'FAILED' for log in logs) else \
+                '▶️ Running' if b in alive else '⏹️ Stopped'
+            score = scores.get(b)
+            lines.append(f"* **Branch {b + 1}** ({personas[b]}): {status} — stage {done}/{len(tasks)}"
+                         + (f" — score {score:g}" if score is not None else ""))
+        branch_placeholder.markdown("\n".join(lines))
+
+    thread = threading.Thread(target=run_metrics.wrap(controller))
+    with st.spinner("Racing drafts..."):
+        progress_bar = st.progress(0)
+        st.button("⏹️ Cancel run", key=f"cancel_{run.run_id}", on_click=_cancel_clicked, args=(run,))
+        thread.start()
+        total = 1 + sum(len(tasks) for tasks in branches)
+        try:
+            while thread.is_alive():
+                finished = run.count('FINISHED', 'FAILED', 'CANCELLED')
+                progress_bar.progress(min(finished / total, 1.0))
+                render()
+                time.sleep(0.5)
+        finally:
+            if thread.is_alive():
+                run.cancel("page left or re-run")
+        thread.join()
+    progress_bar.progress(1.0)
+    render()
+
+    if state['error'] or state['winner'] is None:
+        message = f"⚠ Speculative pipeline failed: {state['error'] or 'no branch produced a draft'}"
+        st.error(message)
+        return safe_output_to_json(message), message
+    winner = state['winner']
+    if run.cancelled:
+        st.warning(f"⏹️ Race cancelled ({run.cancel_reason}); keeping the best draft so far (branch {winner + 1}).")
+    else:
+        st.balloons()
+        st.success(f"🏆 Branch {winner + 1} ({personas[winner]}) won"
+                   + (f" with score {scores[winner]:g}." if scores.get(winner) is not None else "."))
+    tokens = run.metrics['stage_tokens'] = stage_context.savings(run.entries('FINISHED'))
+    if tokens['full_tokens']:
+        st.caption(f"🧮 Stage inputs: {tokens['tokens']:,} draft tokens passed instead of {tokens['full_tokens']:,} "
+                   f"({tokens['saved']:,} saved, {tokens['saved_pct']}%)")
+    return safe_output_to_json(results[winner]), drafts[winner]
+
+
+# ---------------- Pipeline builder ----------------
+
+def build_stage_tasks(stage, profile, agents, goals, personalities, role_suffix=""):
+    """
+    Tasks of one profile stage: [(task, [candidate tasks])]; agents are leased from `agents`.
+    role_suffix keeps the agents of parallel branches apart (see run_speculative_with_progress).
+    """
+    kind = stage['kind']
+    base = GLOBAL_AGENTS[stage['agent']] if kind == 'global' else STAGE_DEFAULTS[kind]
+    model = model_router.route(stage, profile, default=base.get('model'))
+    temperature = stage.get('temperature', base.get('temperature', 1.0))
+    llm_config = stage.get('llm_config', base['llm_config'])
+    description = stage.get('description', base['description'])
+    expected_output = stage.get('expected_output', base['expected_output'])
+
+    def task_for(spec, **fmt):
+        text = description.format(**fmt) if fmt else description
+        return Task(description=text, expected_output=expected_output.format(**fmt) if fmt else expected_output,
+                    agent=agents.get(spec))
+
+    if kind in ('research', 'write', 'edit'):
+        role, tools = {'research': ('Researcher', ('serper',)), 'write': ('Content Writer', ()), 'edit': ('Editor', ())}[kind]
+        goal, backstory = goals[kind]
+        return [(task_for(AgentSpec.create(role + role_suffix, goal, backstory, model, temperature, llm_config, tools)), [])]
+    if kind == 'global':
+        spec = AgentSpec.create(base['role'] + role_suffix, base['goal'], base['backstory'], model, temperature, llm_config)
+        return [(task_for(spec), [])]
+
+    # Micro-humanizers (small agents with different personas); with parallelism > 1 every
+    # pass gets competing agents with distinct personas
+    section = stage['section']
+    width = max(1, int(profile.get('parallelism', 1)))
+    out = []
+    for i in range(1, int(stage.get('count', 1)) + 1):
+        personas = random.sample(personalities, min(width, len(personalities))) if width > 1 else [random.choice(personalities)]
+        group = []
+        for n, persona in enumerate(personas):
+            spec = AgentSpec.create(
+                f"Micro-{section}-{i}" + (f"-alt{n}" if n else "") + role_suffix,
+                (f"Rewrite assigned micro-section ({section}#{i}) with persona: {persona}. Inject small digressions, rhetorical Qs, mild grammar breaks. "
+                 "Spend the rewrite on these sentences first: {focus_sentences}"),
+                f"You are a {persona}", model, temperature, llm_config)
+            # 🌟 FIX 6: task description references {draft_content}
+            group.append(task_for(spec, section=section, i=i))
+        out.append((group[0], group[1:]))
+    return out
+
+
+def run_pipeline(topic: str,
+                              researcher_goal: str,
+                              writer_goal: str,
+                              editor_goal: str,
+                              researcher_backstory: str = "Experienced researcher",
+                              writer_backstory: str = "Practical messy writer",
+                              editor_backstory: str = "Editor preserving human flaws",
+                              style_role_id=None,
+                              profile=None,
+                              speculative: int = 0):
+    """
+    Builds and executes the pipeline of a profile (see pipeline_profiles.json) for a topic.
+    style_role_id picks the micro_roles fingerprint used to stop humanizing early
+    (default: the user's newest active role).
+    speculative >= 2 races that many writer + humanizer branches from one research pass
+    (see run_speculative_with_progress).
+    """
+    profile_name, profile = get_profile(profile)
+    # everything about this run (user, personas, progress, metrics) travels on `run`
+    run = PipelineRun.from_session(profile_name)
+    run.personalities = get_personalities(run.user_id)
+    goals = {
+        'research': (researcher_goal, researcher_backstory),
+        'write': (writer_goal, writer_backstory),
+        'edit': (editor_goal, editor_backstory),
+    }
+    deadline_s = profile.get('deadline_s', PIPELINE_DEADLINE_SECONDS)
+    if deadline_s:
+        run.deadline = run.started_at + float(deadline_s)
+    logging.info("Running pipeline profile %s (run %s)", profile_name, run.run_id)
+
+    # one run per session: a new run stops the previous one (e.g. a second click, another page)
+    previous = st.session_state.get('pipeline_run')
+    if previous is not None:
+        previous.cancel("superseded by a new run")
+        previous.delivered = True
+    st.session_state['pipeline_run'] = run
+    pipeline_run.register(run)
+
+    # metrics of every stage / LLM / Serper / detection call land on run (run_metrics.py)
+    token = run_metrics.bind(run)
+    try:
+        with run_metrics.timed('run', profile_name, stage='run'):
+            result = _execute(run, profile, topic, goals, style_role_id, speculative)
+        run.delivered = True
+        return result
+    finally:
+        run_metrics.unbind(token)
+        pipeline_run.unregister(run)
+        try:
+            run_metrics.flush(run)
+        except Exception as e:
+            logging.warning("Could not store metrics of run %s: %s", run.run_id, e)
+
+
+def _cancel_clicked(run):
+    # the click's rerun usually stopped the monitor loop (and cancelled the run) before this runs
+    run.cancel("cancelled by user")
+    run.cancel_reason = "cancelled by user"
+
+
+def take_interrupted_run():
+    """
+    The session's last run if a rerun (its Cancel button, any other widget) stopped the page
+    before the run's result was shown; returned once, so the page can show and save run.draft.
+    """
+    run = st.session_state.get('pipeline_run')
+    if run is None or run.delivered or run.finished_at is None:
+        # no run, already shown, or still in run_pipeline (this is the script run that started it)
+        return None
+    run.delivered = True
+    return run
+
+
+def _execute(run, profile, topic, goals, style_role_id, speculative):
+    """Builds the tasks of a profile and runs them (body of run_pipeline)."""
+    user_id, personalities = run.user_id, run.personalities
+    writer_goal, writer_backstory = goals['write']
+    style_patterns = None
+    if style_score.STYLE_TOLERANCE > 0 and user_id is not None:
+        _, style_patterns = common.get_role_patterns(user_id, style_role_id)
+    human_target = zerogpt_api.HUMAN_TARGET if ADAPTIVE_DETECTION and zerogpt_api.ZEROGPT_API_KEY else 0
+
+    # agent_factory reuses built agents across runs; only the agents a task uses are leased
+    if speculative and speculative > 1:
+        with agent_factory.lease() as agents:
+            stages = profile['stages']
+            research_task = build_stage_tasks(stages[0], profile, agents, goals, personalities)[0][0]
+            personas = random.sample(personalities, min(speculative, len(personalities)))
+            personas += [random.choice(personalities) for _ in range(speculative - len(personas))]
+            branches, task_stages = [], []
+            for b, persona in enumerate(personas):
+                branch_goals = dict(goals, write=(writer_goal, f"{writer_backstory} You write as a {persona}."))
+                # competing candidates are replaced by the branches themselves
+                built = [(task, stage) for stage in stages[1:]
+                         for task, _ in build_stage_tasks(stage, profile, agents, branch_goals, [persona], role_suffix=f" [{b + 1}]")]
+                branches.append([task for task, _ in built][:MAX_REAL_TASKS])
+                task_stages = [stage for _, stage in built][:MAX_REAL_TASKS]
+            return run_speculative_with_progress(research_task, branches, topic, style_patterns=style_patterns,
+                                                 human_target=human_target, personas=personas, task_stages=task_stages,
+                                                 run=run)
+
+    with agent_factory.lease() as agents:
+        tasks, task_stages, candidates, humanizer_start = [], [], {}, None
+        for stage in profile['stages']:
+            if humanizer_start is None and stage['kind'] not in DRAFT_KINDS:
+                humanizer_start = len(tasks)
+            for task, alternatives in build_stage_tasks(stage, profile, agents, goals, personalities):
+                if len(tasks) >= MAX_REAL_TASKS:
+                    break
+                if alternatives:
+                    candidates[len(tasks)] = alternatives
+                tasks.append(task)
+                task_stages.append(stage)
+        humanizer_start = len(tasks) if humanizer_start is None else humanizer_start
+
+        # ---------------- Run crew ----------------
+        if humanizer_start >= len(tasks):
+            style_patterns = None
+
+        # tasks run one by one through agent_factory.single_task_crew; no full crew is built
+        # 🌟 FIX 7: Pass the topic to the progress function so it can be used in kickoff
+        result, task_description = run_safe_pipeline_with_progress(None, tasks, topic=topic, style_patterns=style_patterns,
+                                                                   humanizer_start=humanizer_start,
+                                                                   human_target=human_target, candidates=candidates,
+                                                                   task_stages=task_stages, run=run)
+    return result, task_description
+
+
+def profile_selectbox(default=None, key="pipeline_profile"):
+    """Streamlit selector for the pipeline profile (shows each profile's description)."""
+    config = load_profiles()
+    names = list(config.get('profiles', {}))
+    default = default if default in names else get_profile()[0]
+    return st.selectbox(
+        "Pipeline profile", names, index=names.index(default), key=key,
+        format_func=lambda name: f"{name} — {config['profiles'][name].get('description', '')}",
+    )
+
+
+def speculative_checkbox(key="pipeline_speculative"):
+    """Streamlit toggle for "must pass" mode; returns the number of branches to race (0 = off)."""
+    race = st.checkbox(f"🏁 Must pass: race {SPECULATIVE_DRAFTS} drafts", key=key,
+                       help="Runs competing writer + humanizer branches with different personas and keeps the best-scoring draft.")
+    return SPECULATIVE_DRAFTS if race else 0
+
+
+# ---------------- Example run helper (Streamlit UI) ----------------
+if __name__ == '__main__':
+    st.title('Compact CrewAI v3 — Humanized Pipeline (B)')
+    topic = st.text_input('Topic', 'Artificial Intelligence (AI) & Machine Learning')
+    profile = profile_selectbox()
+    speculative = speculative_checkbox()
+    if st.button('Run Pipeline'):
+        out = run_pipeline(
+            topic=topic,
+            researcher_goal='Investigate this topic in a messy but accurate way.',
+            writer_goal='Write a first messy draft about the topic.',
+            editor_goal='Lightly edit for clarity but preserve mess.',
+            profile=profile,
+            speculative=speculative,
+        )
+        st.json(out)
@@ -0,0 +1,135 @@
+"""
+State of one pipeline run.
+
+Each run_pipeline call creates its own PipelineRun and hands it to the runner, its worker
+threads and the progress UI. Concurrent runs in one process (several users, or one user
+with two tabs) never share a progress log, personalities or metrics. Only immutable
+settings and the explicitly shared caches (agents, research, detection) live at module
+level.
+
+Cancellation is cooperative: cancel() sets an Event that the runners check between stages
+(and safe_llm_call between its retries, check_current(); crew stages run on crewai's own
+LLM, whose retries are not interrupted). A task already talking to the model finishes,
+nothing after it starts. A run may also have a deadline (time.time()
+based); the runners skip or downgrade what is left once it has passed.
+The registry (register / cancel_run / active_runs) knows the runs in flight; a session
+starting a new run cancels its previous one. The session keeps its last run
+(session_state['pipeline_run']), so the draft of a run stopped by a rerun - its Cancel
+button, or any other widget - can still be shown and saved by the next script run.
+"""
+
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import streamlit as st
+
+import run_metrics
+
+
+class RunCancelled(Exception):
+    """Raised by PipelineRun.check() in a cancelled run."""
+
+
+@dataclass
+class PipelineRun:
+    run_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    user_id: Optional[int] = None
+    personalities: List[str] = field(default_factory=list)
+    profile: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    # progress entries ({'status': ..., ...}); appended by the worker thread, read by the UI loop
+    progress: List[Dict[str, Any]] = field(default_factory=list)
+    # run totals (model routing cost, stage input tokens, ...), filled in when the run ends
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    deadline: Optional[float] = None
+    cancel_reason: Optional[str] = None
+    finished_at: Optional[float] = None
+    # article after the last finished stage (best branch so far in a speculative run)
+    draft: Optional[str] = None
+    # set once the result (or the kept draft of a cancelled run) was handed to the page
+    delivered: bool = False
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    @classmethod
+    def from_session(cls, profile=None):
+        """A run for the logged-in user (call from the Streamlit script thread, not a worker)."""
+        user = st.session_state.get("user_info")
+        return cls(user_id=user.get("id") if isinstance(user, dict) else None, profile=profile)
+
+    def log(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        entry.setdefault("at", time.time())
+        self.progress.append(entry)
+        return entry
+
+    def entries(self, *statuses: str) -> List[Dict[str, Any]]:
+        return [entry for entry in list(self.progress) if entry.get("status") in statuses]
+
+    def count(self, *statuses: str) -> int:
+        return len(self.entries(*statuses))
+
+    # ---------------- Cancellation / deadline ----------------
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self.cancel_event.is_set():
+            self.cancel_reason = reason
+            self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def time_left(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def past_deadline(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise RunCancelled(self.cancel_reason)
+
+    def sleep(self, seconds: float) -> None:
+        """time.sleep that wakes up (and raises RunCancelled) when the run is cancelled."""
+        if self.cancel_event.wait(seconds):
+            self.check()
+
+
+def check_current() -> None:
+    """Raises RunCancelled when the run bound to this context (run_metrics.bind) was cancelled."""
+    run = run_metrics.current()
+    if run is not None:
+        run.check()
+
+
+# ---------------- Registry ----------------
+
+_active: Dict[str, PipelineRun] = {}
+_active_lock = threading.Lock()
+
+
+def register(run: PipelineRun) -> None:
+    with _active_lock:
+        _active[run.run_id] = run
+
+
+def unregister(run: PipelineRun) -> None:
+    run.finished_at = time.time()
+    with _active_lock:
+        _active.pop(run.run_id, None)
+
+
+def active_runs() -> List[PipelineRun]:
+    with _active_lock:
+        return list(_active.values())
+
+
+def cancel_run(run_id: str, reason: str = "cancelled") -> bool:
+    with _active_lock:
+        run = _active.get(run_id)
+    if run is None:
+        return False
+    run.cancel(reason)
+    return True
@@ -0,0 +1,190 @@
+"""
+Batch style fingerprinting: many URLs / files -> micro_roles rows in one go.
+
+1. fetch     - URLs are downloaded in one http_fetch.fetch_many batch (async, shared session
+               and HTTP cache), then text is extracted from each page (thread pool); files are
+               read as they are
+   sources whose content is unchanged since an earlier run come back from role_memo
+   (stats + role) and skip the next two stages, unless regenerate=True
+2. analyze   - text_features.extract_features (what analyze_text_features runs) across a
+               process pool; it is CPU bound, so threads would serialize on the GIL
+3. generate  - generate_role_with_llm with at most LLM_CONCURRENCY calls in flight
+4. save      - common.save_many_to_db writes every row in one transaction
+
+Stages overlap: an analysis starts as soon as its source's text is extracted.
+`progress(stage, done, total, source)` is called from the calling thread after every
+finished step, so a Streamlit page can update its progress bar directly.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import common
+import http_fetch
+import role_memo
+import text_features
+
+FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", "8"))
+ANALYZE_WORKERS = int(os.getenv("BATCH_ANALYZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "3"))
+# sources shorter than this are reported instead of fingerprinted (same bar as the paste box)
+MIN_TEXT_CHARS = 30
+
+STAGES = ("fetch", "analyze", "generate", "save")
+
+ProgressFn = Callable[[str, int, int, str], None]
+
+
+def source_label(source: Any) -> str:
+    """Display name of a batch source (URL, path or uploaded file)."""
+    return getattr(source, "name", None) or str(source)
+
+
+def source_type_for(source: Any) -> str:
+    """micro_roles.source_type value, matching what the single-source form stores."""
+    if isinstance(source, str) and source.startswith(("http://", "https://")):
+        return "URL : " + source
+    return "File : " + source_label(source)
+
+
+def is_url(source: Any) -> bool:
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+
+def load_source(source: Any, html: Optional[str] = None) -> str:
+    """Text of one source: a URL (`html`: its page, when already downloaded), a local .txt/.md path or an uploaded file object."""
+    import micro_humanizer_generator as mhg
+    if hasattr(source, "getvalue"):
+        return mhg.clean_whitespace(source.getvalue().decode("utf-8", "ignore"))
+    if is_url(source):
+        return mhg.fetch_article_text(source, html=html)
+    return mhg.load_local_text_file(str(source))
+
+
+def _load(item: Dict[str, Any], pages: Dict[str, Any]) -> str:
+    page = pages.get(item["_raw"]) if is_url(item["_raw"]) else None
+    if isinstance(page, Exception):
+        raise page
+    return load_source(item["_raw"], page)
+
+
+def _analyze(text: str) -> Dict[str, Any]:
+    # runs in a worker process; the NLP backends are loaded once per worker
+    return text_features.extract_features(text)
+
+
+def _generate(text: str, stats: Dict[str, Any], topic: Optional[str]) -> Dict[str, Any]:
+    import micro_humanizer_generator as mhg
+    return mhg.generate_role_with_llm(text, stats, topic)
+
+
+def _analysis_pool(count: int):
+    workers = max(1, min(ANALYZE_WORKERS, count))
+    if workers == 1:
+        # one source (or one core): a worker process would only add start-up time
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _noop_progress(stage: str, done: int, total: int, source: str) -> None:
+    pass
+
+
+def run_batch(sources: Iterable[Any], user_id, topic: Optional[str] = None,
+              progress: Optional[ProgressFn] = None, save: bool = True,
+              regenerate: bool = False) -> List[Dict[str, Any]]:
+    """
+    Fingerprints every source and (with save=True) stores all roles in one transaction.
+    Returns one dict per source: {source, source_type, stats, role, role_id, from_memo, error}.
+    A failing source only marks its own entry with `error`; the rest of the batch continues.
+    """
+    progress = progress or _noop_progress
+    # the model generate_role_with_llm will ask; memoized roles are per model
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    items = [{"source": source_label(s), "source_type": source_type_for(s), "stats": None,
+              "role": None, "role_id": None, "from_memo": False, "error": None,
+              "_raw": s, "_text": None, "_hash": None}
+             for s in sources]
+    total = len(items)
+    if not total:
+        return []
+
+    urls = [item["_raw"] for item in items if is_url(item["_raw"])]
+    # {url: html or the exception of its download}
+    pages = http_fetch.fetch_many(urls, concurrency=FETCH_WORKERS) if urls else {}
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, total)) as fetch_pool, \
+            _analysis_pool(total) as analyze_pool, \
+            ThreadPoolExecutor(max_workers=max(1, LLM_CONCURRENCY)) as llm_pool:
+
+        fetches = {fetch_pool.submit(_load, item, pages): item for item in items}
+        analyses = {}
+        for done, future in enumerate(as_completed(fetches), 1):
+            item = fetches[future]
+            try:
+                item["_text"] = future.result()
+                if len((item["_text"] or "").strip()) < MIN_TEXT_CHARS:
+                    raise ValueError("no text could be extracted")
+                item["_hash"] = role_memo.content_hash(item["_text"])
+                hit = None if regenerate else role_memo.lookup(item["source"], item["_hash"], topic, model)
+                if hit is not None:
+                    item["stats"], item["role"] = hit
+                    item["from_memo"] = True
+                else:
+                    analyses[analyze_pool.submit(_analyze, item["_text"])] = item
+            except Exception as e:
+                item["error"] = f"fetch failed: {e}"
+            progress("fetch", done, total, item["source"])
+
+        generations = {}
+        for done, future in enumerate(as_completed(analyses), 1):
+            item = analyses[future]
+            try:
+                try:
+                    item["stats"] = future.result()
+                except BrokenProcessPool:
+                    # e.g. a worker was killed; finish this one in-process
+                    item["stats"] = _analyze(item["_text"])
+            except Exception as e:
+                item["error"] = f"analysis failed: {e}"
+            if item["stats"] is not None:
+                generations[llm_pool.submit(_generate, item["_text"], item["stats"], topic)] = item
+            progress("analyze", done, len(analyses), item["source"])
+
+        for done, future in enumerate(as_completed(generations), 1):
+            item = generations[future]
+            try:
+                item["role"] = future.result()
+            except Exception as e:
+                item["error"] = f"role generation failed: {e}"
+            if role_memo.is_memoizable(item["role"]):
+                try:
+                    role_memo.store(item["source"], item["_hash"], topic, item["stats"], item["role"], model)
+                except Exception:
+                    # the memo only saves work next time; never fail the batch over it
+                    pass
+            progress("generate", done, len(generations), item["source"])
+
+    ready = [item for item in items if item["role"] is not None]
+    if save and ready:
+        ids = common.save_many_to_db(user_id, [(i["source_type"], i["_text"], i["role"]) for i in ready])
+        for item, role_id in zip(ready, ids):
+            item["role_id"] = role_id
+        progress("save", len(ready), len(ready), "")
+
+    for item in items:
+        del item["_raw"], item["_text"], item["_hash"]
+    return items
+
+
+if __name__ == "__main__":
+    # python role_batch.py <user_id> <url-or-path> [<url-or-path> ...]
+    import sys
+
+    def _print_progress(stage, done, total, source):
+        print(f"[{stage}] {done}/{total} {source}")
+
+    for result in run_batch(sys.argv[2:], int(sys.argv[1]), progress=_print_progress):
+        print(result["source"], "->", result["role_id"] or result["error"])
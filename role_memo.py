@@ -0,0 +1,122 @@
+"""
+Persistent memo for micro-humanizer role generation.
+
+Rows are keyed on (source, content hash, topic hint, model): the same URL / pasted text
+with unchanged content gets its stored analyze_text_features stats and role back without
+the spaCy pass or the LLM call, as long as the same model is asked; switching the model
+generates (and memoizes) a new role. Fetching stays cheap too - unchanged pages come from the
+HTTP cache (http_fetch.py) or a 304 revalidation.
+Template fallbacks (no API key / failed LLM call) are never memoized, so they are
+retried on the next request. regenerate=True bypasses the lookup and replaces the row.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import blob_store
+import common
+import db_pool
+
+MEMO_TABLE = "role_memo"
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_memo_table(conn) -> None:
+    """Creates the memo table; a table keyed without the model is rebuilt (run it in a transaction)."""
+    pk = [row[1] for row in conn.execute(f"PRAGMA table_info({MEMO_TABLE})").fetchall() if row[5]]
+    if pk and "model" not in pk:
+        conn.execute(f"ALTER TABLE {MEMO_TABLE} RENAME TO {MEMO_TABLE}_old")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MEMO_TABLE} (
+            source_key TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            topic TEXT NOT NULL DEFAULT '',
+            model TEXT NOT NULL DEFAULT '',
+            stats TEXT,
+            role_json TEXT,
+            created_at TEXT,
+            hits INTEGER DEFAULT 0,
+            PRIMARY KEY (source_key, content_hash, topic, model)
+        )
+    """)
+    if pk and "model" not in pk:
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {MEMO_TABLE} (source_key, content_hash, topic, model, stats, role_json, created_at, hits)
+            SELECT source_key, content_hash, topic, COALESCE(model, ''), stats, role_json, created_at, hits
+            FROM {MEMO_TABLE}_old
+        """)
+        conn.execute(f"DROP TABLE {MEMO_TABLE}_old")
+
+
+def _pool():
+    pool = db_pool.get_pool(common.DATABASE_FILE)
+    if common.DATABASE_FILE not in _ready:
+        with _ready_lock:
+            if common.DATABASE_FILE not in _ready:
+                with pool.transaction() as conn:
+                    ensure_memo_table(conn)
+                _ready.add(common.DATABASE_FILE)
+    return pool
+
+
+def content_hash(text: str) -> str:
+    """Hash of the text with whitespace normalised (re-fetched pages often differ only there)."""
+    return hashlib.sha256(re.sub(r"\s+", " ", text or "").strip().encode("utf-8")).hexdigest()
+
+
+def is_memoizable(role: Any) -> bool:
+    return isinstance(role, dict) and "_error" not in role and "warning" not in role
+
+
+def lookup(source_key: str, text_hash: str, topic: Optional[str] = None,
+           model: Optional[str] = None) -> Optional[Tuple[Dict, Dict]]:
+    """(stats, role) stored for this source, content and model, or None."""
+    pool = _pool()
+    key = (source_key, text_hash, topic or "", model or "")
+    row = pool.fetchone(
+        f"SELECT stats, role_json FROM {MEMO_TABLE} "
+        f"WHERE source_key = ? AND content_hash = ? AND topic = ? AND model = ?",
+        key,
+    )
+    if row is None:
+        return None
+    # hit counter only; nobody waits for it
+    pool.write(f"UPDATE {MEMO_TABLE} SET hits = hits + 1 "
+               f"WHERE source_key = ? AND content_hash = ? AND topic = ? AND model = ?",
+               key, wait=False)
+    return json.loads(row[0]), json.loads(blob_store.unpack_text(row[1]))
+
+
+def store(source_key: str, text_hash: str, topic: Optional[str], stats: Dict, role: Dict,
+          model: Optional[str] = None) -> None:
+    _pool().write(
+        f"INSERT OR REPLACE INTO {MEMO_TABLE} "
+        f"(source_key, content_hash, topic, model, stats, role_json, created_at, hits) VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+        (source_key, text_hash, topic or "", model or "", json.dumps(stats), blob_store.pack_text(json.dumps(role)),
+         time.strftime("%Y-%m-%d %H:%M:%S")),
+    )
+
+
+def get_or_create(source_key: str, text: str, topic: Optional[str],
+                  analyze: Callable[[str], Dict], generate: Callable[[str, Dict, Optional[str]], Dict],
+                  regenerate: bool = False, model: Optional[str] = None) -> Tuple[Dict, Dict, bool]:
+    """
+    Returns (stats, role, from_memo). On a miss (or regenerate=True) runs analyze + generate
+    and stores the result when it is a real LLM role.
+    """
+    text_hash = content_hash(text)
+    if not regenerate:
+        hit = lookup(source_key, text_hash, topic, model)
+        if hit is not None:
+            return hit[0], hit[1], True
+    stats = analyze(text)
+    role = generate(text, stats, topic)
+    if is_memoizable(role):
+        store(source_key, text_hash, topic, stats, role, model)
+    return stats, role, False
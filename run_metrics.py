@@ -0,0 +1,216 @@
+"""
+Timing / token / cost metrics of pipeline runs.
+
+run_pipeline binds its PipelineRun with bind(). From then on every instrumented call
+records an event on that run:
+  - stage      one pipeline task (wall time, queue wait, tokens in / out, cost)
+  - llm        safe_llm_call (tokens from the API usage, 429 retries); only targeted rewrites
+               use it - crew stages run on the LLM crewai builds from CrewSafeLLM.model, so
+               their calls and retries are only visible as the stage event
+  - serper     a Serper search
+  - detection  a ZeroGPT request (cache hits are not requests and are not recorded)
+  - run        the whole run_pipeline call
+The run is held in a contextvar. Worker threads do not inherit contextvars, so threads and
+executor jobs started by the pipeline go through wrap(), which also measures how long the
+job waited for a worker (queue_ms). Outside a bound run timed() still works and records
+nothing.
+
+At the end of the run the events go to the run_metrics table in one batch. show_metrics_panel()
+(Admin Panel) shows p50 / p95 per stage, so the slow stages are easy to spot.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import common
+import db_pool
+
+METRICS_TABLE = "run_metrics"
+EVENT_FIELDS = ("kind", "name", "stage", "model", "started_at", "wall_ms", "queue_ms", "prompt_tokens",
+                "completion_tokens", "retries", "cost_usd", "ok", "error")
+
+_run: contextvars.ContextVar = contextvars.ContextVar("pipeline_run", default=None)
+# when the job running in this context was handed to a thread / executor
+_submitted: contextvars.ContextVar = contextvars.ContextVar("pipeline_job_submitted", default=None)
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_metrics_table(conn) -> None:
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            user_id INTEGER,
+            profile TEXT,
+            kind TEXT NOT NULL,
+            name TEXT,
+            stage TEXT,
+            model TEXT,
+            started_at REAL,
+            wall_ms REAL,
+            queue_ms REAL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            retries INTEGER DEFAULT 0,
+            cost_usd REAL,
+            ok INTEGER DEFAULT 1,
+            error TEXT
+        )
+    """)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{METRICS_TABLE}_kind ON {METRICS_TABLE} (kind, stage, started_at)")
+
+
+def _pool():
+    pool = db_pool.get_pool(common.DATABASE_FILE)
+    if common.DATABASE_FILE not in _ready:
+        with _ready_lock:
+            if common.DATABASE_FILE not in _ready:
+                with pool.connection() as conn:
+                    ensure_metrics_table(conn)
+                _ready.add(common.DATABASE_FILE)
+    return pool
+
+
+# ---------------- Recording ----------------
+
+def bind(run) -> contextvars.Token:
+    """Makes run the target of metrics recorded in this context; undo with unbind(token)."""
+    run.metrics.setdefault("events", [])
+    return _run.set(run)
+
+
+def unbind(token: contextvars.Token) -> None:
+    _run.reset(token)
+
+
+def current():
+    return _run.get()
+
+
+def wrap(fn: Callable) -> Callable:
+    """fn running in (a copy of) the caller's context, for threading.Thread / executor jobs."""
+    parent = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    @functools.wraps(fn)
+    def run_in_context(*args, **kwargs):
+        ctx = parent.copy()
+        ctx.run(_submitted.set, submitted)
+        return ctx.run(fn, *args, **kwargs)
+    return run_in_context
+
+
+def record(event: Dict[str, Any]) -> None:
+    run = _run.get()
+    if run is not None:
+        run.metrics["events"].append(event)
+
+
+@contextmanager
+def timed(kind: str, name: Optional[str] = None, **fields) -> Iterator[Dict[str, Any]]:
+    """
+    Records wall time (and queue wait of a wrap()ed job) of the block; the block may add
+    prompt_tokens, completion_tokens, retries, cost_usd or model to the yielded dict.
+    """
+    start = time.perf_counter()
+    submitted = _submitted.get()
+    if submitted is not None:
+        # only the first timed block of a job waited in the queue
+        _submitted.set(None)
+    event = {"kind": kind, "name": name, "started_at": time.time(), "retries": 0, "ok": 1, **fields}
+    if submitted is not None:
+        event["queue_ms"] = round((start - submitted) * 1000, 1)
+    try:
+        yield event
+    except BaseException as e:
+        event["ok"], event["error"] = 0, f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        event["wall_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record(event)
+
+
+def flush(run) -> int:
+    """Writes the run's events to run_metrics; returns how many were stored."""
+    events = run.metrics.get("events") or []
+    if not events:
+        return 0
+    rows = [(run.run_id, run.user_id, run.profile) + tuple(event.get(f) for f in EVENT_FIELDS) for event in events]
+    columns = "run_id, user_id, profile, " + ", ".join(EVENT_FIELDS)
+    with _pool().transaction() as conn:
+        conn.executemany(f"INSERT INTO {METRICS_TABLE} ({columns}) VALUES ({', '.join('?' * (3 + len(EVENT_FIELDS)))})",
+                         rows)
+    return len(rows)
+
+
+# ---------------- Reporting ----------------
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return round(values[lo] + (values[hi] - values[lo]) * (k - lo), 1)
+
+
+def stage_percentiles(days: float = 7, kinds=("stage", "llm", "serper", "detection", "run")) -> List[Dict[str, Any]]:
+    """p50 / p95 wall time and totals per (kind, stage), over the last `days`."""
+    rows = _pool().fetchall(
+        f"SELECT kind, COALESCE(stage, name), wall_ms, queue_ms, prompt_tokens, completion_tokens, retries, cost_usd, ok "
+        f"FROM {METRICS_TABLE} WHERE started_at >= ? AND kind IN ({', '.join('?' * len(kinds))})",
+        (time.time() - days * 86400, *kinds),
+    )
+    groups: Dict[tuple, List[tuple]] = {}
+    for row in rows:
+        groups.setdefault((row[0], row[1]), []).append(row)
+    out = []
+    for (kind, stage), items in groups.items():
+        walls = [r[2] for r in items if r[2] is not None]
+        queues = [r[3] for r in items if r[3] is not None]
+        out.append({
+            "kind": kind,
+            "stage": stage,
+            "calls": len(items),
+            "p50_ms": _percentile(walls, 50),
+            "p95_ms": _percentile(walls, 95),
+            "total_s": round(sum(walls) / 1000, 1),
+            "p95_queue_ms": _percentile(queues, 95),
+            "tokens_in": sum(r[4] or 0 for r in items),
+            "tokens_out": sum(r[5] or 0 for r in items),
+            "retries": sum(r[6] or 0 for r in items),
+            "cost_usd": round(sum(r[7] or 0 for r in items), 4),
+            "failed": sum(1 for r in items if not r[8]),
+        })
+    return sorted(out, key=lambda r: -(r["total_s"] or 0))
+
+
+def show_metrics_panel() -> None:
+    """Admin view: where pipeline time and money go, slowest (by total time) first."""
+    import pandas as pd
+    import streamlit as st
+
+    days = st.selectbox("Period", [1, 7, 30], index=1, format_func=lambda d: f"Last {d} day(s)", key="metrics_days")
+    try:
+        data = stage_percentiles(days)
+    except Exception as e:
+        st.warning(f"Pipeline metrics unavailable: {e}")
+        return
+    if not data:
+        st.info("No pipeline runs recorded yet.")
+        return
+    df = pd.DataFrame(data)
+    runs = df[df["kind"] == "run"]
+    if not runs.empty:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Runs", int(runs["calls"].sum()))
+        c2.metric("Run p50 / p95", f"{runs['p50_ms'].max() / 1000:.0f}s / {runs['p95_ms'].max() / 1000:.0f}s")
+        c3.metric("Est. cost", f"${df[df['kind'] == 'stage']['cost_usd'].sum():.2f}")
+    st.dataframe(df[df["kind"] != "run"], use_container_width=True, hide_index=True)
@@ -1,30 +1,51 @@
 import time
 import openai
 
+import model_router
+import run_metrics
+
 def safe_llm_call(
     messages,
     model="gpt-4.1",
     temperature=0.8,
-    max_retries=8
+    max_retries=8,
+    response_format=None
 ):
     retries = 0
+    extra = {"response_format": response_format} if response_format else {}
+    # pipeline run this call belongs to (if any); a cancelled run makes no further calls
+    run = run_metrics.current()
 
-    while True:
-        try:
-            return openai.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature
-            ).choices[0].message.content
+    with run_metrics.timed("llm", model, model=model) as metric:
+        while True:
+            if run is not None:
+                run.check()
+            try:
+                response = openai.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    **extra
+                )
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    metric["prompt_tokens"] = usage.prompt_tokens
+                    metric["completion_tokens"] = usage.completion_tokens
+                    metric["cost_usd"] = model_router.token_cost(model, usage.prompt_tokens, usage.completion_tokens)
+                return response.choices[0].message.content
 
-        except openai.RateLimitError as e:
-            wait = min(2 ** retries, 20)
-            print(f"[SAFE LLM] 429 detected. Waiting {wait} seconds…")
-            time.sleep(wait)
-            retries += 1
+            except openai.RateLimitError as e:
+                wait = min(2 ** retries, 20)
+                print(f"[SAFE LLM] 429 detected. Waiting {wait} seconds…")
+                if run is not None:
+                    run.sleep(wait)
+                else:
+                    time.sleep(wait)
+                retries += 1
+                metric["retries"] = retries
 
-            if retries > max_retries:
-                raise Exception("❌ Max retries exceeded for LLM call")
+                if retries > max_retries:
+                    raise Exception("❌ Max retries exceeded for LLM call")
 
-        except Exception:
-            raise
+            except Exception:
+                raise
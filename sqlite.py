@@ -2,9 +2,13 @@ import streamlit as st
 import sqlite3
 import pandas as pd
 import os
+import blob_store
 
 # --- Configuration ---
 DATABASE_FILE = "user_auth.db"
+PAGE_SIZES = [25, 50, 100, 250]
+# TEXT cells longer than this are cut inside SQLite so big blobs never reach pandas
+MAX_CELL_CHARS = 200
 
 def get_table_names(conn):
     """Retrieves a list of all table names from the database."""
@@ -15,13 +19,150 @@ def get_table_names(conn):
     tables = [item[0] for item in cursor.fetchall()]
     return tables
 
-def get_table_data(conn, table_name):
-    """Retrieves all rows from a specified table and returns a Pandas DataFrame."""
-    query = f"SELECT * FROM {table_name}"
-    # Use Pandas to efficiently read the SQL query result into a DataFrame
-    df = pd.read_sql_query(query, conn)
+def quote_ident(name):
+    """Quotes a table/column name for safe use inside SQL."""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def get_table_columns(conn, table_name):
+    """Returns [(column_name, declared_type)] for a table."""
+    rows = conn.execute(f"PRAGMA table_info({quote_ident(table_name)})").fetchall()
+    return [(row[1], (row[2] or "").upper()) for row in rows]
+
+def has_rowid(conn, table_name):
+    """WITHOUT ROWID tables (and views) cannot use keyset pagination on rowid."""
+    try:
+        conn.execute(f"SELECT rowid FROM {quote_ident(table_name)} LIMIT 0")
+        return True
+    except sqlite3.Error:
+        return False
+
+def build_filter_clause(columns, filters):
+    """
+    Builds a WHERE clause from {column: text} filters so filtering runs inside SQLite.
+    Only known column names are accepted; values are always bound as parameters.
+    """
+    known = {name for name, _ in columns}
+    clauses = []
+    params = []
+    for column, value in (filters or {}).items():
+        if column not in known or value is None or str(value).strip() == "":
+            continue
+        # unpack_text(): compressed columns are matched on their decoded text
+        clauses.append(f"CAST(unpack_text({quote_ident(column)}) AS TEXT) LIKE ?")
+        params.append(f"%{str(value).strip()}%")
+    where = " AND ".join(clauses)
+    return where, params
+
+def get_row_count(conn, table_name, where="", params=()):
+    """Counts rows without materialising them (COUNT(*) only walks the b-tree)."""
+    sql = f"SELECT COUNT(*) FROM {quote_ident(table_name)}"
+    if where:
+        sql += f" WHERE {where}"
+    return conn.execute(sql, list(params)).fetchone()[0]
+
+def _select_list(columns, max_chars):
+    """Column list for the page query; TEXT/BLOB columns are truncated server-side."""
+    parts = []
+    for name, col_type in columns:
+        ident = quote_ident(name)
+        if max_chars and ("CHAR" in col_type or "TEXT" in col_type or "CLOB" in col_type or col_type in ("", "BLOB")):
+            # may hold compressed values (blob_store.py): decode only the rows on this page
+            value = f"unpack_text({ident})"
+            parts.append(
+                f"CASE WHEN length({value}) > {int(max_chars)} "
+                f"THEN substr({value}, 1, {int(max_chars)}) || '…' ELSE {value} END AS {ident}"
+            )
+        else:
+            parts.append(ident)
+    return ", ".join(parts)
+
+def get_table_page(conn, table_name, page_size, after_rowid=None, page=0, filters=None, max_chars=MAX_CELL_CHARS):
+    """
+    Fetches a single page of a table.
+    Uses keyset pagination on rowid when available (cost does not grow with the page number),
+    otherwise falls back to LIMIT/OFFSET.
+    Returns (DataFrame, last_rowid_on_page).
+    """
+    columns = get_table_columns(conn, table_name)
+    where, params = build_filter_clause(columns, filters)
+    select_list = _select_list(columns, max_chars)
+    table = quote_ident(table_name)
+
+    if has_rowid(conn, table_name):
+        conditions = [where] if where else []
+        if after_rowid is not None:
+            conditions.append("rowid > ?")
+            params = params + [after_rowid]
+        sql = f"SELECT rowid AS __rowid__, {select_list} FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY rowid LIMIT ?"
+        df = pd.read_sql_query(sql, conn, params=params + [int(page_size)])
+        last_rowid = int(df["__rowid__"].iloc[-1]) if not df.empty else None
+        return df.drop(columns=["__rowid__"]), last_rowid
+
+    sql = f"SELECT {select_list} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " LIMIT ? OFFSET ?"
+    df = pd.read_sql_query(sql, conn, params=params + [int(page_size), int(page) * int(page_size)])
+    return df, None
+
+def get_table_data(conn, table_name, page_size=PAGE_SIZES[0], filters=None):
+    """Retrieves the first page of a specified table and returns a Pandas DataFrame."""
+    df, _ = get_table_page(conn, table_name, page_size, filters=filters)
     return df
 
+def show_table_browser(conn, table_name):
+    """Renders one table with row count, column filters and prev/next paging."""
+    columns = get_table_columns(conn, table_name)
+    state_key = f"dbv_{table_name}"
+    # cursors[i] = last rowid of page i-1 (None for the first page)
+    state = st.session_state.setdefault(state_key, {"page": 0, "cursors": [None], "filters": {}})
+
+    with st.expander("🔎 Column filters", expanded=bool(state["filters"])):
+        filter_cols = st.columns(min(3, max(1, len(columns))))
+        new_filters = {}
+        for idx, (name, _) in enumerate(columns):
+            with filter_cols[idx % len(filter_cols)]:
+                new_filters[name] = st.text_input(name, value=state["filters"].get(name, ""), key=f"{state_key}_f_{name}")
+    new_filters = {k: v for k, v in new_filters.items() if v.strip()}
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{state_key}_size")
+
+    # any change in filters or page size restarts paging from the top
+    if new_filters != state["filters"] or state.get("page_size") != page_size:
+        state.update({"page": 0, "cursors": [None], "filters": new_filters, "page_size": page_size})
+
+    where, params = build_filter_clause(columns, state["filters"])
+    total = get_row_count(conn, table_name, where, params)
+    total_pages = max(1, -(-total // page_size))
+    page = min(state["page"], total_pages - 1)
+
+    df, last_rowid = get_table_page(
+        conn, table_name, page_size,
+        after_rowid=state["cursors"][page] if page < len(state["cursors"]) else None,
+        page=page,
+        filters=state["filters"],
+    )
+
+    st.caption(f"{total:,} matching rows — page {page + 1} of {total_pages:,} (long text cut at {MAX_CELL_CHARS} chars)")
+    if df.empty:
+        st.write(f"Table **{table_name}** has no matching rows.")
+    else:
+        st.dataframe(df, use_container_width=True)
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if st.button("⬅️ Previous", key=f"{state_key}_prev", disabled=page == 0):
+            state["page"] = page - 1
+            st.rerun()
+    with next_col:
+        if st.button("Next ➡️", key=f"{state_key}_next", disabled=page >= total_pages - 1):
+            if len(state["cursors"]) <= page + 1:
+                state["cursors"].append(last_rowid)
+            state["page"] = page + 1
+            st.rerun()
+
 def main():
     st.title("SQLite Database Viewer (Streamlit) 📊")
 
@@ -35,6 +176,7 @@ def main():
     try:
         # Establish connection to the SQLite database
         conn = sqlite3.connect(DATABASE_FILE)
+        blob_store.register_sql_functions(conn)
 
         # Get the list of all tables
         table_names = get_table_names(conn)
@@ -53,22 +195,14 @@ def main():
         st.code(", ".join(table_names))
         st.markdown("---")
 
-        # Iterate through each table to display its data
-        for table_name in table_names:
-            st.subheader(f"Data from table: **{table_name}**")
-
-            try:
-                # Retrieve all data for the current table
-                df = get_table_data(conn, table_name)
-
-                if df.empty:
-                    st.write(f"Table **{table_name}** is empty.")
-                else:
-                    # Display the DataFrame as an interactive table in Streamlit
-                    st.dataframe(df)
+        # Only the selected table is queried, one page at a time
+        table_name = st.selectbox("Table", table_names, key="dbv_table")
+        st.subheader(f"Data from table: **{table_name}**")
 
-            except pd.io.sql.DatabaseError as e:
-                st.warning(f"Could not read data from table **{table_name}**: {e}")
+        try:
+            show_table_browser(conn, table_name)
+        except (sqlite3.Error, pd.io.sql.DatabaseError) as e:
+            st.warning(f"Could not read data from table **{table_name}**: {e}")
 
     # Close the database connection when done
     if conn:
@@ -0,0 +1,215 @@
+"""
+What each pipeline stage gets as {draft_content}, within a token budget.
+
+Before, every stage received the whole previous output. The writer got the researcher's
+notes including raw Serper JSON, and prompts grew stage by stage. prepare() now decides
+what a stage actually reads:
+  - research          nothing (it only needs the topic)
+  - write             a research digest: Serper JSON dumps become one line per result,
+                      duplicate lines are dropped, and the digest is clipped to the budget
+  - micro (section)   only its section of the draft (intro = first paragraph,
+                      conclusion = last paragraph, body = the rest)
+  - edit / global     the whole draft
+Anything over the stage budget (STAGE_BUDGETS, or "budget" on a profile stage) is cut at a
+paragraph / sentence boundary. rejoin() splices the stage output back between the parts the
+stage did not see, so the article never loses text.
+
+Tokens are counted with tiktoken when it is installed, else estimated as chars / 4.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import model_router
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+# max input tokens of {draft_content} per stage kind; 0 = no limit
+STAGE_BUDGETS = {
+    "research": 0,
+    "write": 1500,
+    "edit": 6000,
+    "micro": 2000,
+    "global": 6000,
+}
+# STAGE_BUDGETS_JSON='{"write": 1000}' replaces single budgets
+STAGE_BUDGETS.update(json.loads(os.getenv("STAGE_BUDGETS_JSON") or "{}"))
+# one digest line per search result, at most this many per Serper dump
+DIGEST_RESULTS = int(os.getenv("DIGEST_RESULTS", "8"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    try:
+        return tiktoken.encoding_for_model(model or model_router.PRIMARY_MODEL)
+    except Exception:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    if tiktoken is not None:
+        try:
+            return len(_encoding(model).encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return -(-len(text) // model_router.CHARS_PER_TOKEN)
+
+
+def clip(text: str, budget: int, model: Optional[str] = None) -> Tuple[str, str]:
+    """(head, rest): the longest head within budget tokens ending at a paragraph, else sentence, boundary."""
+    if not budget or count_tokens(text, model) <= budget:
+        return text, ""
+    cut = 0
+    for pattern in (_PARAGRAPH, _SENTENCE_END):
+        # segment counts are summed (close enough, and linear in the text length)
+        used = prev = 0
+        for m in pattern.finditer(text):
+            used += count_tokens(text[prev:m.start()], model)
+            if used > budget:
+                break
+            cut, prev = m.start(), m.start()
+        if cut:
+            break
+    if not cut:
+        # a single paragraph / sentence over budget: cut at a word
+        cut = min(len(text), budget * model_router.CHARS_PER_TOKEN)
+        while cut > 0 and count_tokens(text[:cut], model) > budget:
+            space = text.rfind(" ", 0, cut - 1)
+            cut = space if space > 0 else cut // 2
+    return text[:cut], text[cut:]
+
+
+# ---------------- Research digest ----------------
+
+def _serper_lines(data: Dict[str, Any]):
+    box = data.get("answerBox") or {}
+    if box.get("answer") or box.get("snippet"):
+        yield f"- {box.get('title', 'Answer')}: {box.get('answer') or box.get('snippet')}"
+    graph = data.get("knowledgeGraph") or {}
+    if graph.get("description"):
+        yield f"- {graph.get('title', '')}: {graph['description']}"
+    for item in (data.get("organic") or [])[:DIGEST_RESULTS]:
+        if isinstance(item, dict) and item.get("snippet"):
+            yield f"- {item.get('title', '').strip()}: {item['snippet'].strip()} ({item.get('link', '')})"
+    for item in (data.get("peopleAlsoAsk") or [])[:3]:
+        if isinstance(item, dict) and item.get("snippet"):
+            yield f"- {item.get('question', '').strip()} {item['snippet'].strip()}"
+
+
+def strip_dumps(text: str) -> str:
+    """Replaces raw Serper JSON responses inside text with one line per result."""
+    decoder = json.JSONDecoder()
+    out, pos = [], 0
+    while True:
+        start = text.find("{", pos)
+        if start == -1:
+            break
+        try:
+            data, end = decoder.raw_decode(text, start)
+        except ValueError:
+            out.append(text[pos:start + 1])
+            pos = start + 1
+            continue
+        out.append(text[pos:start])
+        if isinstance(data, dict) and ({"organic", "searchParameters", "answerBox", "knowledgeGraph"} & set(data)):
+            out.append("\n".join(_serper_lines(data)) + "\n")
+        else:
+            out.append(text[start:end])
+        pos = end
+    out.append(text[pos:])
+    return "".join(out)
+
+
+def research_digest(notes: str, budget: int, model: Optional[str] = None) -> str:
+    """Research notes without JSON dumps or repeated lines, clipped to budget tokens."""
+    seen, lines = set(), []
+    for line in strip_dumps(notes or "").splitlines():
+        key = " ".join(line.lower().split())
+        if key and key in seen:
+            continue
+        seen.add(key)
+        lines.append(line.rstrip())
+    digest = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    return clip(digest, budget, model)[0]
+
+
+# ---------------- Draft sections ----------------
+
+def section_bounds(draft: str, section: str) -> Tuple[int, int]:
+    """(start, end) of intro / body / conclusion; the whole draft when it has fewer than 3 paragraphs."""
+    breaks = list(_PARAGRAPH.finditer(draft, len(draft) - len(draft.lstrip()), len(draft.rstrip())))
+    if len(breaks) < 2:
+        return 0, len(draft)
+    if section == "intro":
+        return 0, breaks[0].start()
+    if section == "conclusion":
+        return breaks[-1].end(), len(draft)
+    if section == "body":
+        return breaks[0].end(), breaks[-1].start()
+    return 0, len(draft)
+
+
+def budget_for(stage: Optional[Dict[str, Any]]) -> int:
+    stage = stage or {}
+    if "budget" in stage:
+        return int(stage["budget"])
+    return int(STAGE_BUDGETS.get(stage.get("kind"), 0))
+
+
+def prepare(stage: Optional[Dict[str, Any]], draft: str, model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    {draft_content} for one stage: {"text", "prefix", "suffix", "tokens", "full_tokens"}.
+    full_tokens is what passing the whole previous output would have cost.
+    """
+    draft = draft or ""
+    kind = (stage or {}).get("kind")
+    budget = budget_for(stage)
+    prefix = suffix = ""
+    if kind == "research":
+        text = ""
+    elif kind == "write":
+        text = research_digest(draft, budget, model)
+    else:
+        start, end = section_bounds(draft, stage.get("section")) if kind == "micro" else (0, len(draft))
+        prefix, text, suffix = draft[:start], draft[start:end], draft[end:]
+        text, rest = clip(text, budget, model)
+        suffix = rest + suffix
+    return {"text": text, "prefix": prefix, "suffix": suffix, "kind": kind,
+            "tokens": count_tokens(text, model), "full_tokens": count_tokens(draft, model)}
+
+
+def rejoin(prepared: Dict[str, Any], output: Any) -> str:
+    """The full draft after a stage: its output between the parts it was not given."""
+    output = str(output)
+    if not prepared.get("prefix") and not prepared.get("suffix"):
+        return output
+    return prepared["prefix"] + output.strip() + prepared["suffix"]
+
+
+def savings(entries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over FINISHED log entries with tokens / full_tokens."""
+    passed = full = 0
+    for entry in entries:
+        passed += entry.get("tokens", 0)
+        full += entry.get("full_tokens", 0)
+    return {"tokens": passed, "full_tokens": full, "saved": full - passed,
+            "saved_pct": round((1 - passed / full) * 100, 1) if full else 0.0}
+
+
+if __name__ == "__main__":
+    import sys
+    notes = open(sys.argv[1], encoding="utf-8").read() if len(sys.argv) > 1 else sys.stdin.read()
+    digest = research_digest(notes, STAGE_BUDGETS["write"])
+    print(digest)
+    print(f"\n{count_tokens(notes)} -> {count_tokens(digest)} tokens (tiktoken: {tiktoken is not None})")
@@ -0,0 +1,170 @@
+"""
+Style distance between a draft and a micro_roles fingerprint.
+
+micro_roles.patterns holds what analyze_text_features measured on the user's source
+(avg_sentence_length, sentence_length_stddev, lexical_diversity, common_transitions,
+top_keywords, as restated by the role LLM). score_draft measures the draft the same way
+(text_features.extract_features) and returns a weighted distance in [0, 1]:
+  - numeric patterns: relative difference, capped at 1
+  - transitions / keywords: 1 - overlap of the two sets
+Components missing from the stored patterns are left out and the weights re-normalised.
+The pipeline stops running humanizer passes once distance <= STYLE_TOLERANCE.
+
+    STYLE_TOLERANCE=0.15                       (0 disables the early stop)
+    STYLE_WEIGHTS="sentence_length=0.35,stddev=0.25,lexical_diversity=0.15,transitions=0.15,keywords=0.1"
+"""
+
+import os
+import re
+from typing import Any, Dict, Iterable, Optional, Set
+
+import text_features
+
+DEFAULT_WEIGHTS = {
+    "sentence_length": 0.35,
+    "stddev": 0.25,
+    "lexical_diversity": 0.15,
+    "transitions": 0.15,
+    "keywords": 0.10,
+}
+
+# pattern keys as the role LLM tends to write them -> component
+_NUMERIC_KEYS = {
+    "sentence_length": ("avg_sentence_length", "average_sentence_length", "sentence_length"),
+    "stddev": ("sentence_length_stddev", "sentence_length_std", "stddev"),
+    "lexical_diversity": ("lexical_diversity", "type_token_ratio"),
+}
+_SET_KEYS = {
+    "transitions": ("common_transitions", "transitions"),
+    "keywords": ("top_keywords", "keywords"),
+}
+# relative differences are taken against at least this much (avoids blowing up near 0)
+_FLOORS = {"sentence_length": 1.0, "stddev": 1.0, "lexical_diversity": 0.05}
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (spec or "").split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name in weights:
+            try:
+                weights[name] = max(0.0, float(value))
+            except ValueError:
+                pass
+    return weights
+
+
+STYLE_TOLERANCE = float(os.getenv("STYLE_TOLERANCE", "0.15"))
+STYLE_WEIGHTS = _parse_weights(os.getenv("STYLE_WEIGHTS"))
+
+
+def _number(value: Any) -> Optional[float]:
+    """18.4, "18.4" and "about 18 words" all read as numbers; anything else is None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        m = _NUMBER_RE.search(value)
+        return float(m.group()) if m else None
+    return None
+
+
+def _terms(value: Any) -> Set[str]:
+    """Lower-cased terms from a list of strings, [term, count] pairs, {term: count} or "a, b, c"."""
+    if isinstance(value, str):
+        value = value.split(",")
+    elif isinstance(value, dict):
+        value = value.keys()
+    terms = set()
+    for item in value or ():
+        if isinstance(item, (list, tuple)) and item:
+            item = item[0]
+        if isinstance(item, str) and item.strip():
+            terms.add(item.strip().lower())
+    return terms
+
+
+def _first(patterns: Dict[str, Any], keys: Iterable[str]) -> Any:
+    for key in keys:
+        if patterns.get(key) not in (None, "", [], {}):
+            return patterns[key]
+    return None
+
+
+def pattern_vector(patterns: Any) -> Dict[str, Any]:
+    """Normalised {component: number | set} of a stored patterns dict (unknown / unusable keys dropped)."""
+    if not isinstance(patterns, dict):
+        return {}
+    vector = {}
+    for name, keys in _NUMERIC_KEYS.items():
+        value = _number(_first(patterns, keys))
+        if value is not None:
+            vector[name] = value
+    for name, keys in _SET_KEYS.items():
+        value = _terms(_first(patterns, keys))
+        if value:
+            vector[name] = value
+    return vector
+
+
+def style_distance(features: Dict[str, Any], patterns: Any,
+                   weights: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Weighted distance between draft features (extract_features output) and role patterns.
+    Returns {"distance": float | None, "components": {name: float}}; distance is None when
+    the patterns have nothing to compare.
+    """
+    weights = weights or STYLE_WEIGHTS
+    target = pattern_vector(patterns)
+    draft = pattern_vector(features)
+    components = {}
+    for name, expected in target.items():
+        if not weights.get(name):
+            continue
+        actual = draft.get(name)
+        if isinstance(expected, set):
+            actual = actual or set()
+            if name == "keywords":
+                # share of the role's keywords the draft also leans on
+                components[name] = 1 - len(expected & actual) / len(expected)
+            else:
+                components[name] = 1 - len(expected & actual) / len(expected | actual)
+        else:
+            actual = actual or 0.0
+            components[name] = min(1.0, abs(actual - expected) / max(abs(expected), _FLOORS[name]))
+    total = sum(weights[name] for name in components)
+    if not total:
+        return {"distance": None, "components": {}}
+    distance = sum(weights[name] * value for name, value in components.items()) / total
+    return {
+        "distance": round(distance, 4),
+        "components": {name: round(value, 4) for name, value in components.items()},
+    }
+
+
+def score_draft(text: str, patterns: Any, tolerance: Optional[float] = None,
+                weights: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    {"distance", "components", "within_tolerance", "tolerance"} for a draft against role patterns.
+    within_tolerance is False whenever no distance could be computed or the tolerance is 0.
+    """
+    tolerance = STYLE_TOLERANCE if tolerance is None else tolerance
+    if not pattern_vector(patterns) or not (text or "").strip():
+        result = {"distance": None, "components": {}}
+    else:
+        result = style_distance(text_features.extract_features(text), patterns, weights)
+    distance = result["distance"]
+    result["tolerance"] = tolerance
+    result["within_tolerance"] = bool(tolerance > 0 and distance is not None and distance <= tolerance)
+    return result
+
+
+if __name__ == "__main__":
+    # python style_score.py <draft.txt> '<patterns json>'
+    import json
+    import sys
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        print(json.dumps(score_draft(f.read(), json.loads(sys.argv[2])), indent=2))
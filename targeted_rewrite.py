@@ -0,0 +1,147 @@
+"""
+Targeted rewriting: re-humanize only the sentences ZeroGPT flagged (data["h"]).
+
+1. locate   - every flagged sentence is found in the article (exact, then whitespace /
+              case-insensitive); neighbouring spans separated only by whitespace are merged
+2. rewrite  - spans go to a micro-humanizer persona in batches of SPANS_PER_CALL, each with
+              CONTEXT_CHARS of text before and after so the rewrite still fits; batches run
+              concurrently (REWRITE_CONCURRENCY) and answer in JSON mode
+3. splice   - rewrites replace their spans from the end of the article backwards, so
+              earlier offsets stay valid; a span without a usable rewrite is left as it was
+
+Only the flagged sentences (plus a little context) are sent, instead of the whole draft.
+"""
+
+import json
+import os
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from safe_llm import safe_llm_call
+import model_router
+import zerogpt_api
+
+CONTEXT_CHARS = int(os.getenv("TARGETED_CONTEXT_CHARS", "240"))
+SPANS_PER_CALL = int(os.getenv("TARGETED_SPANS_PER_CALL", "8"))
+REWRITE_CONCURRENCY = int(os.getenv("TARGETED_REWRITE_CONCURRENCY", "3"))
+# short spans: the same model the router picks for small_span pipeline stages
+REWRITE_MODEL = os.getenv("TARGETED_REWRITE_MODEL") or model_router.resolve(model_router.DEFAULT_ROUTES["small_span"])
+DEFAULT_PERSONAS = ["casual confidant", "curious teacher", "nostalgic storyteller", "skeptical critic"]
+
+Span = Tuple[int, int]
+
+
+def _find(text: str, sentence: str, start: int = 0) -> Optional[Span]:
+    idx = text.find(sentence, start)
+    if idx != -1:
+        return idx, idx + len(sentence)
+    # ZeroGPT may normalise whitespace / case in what it echoes back
+    words = sentence.split()
+    if not words:
+        return None
+    m = re.compile(r"\s+".join(re.escape(w) for w in words), re.IGNORECASE).search(text, start)
+    return (m.start(), m.end()) if m else None
+
+
+def locate_spans(text: str, flagged: Sequence[str]) -> List[Span]:
+    """Sorted, non-overlapping (start, end) spans of the flagged sentences; adjacent ones merged."""
+    spans = []
+    for sentence in flagged:
+        sentence = (sentence or "").strip()
+        start = 0
+        # a sentence repeated in the article is flagged at every occurrence
+        while sentence:
+            span = _find(text, sentence, start)
+            if span is None:
+                break
+            spans.append(span)
+            start = span[1]
+    merged: List[Span] = []
+    for start, end in sorted(spans):
+        if merged and (start <= merged[-1][1] or not text[merged[-1][1]:start].strip()):
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _context(text: str, span: Span, chars: int) -> Tuple[str, str]:
+    start, end = span
+    return text[max(0, start - chars):start], text[end:end + chars]
+
+
+def _messages(text: str, spans: List[Tuple[int, Span]], persona: str) -> List[Dict[str, str]]:
+    items = []
+    for n, span in spans:
+        before, after = _context(text, span, CONTEXT_CHARS)
+        items.append({"id": n, "before": before, "rewrite": text[span[0]:span[1]], "after": after})
+    return [
+        {"role": "system", "content": (
+            f"You are a micro-humanizer writing as a {persona}. Rewrite only the 'rewrite' passages so they read "
+            "like a person wrote them: varied sentence length, plain words, a small aside or hesitation where it fits. "
+            "Keep the meaning, facts and language. 'before' and 'after' are context only; the rewrite must flow "
+            "between them. Do not add headings or quotes.")},
+        {"role": "user", "content": (
+            "Return JSON: {\"rewrites\": [{\"id\": <id>, \"text\": \"<rewritten passage>\"}]} with one entry per id.\n\n"
+            + json.dumps(items, ensure_ascii=False))},
+    ]
+
+
+def _parse_rewrites(content: str) -> Dict[int, str]:
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        first, last = (content or "").find("{"), (content or "").rfind("}")
+        if first == -1 or last <= first:
+            return {}
+        try:
+            data = json.loads(content[first:last + 1])
+        except ValueError:
+            return {}
+    out = {}
+    for item in (data.get("rewrites") if isinstance(data, dict) else None) or []:
+        if isinstance(item, dict) and isinstance(item.get("text"), str) and item["text"].strip():
+            try:
+                out[int(item.get("id"))] = item["text"].strip()
+            except (TypeError, ValueError):
+                continue
+    return out
+
+
+def _rewrite_batch(text: str, batch: List[Tuple[int, Span]], persona: str, model: str) -> Dict[int, str]:
+    content = safe_llm_call(_messages(text, batch, persona), model=model, temperature=1.0,
+                            response_format={"type": "json_object"})
+    return _parse_rewrites(content)
+
+
+def splice(text: str, spans: List[Span], replacements: Dict[int, str]) -> str:
+    """Text with spans[i] replaced by replacements[i] (missing ids keep the original)."""
+    out = text
+    for n in sorted(replacements, reverse=True):
+        start, end = spans[n]
+        out = out[:start] + replacements[n] + out[end:]
+    return out
+
+
+def rewrite_flagged(text: str, detection_result: Any, personas: Optional[Sequence[str]] = None,
+                    model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Rewrites the sentences flagged in detection_result and splices them into text.
+    Returns {"text", "spans", "rewritten", "sent_chars"}; sent_chars is how much article text
+    (spans + context) went to the model, to compare with len(text) for a full pass.
+    """
+    spans = locate_spans(text, zerogpt_api.flagged_sentences(detection_result))
+    if not spans:
+        return {"text": text, "spans": 0, "rewritten": 0, "sent_chars": 0}
+    persona = random.choice(list(personas or DEFAULT_PERSONAS))
+    numbered = list(enumerate(spans))
+    batches = [numbered[i:i + SPANS_PER_CALL] for i in range(0, len(numbered), SPANS_PER_CALL)]
+    replacements: Dict[int, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(REWRITE_CONCURRENCY, len(batches)))) as pool:
+        for result in pool.map(lambda b: _rewrite_batch(text, b, persona, model or REWRITE_MODEL), batches):
+            replacements.update({n: t for n, t in result.items() if 0 <= n < len(spans)})
+    sent = sum(min(CONTEXT_CHARS, s) + (e - s) + min(CONTEXT_CHARS, len(text) - e) for s, e in spans)
+    return {"text": splice(text, spans, replacements), "spans": len(spans), "rewritten": len(replacements),
+            "sent_chars": sent}
@@ -7,64 +7,114 @@ import json
 #import openai  # or your preferred LLM
 from openai import OpenAI
 from dotenv import load_dotenv
+import db_pool
+import content_search
 load_dotenv()
 # ----------------------------
 # DATABASE INITIALIZATION
 # ----------------------------
 openai_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY")
-conn = sqlite3.connect("app.db", check_same_thread=False)
-cursor = conn.cursor()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE,
-    password TEXT
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS templates (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    template_title TEXT,
-    audience TEXT,
-    tone_style TEXT,
-    content_structure TEXT,
-    notes_for_editors TEXT,
-    expected_length TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS contents (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    topic TEXT,
-    template_id INTEGER,
-    generated_content TEXT,
-    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
-""")
-
-conn.commit()
+DATABASE_FILE = "app.db"
+# pooled connections (one per thread at a time) + batched writes, see db_pool.py
+db = db_pool.get_pool(DATABASE_FILE)
+
+def init_db():
+    with db.transaction() as conn:
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password TEXT
+        );
+        """)
+
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            template_title TEXT,
+            audience TEXT,
+            tone_style TEXT,
+            content_structure TEXT,
+            notes_for_editors TEXT,
+            expected_length TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS contents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            topic TEXT,
+            template_id INTEGER,
+            generated_content TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        content_search.ensure_search_index(conn)
+
+init_db()
 
 # ----------------------------
 # BASIC LOGIN SYSTEM
 # ----------------------------
 def login_user(username, password):
-    cursor.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-    return cursor.fetchone()
+    return db.fetchone("SELECT * FROM users WHERE username=? AND password=?", (username, password))
 
 def register_user(username, password):
     try:
-        cursor.execute("INSERT INTO users(username, password) VALUES (?,?)", (username, password))
-        conn.commit()
+        db.write("INSERT INTO users(username, password) VALUES (?,?)", (username, password))
         return True
     except:
         return False
 
+# ----------------------------
+# TEMPLATE / CONTENT CRUD
+# ----------------------------
+def get_template(template_id, user_id=None):
+    if user_id is None:
+        return db.fetchone("SELECT * FROM templates WHERE id=?", (template_id,))
+    return db.fetchone("SELECT * FROM templates WHERE id=? AND user_id=?", (template_id, user_id))
+
+def get_templates(user_id):
+    return db.fetchall("SELECT * FROM templates WHERE user_id=?", (user_id,))
+
+def get_template_titles(user_id):
+    return db.fetchall("SELECT id, template_title FROM templates WHERE user_id=?", (user_id,))
+
+def save_template(user_id, template_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length):
+    """Creates or updates a template; the write is committed through the shared write batcher."""
+    if template_id:
+        return db.write("""
+            UPDATE templates SET template_title=?, audience=?, tone_style=?, content_structure=?, notes_for_editors=?, expected_length=?
+            WHERE id=? AND user_id=?
+        """, (template_title, audience, tone_style, content_structure, notes_for_editors, expected_length, template_id, user_id))
+    return db.write("""
+        INSERT INTO templates (user_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (user_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length))
+
+def delete_template(template_id, user_id):
+    return db.write("DELETE FROM templates WHERE id=? AND user_id=?", (template_id, user_id))
+
+def get_contents(user_id):
+    return db.fetchall("""
+        SELECT contents.id, contents.topic, templates.template_title, contents.generated_content
+        FROM contents
+        JOIN templates ON contents.template_id = templates.id
+        WHERE contents.user_id=?
+    """, (user_id,))
+
+def save_content(user_id, topic, template_id, generated):
+    return db.write("""
+        INSERT INTO contents (user_id, topic, template_id, generated_content)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, topic, template_id, generated))
+
+def delete_content(content_id, user_id):
+    return db.write("DELETE FROM contents WHERE id=? AND user_id=?", (content_id, user_id))
+
 # ----------------------------
 # JSON → HTML Renderer
 # ----------------------------
@@ -131,8 +181,7 @@ def template_page(user_id):
     template_id = st.session_state.get("edit_template_id", None)
 
     if template_id:
-        cursor.execute("SELECT * FROM templates WHERE id=? AND user_id=?", (template_id, user_id))
-        t = cursor.fetchone()
+        t = get_template(template_id, user_id)
         title_default = t[2]
         aud_default = t[3]
         tone_default = t[4]
@@ -150,25 +199,15 @@ def template_page(user_id):
     expected_length = st.text_input("Expected Length", value=length_default)
 
     if st.button("Save Template"):
+        save_template(user_id, template_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length)
         if template_id:
-            cursor.execute("""
-                UPDATE templates SET template_title=?, audience=?, tone_style=?, content_structure=?, notes_for_editors=?, expected_length=?
-                WHERE id=? AND user_id=?
-            """, (template_title, audience, tone_style, content_structure, notes_for_editors, expected_length, template_id, user_id))
             st.success("Template updated successfully!")
             st.session_state.edit_template_id = None
         else:
-            cursor.execute("""
-                INSERT INTO templates (user_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, template_title, audience, tone_style, content_structure, notes_for_editors, expected_length))
             st.success("Template created successfully!")
 
-        conn.commit()
-
     st.subheader("Your Templates")
-    cursor.execute("SELECT * FROM templates WHERE user_id=?", (user_id,))
-    rows = cursor.fetchall()
+    rows = get_templates(user_id)
 
     for row in rows:
         st.write(f"### {row[2]}")
@@ -179,8 +218,7 @@ def template_page(user_id):
                 st.rerun()
         with col2:
             if st.button(f"Delete {row[0]}"):
-                cursor.execute("DELETE FROM templates WHERE id=? AND user_id=?", (row[0], user_id))
-                conn.commit()
+                delete_template(row[0], user_id)
                 st.warning("Template deleted")
                 st.rerun()
 
@@ -190,14 +228,17 @@ def template_page(user_id):
 def content_page(user_id):
     st.header("Generated Content List")
 
-    cursor.execute("""
-        SELECT contents.id, contents.topic, templates.template_title, contents.generated_content
-        FROM contents
-        JOIN templates ON contents.template_id = templates.id
-        WHERE contents.user_id=?
-    """, (user_id,))
+    search_query = st.text_input("🔍 Search content", key="template_content_search")
+    if search_query.strip():
+        results = content_search.search_content(DATABASE_FILE, user_id, search_query, sources=["template"])
+        if not results:
+            st.info("No content matches your search.")
+        for item in results:
+            st.write(f"### {item['topic']}")
+            st.markdown(item['snippet'], unsafe_allow_html=True)
+        return
 
-    rows = cursor.fetchall()
+    rows = get_contents(user_id)
 
     for row in rows:
         st.write(f"### {row[1]} — ({row[2]})")
@@ -208,8 +249,7 @@ def content_page(user_id):
         col1, col2 = st.columns(2)
         with col1:
             if st.button(f"Delete {row[0]}"):
-                cursor.execute("DELETE FROM contents WHERE id=?", (row[0],))
-                conn.commit()
+                delete_content(row[0], user_id)
                 st.warning("Deleted successfully")
                 st.rerun()
 
@@ -221,8 +261,7 @@ def generate_content_page(user_id):
 
     topic = st.text_input("Enter Topic")
 
-    cursor.execute("SELECT id, template_title FROM templates WHERE user_id=?", (user_id,))
-    templates = cursor.fetchall()
+    templates = get_template_titles(user_id)
 
     template_select = st.selectbox("Choose Template", templates, format_func=lambda x: x[1])
 
@@ -235,8 +274,7 @@ def generate_content_page(user_id):
         with st.spinner("⏳ Generating content..."):
             template_id = template_select[0]
 
-            cursor.execute("SELECT * FROM templates WHERE id=?", (template_id,))
-            t = cursor.fetchone()
+            t = get_template(template_id)
 
             template_json = {
                 "template_title": t[2],
@@ -258,11 +296,7 @@ def generate_content_page(user_id):
             if generated and st.button("Save Content"):
 
                 st.session_state['bit'] = 1
-                cursor.execute("""
-                    INSERT INTO contents (user_id, topic, template_id, generated_content)
-                    VALUES (?, ?, ?, ?)
-                """, (user_id, topic, template_id, generated))
-                conn.commit()
+                save_content(user_id, topic, template_id, generated)
                 st.success("Content saved!")
                 st.rerun()
 
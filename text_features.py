@@ -0,0 +1,358 @@
+"""
+Single-pass, streaming text feature extraction (the engine behind
+micro_humanizer_generator.analyze_text_features).
+
+Every sentence is visited once: one split gives the sentence lengths (mean /
+stddev are kept as count, mean and sum of squared deviations, so chunks merge
+exactly), words are found by one regex scan of the text and counted into one
+Counter (top keywords come from Counter.most_common), and a transition phrase is
+a substring test on the lowered text. Flesch reading ease is textstat's own
+flesch_reading_ease, as before.
+
+Long documents are analysed in sentence-aligned chunks of CHUNK_CHARS (through
+nlp.pipe when spaCy is available), one FeatureAccumulator per chunk, merged
+exactly with FeatureAccumulator.merge(); memory stays bounded by the chunk size
+and the vocabulary, not the document length. Sentiment and Flesch are scored per
+chunk and averaged by words (PER_CHUNK_SCORES).
+
+Benchmark against the previous multi-pass statistics (20k-character input, plus a
+1M-character document):
+    python text_features.py
+"""
+
+import itertools
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import nlp_models
+
+TRANSITIONS = ["however", "therefore", "meanwhile", "in reality", "that said", "on the other hand", "but then"]
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+TOP_KEYWORDS = 20
+# scored per chunk by TextBlob / textstat: a word-weighted average over the chunks, not an exact merge
+PER_CHUNK_SCORES = ("polarity", "subjectivity", "flesch_reading_ease")
+# chunk size for streaming analysis; documents up to this size are a single chunk
+CHUNK_CHARS = int(os.getenv("TEXT_FEATURES_CHUNK_CHARS", "20000"))
+# chunks handed to nlp.pipe at a time
+PIPE_BATCH_SIZE = int(os.getenv("TEXT_FEATURES_PIPE_BATCH", "4"))
+
+
+class FeatureAccumulator:
+    """Streaming sentence / word statistics for one piece of text; accumulators of chunks merge exactly."""
+
+    def __init__(self):
+        self.sentence_count = 0
+        self.mean = 0.0   # running mean of words per sentence
+        self.m2 = 0.0     # running sum of squared deviations (Welford)
+        self.sentence_words = 0
+        self.word_count = 0
+        self.vocabulary = set()
+        self.keyword_counts = Counter()
+        self.transitions = set()
+        # sentiment: sums weighted by the words each TextBlob call covered
+        self.sentiment_words = 0
+        self.polarity_sum = 0.0
+        self.subjectivity_sum = 0.0
+        # readability: textstat.flesch_reading_ease per chunk, weighted by the chunk's words
+        self.fre_words = 0
+        self.fre_sum = 0.0
+
+    def add_sentence(self, sentence: str, words: List[str] = ()) -> None:
+        n = len(sentence.split())
+        self.sentence_count += 1
+        self.sentence_words += n
+        delta = n - self.mean
+        self.mean += delta / self.sentence_count
+        self.m2 += delta * (n - self.mean)
+        if words:
+            self.add_words(words)
+
+    def add_sentence_lengths(self, lengths: List[int]) -> None:
+        """Words per sentence of a whole chunk at once (same result as add_sentence per sentence)."""
+        if not lengths:
+            return
+        batch = FeatureAccumulator()
+        batch.sentence_count = len(lengths)
+        batch.sentence_words = sum(lengths)
+        batch.mean = batch.sentence_words / batch.sentence_count
+        batch.m2 = sum((n - batch.mean) ** 2 for n in lengths)
+        self.merge(batch)
+
+    def add_words(self, words: List[str]) -> None:
+        self.word_count += len(words)
+        # count the words as written, then fold case: the loop runs over the vocabulary, not the text
+        counts = Counter(words)
+        self.vocabulary.update(counts)
+        keyword_counts = self.keyword_counts
+        for word, n in counts.items():
+            keyword_counts[word.lower()] += n
+
+    def add_transitions(self, text: str) -> None:
+        lowered = text.lower()
+        self.transitions.update(t for t in TRANSITIONS if t in lowered)
+
+    def add_sentiment(self, text: str, TextBlob) -> None:
+        try:
+            sentiment = TextBlob(text).sentiment
+        except Exception:
+            return
+        weight = max(1, len(text.split()))
+        self.sentiment_words += weight
+        self.polarity_sum += sentiment.polarity * weight
+        self.subjectivity_sum += sentiment.subjectivity * weight
+
+    def add_readability(self, text: str, textstat) -> None:
+        try:
+            score = textstat.flesch_reading_ease(text)
+        except Exception:
+            return
+        weight = max(1, len(text.split()))
+        self.fre_words += weight
+        self.fre_sum += score * weight
+
+    def merge(self, other: "FeatureAccumulator") -> "FeatureAccumulator":
+        """Folds another chunk's statistics into this one (Chan et al. for mean / variance)."""
+        if other.sentence_count:
+            n_a, n_b = self.sentence_count, other.sentence_count
+            n = n_a + n_b
+            delta = other.mean - self.mean
+            self.mean += delta * n_b / n
+            self.m2 += other.m2 + delta * delta * n_a * n_b / n
+            self.sentence_count = n
+        self.sentence_words += other.sentence_words
+        self.word_count += other.word_count
+        self.vocabulary |= other.vocabulary
+        self.keyword_counts.update(other.keyword_counts)
+        self.transitions |= other.transitions
+        self.sentiment_words += other.sentiment_words
+        self.polarity_sum += other.polarity_sum
+        self.subjectivity_sum += other.subjectivity_sum
+        self.fre_words += other.fre_words
+        self.fre_sum += other.fre_sum
+        return self
+
+    @property
+    def stddev(self) -> float:
+        return (self.m2 / self.sentence_count) ** 0.5 if self.sentence_count else 0.0
+
+    @property
+    def polarity(self) -> float:
+        return self.polarity_sum / self.sentiment_words if self.sentiment_words else 0.0
+
+    @property
+    def subjectivity(self) -> float:
+        return self.subjectivity_sum / self.sentiment_words if self.sentiment_words else 0.0
+
+    @property
+    def flesch_reading_ease(self) -> Optional[float]:
+        # same gate as before: only texts with more than 100 words get a score;
+        # a single-chunk text gets exactly textstat.flesch_reading_ease(text)
+        if self.sentence_words <= 100 or not self.fre_words:
+            return None
+        return self.fre_sum / self.fre_words
+
+    def to_features(self, top_k: int = TOP_KEYWORDS) -> Dict[str, Any]:
+        lexical_diversity = round(len(self.vocabulary) / max(1, self.word_count), 3) if self.word_count > 0 else 0.0
+        flesch = self.flesch_reading_ease
+        return {
+            "word_count": self.word_count,
+            "sentence_count": self.sentence_count,
+            "avg_sentence_length": round(self.mean, 2),
+            "sentence_length_stddev": round(self.stddev, 2),
+            "lexical_diversity": lexical_diversity,
+            "polarity": round(self.polarity, 3),
+            "subjectivity": round(self.subjectivity, 3),
+            "flesch_reading_ease": round(flesch, 2) if flesch is not None else None,
+            "common_transitions": [t for t in TRANSITIONS if t in self.transitions],
+            "top_keywords": [k for k, _ in self.keyword_counts.most_common(top_k)],
+        }
+
+
+def iter_regex_sentences(text: str):
+    """Naive sentence splitter (same rule as before), yielding non-empty stripped sentences."""
+    start = 0
+    for m in _SENTENCE_SPLIT_RE.finditer(text):
+        piece = text[start:m.start()].strip()
+        if piece:
+            yield piece
+        start = m.end()
+    piece = text[start:].strip()
+    if piece:
+        yield piece
+
+
+def _chunk_end(text: str, start: int, limit: int) -> int:
+    """End offset of the chunk starting at `start`: the last sentence break inside the window,
+    else the last whitespace (one overlong sentence gets split), else a hard cut."""
+    end = start + limit
+    last = None
+    for last in _SENTENCE_SPLIT_RE.finditer(text, start, end):
+        pass
+    if last is None:
+        for last in _WHITESPACE_RE.finditer(text, start, end):
+            pass
+    if last is not None and last.end() > start:
+        return last.end()
+    return end
+
+
+def iter_chunks(source: Union[str, Iterable[str]], chunk_chars: int = CHUNK_CHARS) -> Iterator[str]:
+    """
+    Yields sentence-aligned chunks of about chunk_chars characters.
+    `source` is a string or any iterable of text pieces (e.g. a file object), so a document
+    never has to be held in memory as a whole.
+    """
+    if isinstance(source, str):
+        start = 0
+        while len(source) - start > chunk_chars:
+            end = _chunk_end(source, start, chunk_chars)
+            yield source[start:end]
+            start = end
+        if start < len(source):
+            yield source[start:]
+        return
+    buffer = ""
+    for piece in source:
+        buffer += piece
+        while len(buffer) > chunk_chars:
+            end = _chunk_end(buffer, 0, chunk_chars)
+            yield buffer[:end]
+            buffer = buffer[end:]
+    if buffer:
+        yield buffer
+
+
+def accumulate_regex(text: str, acc: Optional[FeatureAccumulator] = None) -> FeatureAccumulator:
+    acc = acc or FeatureAccumulator()
+    # sentences of iter_regex_sentences: an empty piece is one without words
+    acc.add_sentence_lengths([n for n in map(len, map(str.split, _SENTENCE_SPLIT_RE.split(text))) if n])
+    # sentence breaks are whitespace, so the words of the text are the words of its sentences
+    acc.add_words(_WORD_RE.findall(text))
+    acc.add_transitions(text)
+    return acc
+
+
+def accumulate_doc(doc, acc: Optional[FeatureAccumulator] = None) -> FeatureAccumulator:
+    """Feeds a spaCy Doc: sentences and alphabetic tokens in one walk over doc.sents."""
+    acc = acc or FeatureAccumulator()
+    words = []
+    for sent in doc.sents:
+        sentence = sent.text.strip()
+        if sentence:
+            acc.add_sentence(sentence)
+        words.extend(token.text for token in sent if getattr(token, "is_alpha", False))
+    acc.add_words(words)
+    acc.add_transitions(doc.text)
+    return acc
+
+
+def _iter_chunk_stats(chunks: Iterator[str], nlp) -> Iterator[tuple]:
+    """Sentence / word statistics per chunk; spaCy batches go through nlp.pipe, the regex path is the fallback."""
+    while True:
+        batch = list(itertools.islice(chunks, PIPE_BATCH_SIZE if nlp else 1))
+        if not batch:
+            return
+        docs = None
+        if nlp:
+            try:
+                docs = list(nlp.pipe(batch))
+            except Exception:
+                # fallback to the regex path if spaCy fails at runtime
+                docs = None
+        for idx, chunk in enumerate(batch):
+            acc = accumulate_doc(docs[idx]) if docs is not None else None
+            if acc is None or (acc.sentence_count == 0 and chunk.strip()):
+                acc = accumulate_regex(chunk)
+            yield chunk, acc
+
+
+def extract_features(text: Union[str, Iterable[str]], nlp=None, chunk_chars: int = CHUNK_CHARS) -> Dict[str, Any]:
+    """
+    Robust text analysis that works whether spaCy is available or not.
+    Always returns a dict with the same keys and safe default values.
+    The whole document is analysed, chunk by chunk; `text` may also be an iterable of text pieces.
+    """
+    if not isinstance(text, str) and not hasattr(type(text), "__iter__"):
+        text = ""
+    nlp = nlp if nlp is not None else nlp_models.get_nlp()
+    TextBlob = nlp_models.get_textblob()
+    textstat = nlp_models.get_textstat()
+
+    total = FeatureAccumulator()
+    for chunk, acc in _iter_chunk_stats(iter_chunks(text, chunk_chars), nlp):
+        if TextBlob:
+            acc.add_sentiment(chunk, TextBlob)
+        if textstat:
+            acc.add_readability(chunk, textstat)
+        total.merge(acc)
+    return total.to_features()
+
+
+# --- Benchmark ----------------------------------------------------------------
+
+def _multi_pass_baseline(sample: str) -> Dict[str, Any]:
+    """The previous regex-path statistics (several scans + full sort), kept only for the benchmark."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', sample) if s.strip()]
+    words = re.findall(r'\b[a-zA-Z]+\b', sample)
+    avg = sum(len(s.split()) for s in sentences) / max(1, len(sentences))
+    std = (sum((len(s.split()) - avg) ** 2 for s in sentences) / max(1, len(sentences))) ** 0.5
+    lowered = sample.lower()
+    transitions = [t for t in TRANSITIONS if lowered.count(t) > 0]
+    freq = {}
+    for w in words:
+        freq[w.lower()] = freq.get(w.lower(), 0) + 1
+    top = [k for k, v in sorted(freq.items(), key=lambda x: x[1], reverse=True)[:TOP_KEYWORDS]]
+    return {"avg": round(avg, 2), "std": round(std, 2), "transitions": transitions, "top": top}
+
+
+def make_sample_text(chars: int = 20000, seed: int = 7) -> str:
+    import random
+    rnd = random.Random(seed)
+    vocab = ("the a of to and outsourcing willpower decision team budget however therefore meanwhile "
+             "that said growth client process quality in reality on the other hand but then small business").split()
+    parts, size = [], 0
+    while size < chars:
+        sentence = " ".join(rnd.choice(vocab) for _ in range(rnd.randint(4, 30))).capitalize() + rnd.choice(".!?")
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)[:chars]
+
+
+def benchmark(chars: int = 20000, repeat: int = 20) -> Dict[str, float]:
+    """Times the single-pass accumulator against the old multi-pass statistics (regex path, no NLP backends)."""
+    sample = make_sample_text(chars)
+    timings = {}
+    for name, fn in (("multi_pass_ms", _multi_pass_baseline),
+                     ("single_pass_ms", lambda s: accumulate_regex(s).to_features())):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn(sample)
+        timings[name] = round((time.perf_counter() - start) * 1000 / repeat, 3)
+    new, old = accumulate_regex(sample).to_features(), _multi_pass_baseline(sample)
+    assert (new["avg_sentence_length"], new["sentence_length_stddev"], new["common_transitions"], new["top_keywords"]) == \
+        (old["avg"], old["std"], old["transitions"], old["top"]), "single-pass result differs from baseline"
+    textstat = nlp_models.get_textstat()
+    if textstat:
+        assert extract_features(sample, nlp=False)["flesch_reading_ease"] == \
+            round(textstat.flesch_reading_ease(sample), 2), "Flesch differs from textstat"
+    timings["chars"] = len(sample)
+    # streaming mode on a long document (regex path): chunked result must equal the one-chunk result
+    long_doc = make_sample_text(chars * 50)
+    start = time.perf_counter()
+    streamed = extract_features(long_doc, nlp=False)
+    timings["long_doc_chars"] = len(long_doc)
+    timings["long_doc_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    whole = extract_features(long_doc, nlp=False, chunk_chars=len(long_doc))
+    assert {k: v for k, v in streamed.items() if k not in PER_CHUNK_SCORES} == \
+        {k: v for k, v in whole.items() if k not in PER_CHUNK_SCORES}, "chunk merge is not exact"
+    return timings
+
+
+if __name__ == "__main__":
+    print(benchmark())
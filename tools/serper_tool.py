@@ -5,6 +5,8 @@ from typing import Type
 import http.client
 import json
 
+import run_metrics
+
 class SerperTool(BaseTool):
     name: str = "serper_tool"
     description: str = "Search the web using the Serper API and return summarized snippets."
@@ -25,17 +27,18 @@ class SerperTool(BaseTool):
         #     return f"Serper API request failed: {e}"
 
 
-        conn = http.client.HTTPSConnection("google.serper.dev")
-        payload = json.dumps({
-          "q": query
-        })
-        headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/search", payload, headers)
-        res = conn.getresponse()
-        response = res.read()
+        with run_metrics.timed("serper", "search"):
+            conn = http.client.HTTPSConnection("google.serper.dev")
+            payload = json.dumps({
+              "q": query
+            })
+            headers = {
+            'X-API-KEY': api_key,
+            'Content-Type': 'application/json'
+            }
+            conn.request("POST", "/search", payload, headers)
+            res = conn.getresponse()
+            response = res.read()
         return response.decode("utf-8")
         #data = json.loads(response)
         # data = response.json()
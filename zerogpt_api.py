@@ -1,24 +1,86 @@
 import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import streamlit as st
 from dotenv import load_dotenv
 
+import run_metrics
+
 load_dotenv()
 ZEROGPT_API_KEY = os.getenv("ZEROGPT_API_KEY")
 ZEROGPT_API_URL = "https://api.zerogpt.com/api/detect/detectText"
+# isHuman score at which a text counts as human-written (same bar as the result page)
+HUMAN_TARGET = int(os.getenv("HUMAN_TARGET", "85"))
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "256"))
+# parallel requests when several drafts are scored together
+DETECTION_CONCURRENCY = int(os.getenv("DETECTION_CONCURRENCY", "4"))
+
+# successful results by text hash; the pipeline checks drafts from worker threads
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
 
-def check_ai_content(text):
+def _text_key(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def check_ai_content(text, use_cache=True):
+    key = _text_key(text)
+    if use_cache:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
     headers = {
         "ApiKey": ZEROGPT_API_KEY,
         "Content-Type": "application/json",
     }
     payload = {"input_text": text}
+    with run_metrics.timed("detection", "zerogpt") as metric:
+        try:
+            response = requests.post(ZEROGPT_API_URL, headers=headers, json=payload)
+            response.raise_for_status()
+            result = response.json()
+            if not result.get("success"):
+                metric["ok"], metric["error"] = 0, str(result.get("message", "API error."))
+                return {"error": result.get("message", "API error.")}
+        except Exception as e:
+            metric["ok"], metric["error"] = 0, str(e)
+            return {"error": str(e)}
+    # errors are never cached, so they are retried on the next check
+    with _cache_lock:
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while len(_cache) > DETECTION_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def check_many(texts, use_cache=True):
+    """check_ai_content for a batch of drafts, in order; identical texts are sent once."""
+    unique = list(dict.fromkeys(texts))
+    if not unique:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(DETECTION_CONCURRENCY, len(unique)))) as pool:
+        results = dict(zip(unique, pool.map(run_metrics.wrap(lambda t: check_ai_content(t, use_cache)), unique)))
+    return [results[t] for t in texts]
+
+
+def human_score(result):
+    """isHuman of a detection result, or None for errors."""
+    if not isinstance(result, dict) or "error" in result:
+        return None
     try:
-        response = requests.post(ZEROGPT_API_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        if not result.get("success"):
-            return {"error": result.get("message", "API error.")}
-        return result
-    except Exception as e:
-        return {"error": str(e)}
+        return float((result.get("data") or {}).get("isHuman", 0))
+    except (TypeError, ValueError):
+        return None
+
+
+def flagged_sentences(result):
+    """Sentences ZeroGPT marked as AI-generated (data["h"])."""
+    if not isinstance(result, dict):
+        return []
+    return [s for s in (result.get("data") or {}).get("h", []) if isinstance(s, str) and s.strip()]